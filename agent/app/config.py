@@ -23,6 +23,146 @@ class Settings(BaseSettings):
     image_gen_location: str = Field(
         default="global", description="画像生成用のロケーション"
     )
+    image_job_max_workers: int = Field(
+        default=4, description="画像生成ジョブの最大同時実行数"
+    )
+    image_job_per_user_limit: int = Field(
+        default=1, description="ユーザーごとの画像生成ジョブの最大同時実行数"
+    )
+    image_job_max_pending: int = Field(
+        default=100, description="待機中・実行中を合わせた画像生成ジョブの最大数"
+    )
+    prompt_cache_enabled: bool = Field(
+        default=True, description="画像生成のプロンプトキャッシュを有効にするか"
+    )
+    prompt_cache_size: int = Field(
+        default=1000, description="プロンプトキャッシュのメモリ上の最大件数"
+    )
+    prompt_cache_ttl_sec: int = Field(
+        default=7 * 24 * 3600, description="プロンプトキャッシュの有効期間 (秒)"
+    )
+    image_job_shutdown_timeout_sec: float = Field(
+        default=20.0, description="シャットダウン時に画像生成ジョブの完了を待つ時間"
+    )
+    job_event_queue_size: int = Field(
+        default=32, description="接続ごとに送信待ちにできるジョブの状態通知の最大数"
+    )
+
+    # Audio Ingestion Settings
+    upstream_chunk_ms: float = Field(
+        default=40.0, description="モデルに送信する入力音声チャンクの長さ (ミリ秒)"
+    )
+    upstream_max_buffer_ms: float = Field(
+        default=1000.0, description="送信待ちにできる入力音声の最大長 (ミリ秒)"
+    )
+    upstream_max_backlog_chunks: int = Field(
+        default=25, description="LiveRequestQueue に溜めてよい入力音声チャンク数"
+    )
+    upstream_overflow_policy: str = Field(
+        default="drop_oldest",
+        description="送信待ちの上限超過時の動作 (drop_oldest | drop_newest | merge)",
+    )
+    vad_frame_ms: int = Field(default=20, description="VAD の判定フレーム長 (ミリ秒)")
+    vad_threshold_db: float = Field(
+        default=-45.0, description="VAD で発話とみなす RMS のしきい値 (dBFS)"
+    )
+    vad_hangover_ms: int = Field(
+        default=600, description="VAD で発話終了とみなすまでの無音の長さ (ミリ秒)"
+    )
+    vad_preroll_ms: int = Field(
+        default=200, description="VAD で発話開始前に含める音声の長さ (ミリ秒)"
+    )
+    vad_min_speech_frames: int = Field(
+        default=3, description="VAD で発話開始とみなす連続フレーム数"
+    )
+    opus_bitrate: int = Field(
+        default=24000, description="応答音声を Opus で送信する場合のビットレート (bps)"
+    )
+    opus_frame_ms: int = Field(
+        default=20, description="応答音声の Opus フレーム長 (ミリ秒)"
+    )
+
+    # Server Settings
+    port: int = Field(default=8080, description="待ち受けるポート番号")
+    server_workers: int = Field(
+        default=0, description="ワーカープロセス数 (0 の場合は CPU 数に合わせる)"
+    )
+    server_graceful_shutdown_sec: int = Field(
+        default=8,
+        description="SIGTERM 受信後に処理中の接続の終了を待つ時間 (秒)",
+    )
+    shutdown_drain_timeout_sec: float = Field(
+        default=3.0,
+        description="シャットダウン時にセッションの終了を待つ時間 (秒)",
+    )
+    shutdown_deadline_sec: float = Field(
+        default=9.0,
+        description="SIGTERM から後処理の完了までの期限 (Cloud Run の猶予は 10 秒)",
+    )
+    live_idle_timeout_sec: float = Field(
+        default=60.0,
+        description=(
+            "idle_suspend を指定した接続で、発話・応答のない Live セッションを"
+            "一時停止する秒数 (0 で無効)"
+        ),
+    )
+    live_idle_check_interval_sec: float = Field(
+        default=5.0, description="アイドル状態を確認する間隔 (秒)"
+    )
+    ws_ping_interval_sec: float = Field(
+        default=20.0, description="WebSocket の ping を送信する間隔 (秒)"
+    )
+    ws_ping_timeout_sec: float = Field(
+        default=20.0, description="WebSocket の pong を待つ時間 (秒)"
+    )
+    admission_max_sessions: int = Field(
+        default=100,
+        description="インスタンスの最大同時 Live セッション数 (0 で無制限)",
+    )
+    admission_per_user_limit: int = Field(
+        default=3, description="ユーザーごとの最大同時 Live セッション数 (0 で無制限)"
+    )
+    admission_duplicate_chat_policy: str = Field(
+        default="replace",
+        description="同じ chat_id の接続が重複した場合の動作 (replace | reject)",
+    )
+    admission_retry_after_sec: float = Field(
+        default=5.0, description="上限超過で拒否した接続に再試行を促すまでの秒数"
+    )
+    admission_state_path: str = Field(
+        default="",
+        description=(
+            "ワーカー間で接続中のセッションを共有する SQLite ファイルのパス"
+            " (空の場合はプロセスごと。app.server がマルチワーカー起動時に設定する)"
+        ),
+    )
+    admission_replaced_check_interval_sec: float = Field(
+        default=1.0,
+        description="別のワーカーで置き換えられたセッションを確認する間隔 (秒)",
+    )
+
+    # Logging Settings
+    log_level: str = Field(default="INFO", description="ログレベル")
+    log_format: str = Field(default="json", description="ログの出力形式 (json | text)")
+    log_queue_size: int = Field(
+        default=10000, description="書き込み待ちにできるログの最大件数"
+    )
+    log_rate_limit_per_sec: float = Field(
+        default=20.0,
+        description="DEBUG ログの呼び出し箇所ごとの毎秒の上限 (0 で無制限)",
+    )
+    log_debug_sample_rate: float = Field(
+        default=1.0, description="DEBUG ログを出力する割合 (0.0〜1.0)"
+    )
+
+    # Metrics Settings
+    metrics_enabled: bool = Field(
+        default=False, description="/metrics エンドポイントを公開するか"
+    )
+    metrics_token: str | None = Field(
+        default=None,
+        description="/metrics に要求する Bearer トークン (未設定の場合は認証なし)",
+    )
 
     # General Google Cloud Settings
     google_cloud_project: str | None = Field(
@@ -37,6 +177,29 @@ class Settings(BaseSettings):
         default=None, description="Vertex AI Agent Engine ID"
     )
     session_type: str = Field(default="vertexai", description="セッションタイプ")
+    sqlite_session_db_path: str = Field(
+        default="sessions.db", description="sqlite 使用時のデータベースファイルのパス"
+    )
+    sqlite_session_max_events: int = Field(
+        default=0,
+        description="sqlite 使用時のセッションごとの最大イベント数 (0 は無制限)",
+    )
+    session_cache_size: int = Field(
+        default=500,
+        description="cached-vertexai 使用時にメモリ上に保持する最大セッション数",
+    )
+    session_cache_ttl_sec: float = Field(
+        default=600.0, description="cached-vertexai 使用時のキャッシュ有効期間 (秒)"
+    )
+
+    # Auth Settings
+    auth_token_cache_size: int = Field(
+        default=1024, description="検証済み ID トークンをキャッシュする最大件数"
+    )
+    auth_certs_refresh_margin_sec: float = Field(
+        default=300.0,
+        description="公開証明書の有効期限の何秒前からバックグラウンド更新するか",
+    )
 
     # Firestore Settings
     image_jobs_collection: str = Field(
@@ -52,11 +215,72 @@ class Settings(BaseSettings):
         default="messages",
         description="チャットメッセージ履歴管理用のサブコレクション名",
     )
+    prompt_cache_collection: str = Field(
+        default="image_prompt_cache",
+        description="画像生成プロンプトキャッシュ用のコレクション名",
+    )
+    resumption_collection: str = Field(
+        default="live_resumption",
+        description="Live API のセッション再開ハンドル保存用のコレクション名",
+    )
+    resumption_cache_size: int = Field(
+        default=1000, description="セッション再開ハンドルのメモリ上の最大件数"
+    )
+    resumption_ttl_sec: int = Field(
+        default=2 * 3600, description="セッション再開ハンドルの有効期間 (秒)"
+    )
+    resumption_persist_interval_sec: float = Field(
+        default=10.0,
+        description="セッション再開ハンドルを Firestore に書き込む最小間隔 (秒)",
+    )
+    bootstrap_cache_size: int = Field(
+        default=10000,
+        description="存在確認済みのユーザー・チャットをキャッシュする最大件数",
+    )
+    message_flush_batch_size: int = Field(
+        default=20, description="メッセージを一括書き込みする最大件数"
+    )
+    message_flush_interval_sec: float = Field(
+        default=1.0, description="メッセージを一括書き込みするまでの最大待ち時間 (秒)"
+    )
+
+    # Chat History API Settings
+    history_page_size: int = Field(
+        default=20, description="履歴 API で 1 ページに返す既定の件数"
+    )
+    history_page_size_max: int = Field(
+        default=100, description="履歴 API で 1 ページに返す最大件数"
+    )
+    history_cache_users: int = Field(
+        default=1000,
+        description="履歴 API のレスポンスをキャッシュするユーザー数 (0 で無効)",
+    )
+    history_cache_pages_per_user: int = Field(
+        default=20, description="ユーザーごとにキャッシュするページ数"
+    )
+    history_cache_ttl_sec: float = Field(
+        default=30.0, description="履歴 API のレスポンスのキャッシュ有効期間 (秒)"
+    )
 
     # Cloud Storage Settings
     gcs_bucket_name: str | None = Field(
         default=None, description="生成した画像を保存するGCSバケット名"
     )
+    gcs_upload_chunk_size: int = Field(
+        default=1024 * 1024,
+        description="resumable upload のチャンクサイズ (256KiB の倍数に切り下げ)",
+    )
+    gcs_known_objects_cache_size: int = Field(
+        default=10000,
+        description="アップロード済みと確認した画像のオブジェクト名を保持する最大件数",
+    )
+    image_upload_format: str = Field(
+        default="png",
+        description="保存する画像のフォーマット (png | webp | avif、要 Pillow)",
+    )
+    image_upload_quality: int = Field(
+        default=85, description="WebP/AVIF 変換時の品質 (0-100)"
+    )
 
     model_config = SettingsConfigDict(
         env_file=".env",
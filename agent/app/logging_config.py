@@ -0,0 +1,236 @@
+"""ログ出力の設定。
+
+ログの書き込み (stderr への I/O) がイベントループを止めないよう、
+ロガーは `QueueHandler` でキューに積むだけにし、書き込みは
+`QueueListener` の専用スレッドで行う。
+
+- JSON 形式 (Cloud Logging の構造化ログ) または従来のテキスト形式で出力する。
+- `bind_log_context` で設定した user_id / chat_id / session_id を各行に付与する。
+- DEBUG ログはサンプリングし、呼び出し箇所ごとにレート制限する (INFO 以上は常に出力)。
+- キューが満杯の場合はログを破棄し、件数を `stats()` で確認できる。
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from datetime import UTC, datetime
+from logging.handlers import QueueHandler, QueueListener
+
+from app.config import settings
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# 接続ごとのログコンテキスト (asyncio のタスク単位で引き継がれる)
+_log_context: contextvars.ContextVar[dict | None] = contextvars.ContextVar(
+    "log_context", default=None
+)
+
+# LogRecord の標準属性 (extra で渡された項目と区別するために使用)
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message",
+    "asctime",
+    "log_context",
+}
+
+_listener: QueueListener | None = None
+_queue_handler: "_NonBlockingQueueHandler | None" = None
+_sampling_filter: "SamplingFilter | None" = None
+
+
+def bind_log_context(**fields) -> None:
+    """
+    現在のタスク (とそこから作成されるタスク) のログに付与する項目を追加する。
+
+    WebSocket の接続ごとにタスクが分かれるため、接続の処理中に呼び出せば
+    他の接続のログには影響しない。
+
+    Args:
+        **fields: 付与する項目 (user_id, chat_id, session_id など)。
+            None の項目は無視する。
+    """
+    context = dict(_log_context.get() or {})
+    context.update({k: v for k, v in fields.items() if v is not None})
+    _log_context.set(context)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    DEBUG ログを間引き、呼び出し箇所ごとにレート制限するフィルター。
+
+    INFO 以上のログは常に出力する。
+    """
+
+    def __init__(self, rate_per_sec: float, debug_sample_rate: float):
+        """
+        Args:
+            rate_per_sec: DEBUG ログの呼び出し箇所ごとの 1 秒あたりの最大件数
+                (0 で無制限)。
+            debug_sample_rate: DEBUG ログを出力する割合 (0.0〜1.0)。
+        """
+        super().__init__()
+        self.rate_per_sec = rate_per_sec
+        self.debug_sample_rate = debug_sample_rate
+        # (pathname, lineno) -> (残りトークン, 最終更新時刻)
+        self._buckets: dict[tuple[str, int], tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self.sampled_out = 0
+        self.rate_limited = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+
+        if self.debug_sample_rate < 1.0 and random.random() >= self.debug_sample_rate:
+            self.sampled_out += 1
+            return False
+
+        if self.rate_per_sec <= 0:
+            return True
+
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.rate_per_sec, now))
+            tokens = min(
+                self.rate_per_sec, tokens + (now - updated_at) * self.rate_per_sec
+            )
+            if tokens < 1.0:
+                self._buckets[key] = (tokens, now)
+                self.rate_limited += 1
+                return False
+            self._buckets[key] = (tokens - 1.0, now)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Cloud Logging が解釈できる JSON 形式 (1 行 1 レコード) に整形するフォーマッター。
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, UTC).isoformat(),
+            "severity": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "log_context", None) or {})
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _ContextTextFormatter(logging.Formatter):
+    """テキスト形式の末尾にログコンテキストを付与するフォーマッター。"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        context = getattr(record, "log_context", None)
+        if context:
+            text += " [" + " ".join(f"{k}={v}" for k, v in context.items()) + "]"
+        return text
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    呼び出し元のスレッドでは文字列化とキューへの追加だけを行うハンドラー。
+
+    キューが満杯の場合は待たずにログを破棄する。
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.enqueued = 0
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 別スレッドで整形するため、メッセージの組み立て・例外の文字列化と
+        # コンテキストの取得は呼び出し元で済ませる
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.log_context = _log_context.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging() -> None:
+    """
+    ルートロガーを設定し、書き込み用のスレッドを開始する。
+
+    複数回呼び出された場合は 2 回目以降を無視する。
+    """
+    global _listener, _queue_handler, _sampling_filter
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler()
+    if settings.log_format.lower() == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(_ContextTextFormatter(TEXT_FORMAT))
+
+    _sampling_filter = SamplingFilter(
+        rate_per_sec=settings.log_rate_limit_per_sec,
+        debug_sample_rate=settings.log_debug_sample_rate,
+    )
+    _queue_handler = _NonBlockingQueueHandler(queue.Queue(settings.log_queue_size))
+    _queue_handler.addFilter(_sampling_filter)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(settings.log_level.upper())
+
+    _listener = QueueListener(_queue_handler.queue, output)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """
+    キューに残っているログを書き出してから書き込み用のスレッドを停止する。
+    """
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+
+
+def stats() -> dict:
+    """
+    ログ出力の統計情報を返す。
+    """
+    if _queue_handler is None or _sampling_filter is None:
+        return {}
+    return {
+        "enqueued": _queue_handler.enqueued,
+        "dropped": _queue_handler.dropped,
+        "queue_depth": _queue_handler.queue.qsize(),
+        "rate_limited": _sampling_filter.rate_limited,
+        "sampled_out": _sampling_filter.sampled_out,
+    }
@@ -0,0 +1,264 @@
+"""チャット履歴の読み取り API。
+
+クライアントが Firestore に直接クエリを発行する代わりに、チャット一覧と
+メッセージをページ単位で返す。
+
+- カーソル方式のページング (`cursor` に前のレスポンスの `nextCursor` を指定)
+- `fields` による取得フィールドの射影 (Firestore の select で読み取り量を削減)
+- ETag / `If-None-Match` による 304 応答
+- ユーザーごとのプロセス内キャッシュ (`app/services/history_cache.py`)
+"""
+
+import base64
+import hashlib
+import json
+import logging
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime
+
+import pydantic_core
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+
+from app.config import settings
+from app.services.auth_service import verify_id_token
+from app.services.firestore_service import get_chat_owner, list_chats, list_messages
+from app.services.history_cache import history_cache
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# クライアントに返すことのできるフィールド (sessionId などサーバー用のものは除く)
+CHAT_FIELDS = ("title", "createdAt", "updatedAt")
+MESSAGE_FIELDS = ("role", "content", "toolCalls", "createdAt")
+
+
+async def authenticate(authorization: str | None = Header(default=None)) -> str:
+    """
+    `Authorization: Bearer <Firebase ID トークン>` を検証し、ユーザー ID を返す。
+    """
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Missing bearer token")
+    try:
+        decoded_token = await verify_id_token(token.strip())
+    except Exception as e:
+        logger.warning(f"トークン検証失敗: {e}")
+        raise HTTPException(
+            status_code=401, detail="Invalid authentication token"
+        ) from e
+    return decoded_token["uid"]
+
+
+def _parse_fields(fields: str | None, allowed: tuple[str, ...]) -> list[str]:
+    if not fields:
+        return list(allowed)
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    return list(dict.fromkeys(requested))
+
+
+def _page_size(limit: int | None) -> int:
+    if limit is None:
+        return settings.history_page_size
+    return max(1, min(limit, settings.history_page_size_max))
+
+
+def _timestamp_text(value: datetime) -> str:
+    if isinstance(value, DatetimeWithNanoseconds):
+        return value.rfc3339()
+    return value.astimezone(UTC).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def encode_cursor(document: dict, order_field: str) -> str:
+    """
+    ページの最後のドキュメントから次のページのカーソルを作成する。
+
+    カーソルは (並び替えのフィールドの値, ドキュメント ID) を JSON にして
+    URL-safe base64 で符号化した不透明な文字列。
+    """
+    payload = json.dumps([_timestamp_text(document[order_field]), document["id"]])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None) -> tuple[datetime, str] | None:
+    """
+    カーソルを (並び替えのフィールドの値, ドキュメント ID) に復元する。
+
+    Raises:
+        HTTPException: カーソルが不正な場合 (400)。
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, document_id = json.loads(base64.urlsafe_b64decode(padded))
+        return DatetimeWithNanoseconds.from_rfc3339(timestamp), str(document_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or any(
+        candidate.removeprefix("W/") == etag for candidate in candidates
+    )
+
+
+def _response(etag: str, body: bytes, if_none_match: str | None) -> Response:
+    # キャッシュしたレスポンスは再検証させる (他ユーザーと共有しない)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def _serve_page(
+    request: Request,
+    user_id: str,
+    fetch: Callable[[int, tuple[datetime, str] | None, list[str]], Awaitable[list]],
+    order_field: str,
+    limit: int | None,
+    fields: list[str],
+    cursor: str | None,
+    chat_ids: Callable[[list[dict]], list[str]],
+    if_none_match: str | None,
+    authorize: Callable[[], Awaitable[None]] | None = None,
+) -> Response:
+    """
+    キャッシュを確認し、なければ 1 ページ分を取得してレスポンスを返す。
+
+    Args:
+        fetch: `(limit, start_after, fields)` を受け取り、ドキュメントを返す関数。
+        order_field: 並び替えのフィールド (カーソルの作成に使用)。
+        chat_ids: ページのドキュメントから、含まれるチャット ID を返す関数。
+        authorize: キャッシュにない場合に、読み取る前に権限を確認する関数。
+            キャッシュにあるページは確認済みのため呼び出さない。
+    """
+    limit = _page_size(limit)
+    start_after = decode_cursor(cursor)
+    key = f"{request.url.path}?{limit}|{','.join(fields)}|{cursor or ''}"
+    cached = history_cache.get(user_id, key)
+    if cached is not None:
+        return _response(cached.etag, cached.body, if_none_match)
+
+    generation = history_cache.generation(user_id)
+    if authorize is not None:
+        await authorize()
+    try:
+        # 次のページがあるかを判定するため 1 件多く取得する
+        documents = await fetch(limit + 1, start_after, fields)
+    except Exception as e:
+        logger.error(f"Error reading chat history: {e}", exc_info=True)
+        raise HTTPException(status_code=503, detail="History unavailable") from e
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor(documents[-1], order_field)
+
+    items = [
+        {"id": document["id"]}
+        | {name: document[name] for name in fields if name in document}
+        for document in documents
+    ]
+    body = pydantic_core.to_json(
+        {"items": items, "nextCursor": next_cursor}, fallback=str
+    )
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    history_cache.put(user_id, key, etag, body, chat_ids(documents), generation)
+    return _response(etag, body, if_none_match)
+
+
+@router.get("/chats")
+async def get_chats(
+    request: Request,
+    limit: int | None = None,
+    fields: str | None = None,
+    cursor: str | None = None,
+    user_id: str = Depends(authenticate),
+    if_none_match: str | None = Header(default=None),
+) -> Response:
+    """
+    ユーザーのチャット一覧を更新日時の新しい順に返すエンドポイント。
+
+    Args:
+        limit: 1 ページの件数 (既定は HISTORY_PAGE_SIZE)。
+        fields: 返すフィールドのカンマ区切り (title, createdAt, updatedAt)。
+        cursor: 前のページの `nextCursor`。
+
+    Returns:
+        `{"items": [{"id": ..., ...}], "nextCursor": str | null}`。
+    """
+
+    async def fetch(page_limit, start_after, page_fields):
+        return await list_chats(user_id, page_limit, start_after, page_fields)
+
+    return await _serve_page(
+        request,
+        user_id,
+        fetch,
+        "updatedAt",
+        limit,
+        _parse_fields(fields, CHAT_FIELDS),
+        cursor,
+        lambda documents: [document["id"] for document in documents],
+        if_none_match,
+    )
+
+
+@router.get("/chats/{chat_id}/messages")
+async def get_messages(
+    request: Request,
+    chat_id: str,
+    limit: int | None = None,
+    fields: str | None = None,
+    cursor: str | None = None,
+    user_id: str = Depends(authenticate),
+    if_none_match: str | None = Header(default=None),
+) -> Response:
+    """
+    チャットのメッセージを作成日時の新しい順に返すエンドポイント。
+
+    Args:
+        chat_id: チャットセッションの ID。
+        limit: 1 ページの件数 (既定は HISTORY_PAGE_SIZE)。
+        fields: 返すフィールドのカンマ区切り (role, content, toolCalls, createdAt)。
+        cursor: 前のページの `nextCursor`。
+
+    Returns:
+        `{"items": [{"id": ..., ...}], "nextCursor": str | null}`。
+    """
+
+    async def authorize():
+        try:
+            owner = await get_chat_owner(chat_id)
+        except Exception as e:
+            logger.error(f"Error reading chat owner: {e}", exc_info=True)
+            raise HTTPException(status_code=503, detail="History unavailable") from e
+        # 他のユーザーのチャットは存在しないものとして扱う
+        if owner != user_id:
+            raise HTTPException(status_code=404, detail="Chat not found")
+
+    async def fetch(page_limit, start_after, page_fields):
+        return await list_messages(chat_id, page_limit, start_after, page_fields)
+
+    return await _serve_page(
+        request,
+        user_id,
+        fetch,
+        "createdAt",
+        limit,
+        _parse_fields(fields, MESSAGE_FIELDS),
+        cursor,
+        lambda documents: [chat_id],
+        if_none_match,
+        authorize,
+    )
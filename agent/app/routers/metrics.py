@@ -0,0 +1,72 @@
+import hmac
+
+from fastapi import APIRouter, Header, HTTPException, Response
+
+from app.config import settings
+from app.logging_config import stats as logging_stats
+from app.services.admission import admission_controller
+from app.services.client_pool import client_pool
+from app.services.history_cache import history_cache
+from app.services.job_events import job_event_bus
+from app.services.job_executor import image_job_executor
+from app.services.metrics import render_latest
+from app.services.prompt_cache import prompt_cache
+from app.services.resumption_store import resumption_store
+
+router = APIRouter()
+
+
+def _authorized(authorization: str | None) -> bool:
+    if not settings.metrics_token:
+        return True
+    scheme, _, token = (authorization or "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(
+        token.strip().encode(), settings.metrics_token.encode()
+    )
+
+
+def _check_access(authorization: str | None) -> None:
+    """
+    METRICS_ENABLED が無効の場合は存在しないものとして 404 を返す。
+    METRICS_TOKEN を設定した場合は `Authorization: Bearer <トークン>` を要求する。
+    """
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not _authorized(authorization):
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+@router.get("/metrics")
+async def metrics(authorization: str | None = Header(default=None)) -> Response:
+    """
+    Prometheus 形式のメトリクスを返すエンドポイント。
+
+    公開設定は `/stats` と共通 (METRICS_ENABLED / METRICS_TOKEN)。
+    """
+    _check_access(authorization)
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
+
+@router.get("/stats")
+async def stats(authorization: str | None = Header(default=None)) -> dict:
+    """
+    このワーカーの各コンポーネントの統計情報を返すエンドポイント。
+
+    公開設定は `/metrics` と共通 (METRICS_ENABLED / METRICS_TOKEN)。
+    """
+    _check_access(authorization)
+    return {
+        "admission": admission_controller.stats(),
+        "image_jobs": image_job_executor.stats(),
+        "image_job_events": job_event_bus.stats(),
+        "client_pool": client_pool.stats(),
+        "history_cache": history_cache.stats(),
+        "prompt_cache": prompt_cache.stats(),
+        "resumption": resumption_store.stats(),
+        "logging": logging_stats(),
+    }
@@ -1,24 +1,91 @@
 import asyncio
+import json
 import logging
+import time
+from dataclasses import dataclass
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from firebase_admin import auth
 from google.adk.agents.live_request_queue import LiveRequestQueue
 from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.genai import types
 
+from app.config import settings
+from app.logging_config import bind_log_context
+from app.services.admission import (
+    CLOSE_SESSION_REPLACED,
+    CLOSE_TRY_AGAIN_LATER,
+    AdmissionRejected,
+    admission_controller,
+)
+from app.services.audio_ingest import AudioIngestor
+from app.services.audio_input import AudioInputPipeline, parse_input_format
+from app.services.audio_output import (
+    OUTPUT_OPUS,
+    OpusStreamEncoder,
+    normalize_output_format,
+)
+from app.services.auth_service import verify_id_token
+from app.services.event_projection import EventProjector, negotiate_projection
 from app.services.firestore_service import (
-    ensure_chat_exists,
-    ensure_user_exists,
-    get_session_id_for_chat,
-    save_message,
+    ChatAccessDenied,
+    bootstrap_connection,
     set_session_id_for_chat,
 )
+from app.services.idle import IdleTracker
+from app.services.job_events import job_event_bus
+from app.services.message_writer import MessageWriteBuffer
+from app.services.metrics import (
+    ACTIVE_SESSIONS,
+    BOOTSTRAP_SECONDS,
+    EVENT_SEND_SECONDS,
+    FIRST_AUDIO_SECONDS,
+    SUSPENDED_SESSIONS,
+    WS_HANDSHAKE_SECONDS,
+)
+from app.services.resumption_store import resumption_store
+from app.services.shutdown import shutdown_coordinator
+from app.services.vad import EnergyVad
+from app.services.wire_format import (
+    AUDIO_CODEC_OPUS,
+    DEFAULT_OUTPUT_SAMPLE_RATE,
+    WIRE_BINARY,
+    encode_audio_frame,
+    has_audio_part,
+    normalize_wire,
+    parse_sample_rate,
+    split_audio_parts,
+    wire_handshake_message,
+)
 from app.tools import SessionFinishedException
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# シャットダウン時にクライアントへ送信する再接続の依頼
+_RECONNECT_MESSAGE = '{"type":"reconnect","reason":"server_shutdown"}'
+# 同じ chat_id の新しい接続に置き換えられたことの通知
+_REPLACED_MESSAGE = '{"type":"session_replaced"}'
+# アイドルのため Live セッションを一時停止・再開したことの通知
+_SUSPENDED_MESSAGE = '{"type":"session_suspended"}'
+_RESUMED_MESSAGE = '{"type":"session_resumed"}'
+# 一時停止時に Live セッションの終了を待つ最大時間 (秒)
+_LEG_CLOSE_TIMEOUT_SEC = 5.0
+
+
+@dataclass
+class _LiveLeg:
+    """
+    1 つの Live セッション (モデルとの接続) に紐付くリソース。
+
+    WebSocket の接続中にアイドルで一時停止・再開するたびに作り直す。
+    """
+
+    queue: LiveRequestQueue
+    ingestor: AudioIngestor
+    task: asyncio.Task | None = None
+    # 一時停止または接続の終了のために閉じている途中かどうか
+    closing: bool = False
+
 
 @router.websocket("/ws")
 async def websocket_endpoint(
@@ -26,6 +93,12 @@ async def websocket_endpoint(
     token: str | None = None,
     chat_id: str | None = None,
     response_mode: str = "audio",
+    wire: str = "json",
+    vad: bool = False,
+    input_format: str = "pcm16",
+    output_format: str = "pcm16",
+    projection: int = 0,
+    idle_suspend: bool = False,
 ):
     """
     WebSocket エンドポイント。
@@ -38,7 +111,25 @@ async def websocket_endpoint(
         token: Firebase Authentication ID トークン (クエリパラメータ、必須)。
         chat_id: チャットセッションの ID (クエリパラメータ、必須)。
         response_mode: レスポンスのモード。"audio" (デフォルト) または "text"。
+        wire: 送信形式。"json" (デフォルト) または "binary"。
+            "binary" の場合、音声はヘッダー付きのバイナリフレームで送信される。
+        vad: True の場合、サーバー側の VAD で無音区間を除外し、
+            発話の開始・終了をモデルに明示的に通知する。
+        input_format: 送信する音声のフォーマット。"pcm16" (デフォルト、16kHz)、
+            "pcm16:<rate>" (任意のサンプルレート)、"opus" のいずれか。
+            サーバー側で 16kHz PCM に変換してからモデルに送信する。
+        output_format: 応答音声のフォーマット。"pcm16" (デフォルト) または "opus"。
+            "opus" は wire="binary" の場合のみ有効で、実際に使用する形式は
+            接続直後の wire_format メッセージで通知される。
+        projection: イベント射影のバージョン。1 以上を指定すると、ADK の
+            イベント全体ではなくクライアントが使用するフィールドだけを送信する。
+            実際に使用するバージョンは wire_format メッセージで通知される。
+        idle_suspend: True の場合、発話・応答が `live_idle_timeout_sec` 秒ない間は
+            Live セッションを一時停止する。一時停止と再開は
+            session_suspended / session_resumed メッセージで通知される。
     """
+    connect_started = time.perf_counter()
+
     # 接続受け入れ前に必須パラメータを検証
     if not token or not chat_id:
         logger.warning(
@@ -47,26 +138,103 @@ async def websocket_endpoint(
         await websocket.close(code=1008, reason="Missing required parameters")
         return
 
+    # シャットダウン中は新規接続を受け付けない (クライアントは別インスタンスに再接続)
+    if shutdown_coordinator.draining:
+        await websocket.close(code=1012, reason="Server is shutting down")
+        return
+
+    try:
+        audio_input = AudioInputPipeline(parse_input_format(input_format))
+    except ValueError as e:
+        logger.warning(f"入力フォーマットエラー: {e}")
+        await websocket.close(code=1008, reason="Unsupported input_format")
+        return
+
     # Firebase ID トークンを検証し、ユーザーIDを取得
     user_id: str | None = None
     try:
-        decoded_token = auth.verify_id_token(token)
+        # 署名検証はスレッドで実行し、検証済みトークンはキャッシュから返す
+        decoded_token = await verify_id_token(token)
         user_id = decoded_token["uid"]
         logger.info(f"認証成功: user_id={user_id}")
+        # 以降この接続で出力するログに user_id / chat_id を付与する
+        bind_log_context(user_id=user_id, chat_id=chat_id)
     except Exception as e:
         logger.warning(f"トークン検証失敗: {e}")
         await websocket.close(code=1008, reason="Invalid authentication token")
         return
 
+    # 同時セッション数の上限と chat_id の重複を確認する
+    try:
+        admission_token, evict_previous = await admission_controller.admit(
+            user_id, chat_id, lambda: _close_replaced_session(websocket)
+        )
+    except AdmissionRejected as e:
+        logger.warning(f"接続を拒否: reason={e.reason}, retry_after={e.retry_after}")
+        await _reject_admission(websocket, e)
+        return
+
+    if evict_previous is not None:
+        try:
+            await evict_previous()
+        except Exception as e:
+            logger.warning(f"Failed to close replaced session: {e}")
+
+    try:
+        await _run_session(
+            websocket,
+            user_id=user_id,
+            chat_id=chat_id,
+            response_mode=response_mode,
+            wire=wire,
+            vad=vad,
+            audio_input=audio_input,
+            output_format=output_format,
+            projection=projection,
+            idle_suspend=idle_suspend,
+            connect_started=connect_started,
+        )
+    finally:
+        await admission_controller.release(admission_token)
+
+
+async def _run_session(
+    websocket: WebSocket,
+    user_id: str,
+    chat_id: str,
+    response_mode: str,
+    wire: str,
+    vad: bool,
+    audio_input: AudioInputPipeline,
+    output_format: str,
+    projection: int,
+    idle_suspend: bool,
+    connect_started: float,
+) -> None:
+    """
+    受け入れ済みの接続で Live セッションを実行する。
+
+    引数は `websocket_endpoint` のクエリパラメータを検証したもの。
+    """
     # 認証成功後、WebSocket 接続を受け入れ
     await websocket.accept()
+    WS_HANDSHAKE_SECONDS.observe(time.perf_counter() - connect_started)
+    wire = normalize_wire(wire)
+    output_format = normalize_output_format(output_format, wire)
+    projection = negotiate_projection(projection)
     logger.info(
-        f"WebSocket 接続確立: user_id={user_id}, chat_id={chat_id}, mode={response_mode}"  # noqa: E501
+        f"WebSocket 接続確立: user_id={user_id}, chat_id={chat_id}, mode={response_mode}, wire={wire}"  # noqa: E501
     )
 
-    # Firestore にユーザーとチャットを作成（存在しない場合）
-    await ensure_user_exists(user_id)
-    is_new_chat = await ensure_chat_exists(user_id, chat_id)
+    # Firestore にユーザーとチャットを作成（存在しない場合）し、
+    # 保存済みの session_id を 1 回の往復でまとめて取得する
+    try:
+        with BOOTSTRAP_SECONDS.time():
+            is_new_chat, session_id = await bootstrap_connection(user_id, chat_id)
+    except ChatAccessDenied:
+        logger.warning(f"他のユーザーのチャットへの接続を拒否: chat_id={chat_id}")
+        await websocket.close(code=1008, reason="Chat not found")
+        return
 
     # main.py で設定された Runner と SessionService を取得
     runner = websocket.app.state.runner
@@ -83,7 +251,6 @@ async def websocket_endpoint(
     #    自動生成した session_id を Firestore に保存
 
     session = None
-    session_id = await get_session_id_for_chat(chat_id)
 
     if session_id:
         # 既存のセッション ID がある場合は取得を試みる
@@ -113,8 +280,20 @@ async def websocket_endpoint(
             await websocket.close(code=1011, reason="Failed to create session")
             return
 
-    # LiveRequestQueue の作成
-    live_request_queue = LiveRequestQueue()
+    bind_log_context(session_id=session_id)
+
+    # メッセージ永続化用の write-behind バッファ
+    # 音声転送がストレージ書き込みを待たないよう、バックグラウンドで一括保存する
+    message_buffer = MessageWriteBuffer(chat_id)
+    message_buffer.start()
+
+    # 下り音声を Opus で送信する場合のエンコーダー (セッション内で使い回す)
+    audio_encoder = None
+    if output_format == OUTPUT_OPUS:
+        audio_encoder = OpusStreamEncoder(DEFAULT_OUTPUT_SAMPLE_RATE)
+
+    # クライアントが使用するフィールドだけを送信する射影 (セッション内で使い回す)
+    projector = EventProjector(projection) if projection else None
 
     # レスポンスモードの設定
     response_modalities = [types.Modality.AUDIO]
@@ -124,18 +303,106 @@ async def websocket_endpoint(
         response_modalities = [types.Modality.TEXT]
         output_audio_transcription = None
 
-    # RunConfig の設定
-    run_config = RunConfig(
-        streaming_mode=StreamingMode.BIDI,
-        response_modalities=response_modalities,
-        input_audio_transcription=types.AudioTranscriptionConfig(),
-        output_audio_transcription=output_audio_transcription,
-        session_resumption=types.SessionResumptionConfig(),
+    # サーバー側 VAD を使う場合はモデル側の自動発話検出を無効にする
+    # (activity start / end を明示的に送信するため)
+    realtime_input_config = None
+    if vad:
+        realtime_input_config = types.RealtimeInputConfig(
+            automatic_activity_detection=types.AutomaticActivityDetection(disabled=True)
+        )
+
+    # 同じチャットの Live セッションが再開可能であればハンドルを渡す
+    # (ネットワーク切断からの再接続時に、履歴を送り直さずに再開できる)
+    resumption_handle = await resumption_store.get(chat_id, session_id)
+    if resumption_handle:
+        logger.info(f"Resuming live session for chat: {chat_id}")
+
+    def build_run_config(handle: str | None) -> RunConfig:
+        return RunConfig(
+            streaming_mode=StreamingMode.BIDI,
+            response_modalities=response_modalities,
+            input_audio_transcription=types.AudioTranscriptionConfig(),
+            output_audio_transcription=output_audio_transcription,
+            session_resumption=types.SessionResumptionConfig(handle=handle),
+            realtime_input_config=realtime_input_config,
+        )
+
+    # 発話・応答がない間は Live セッションを一時停止し、発話の再開時に再接続する
+    # (クライアントが要求した場合のみ。無効な場合は発話の判定も行わない)
+    idle_tracker = (
+        IdleTracker() if idle_suspend and settings.live_idle_timeout_sec > 0 else None
     )
+    # 実行中の Live セッション (一時停止中は None)
+    leg: _LiveLeg | None = None
+    # 一時停止と再開を直列化する
+    leg_lock = asyncio.Lock()
+    # 接続を終了すべきとき (切断、セッション終了、モデルとの接続の終了) に設定される
+    session_done = asyncio.Event()
+
+    def open_leg(handle: str | None) -> _LiveLeg:
+        """
+        Live セッションを開始する (LiveRequestQueue と上り音声の取り込み、
+        Runner からイベントを受信するタスクを作成する)。
+        """
+        queue = LiveRequestQueue()
+        # 上り音声の取り込みステージ (フレームの結合とバックプレッシャー制御)
+        ingestor = AudioIngestor(queue, vad=EnergyVad() if vad else None)
+        ingestor.start()
+        new_leg = _LiveLeg(queue=queue, ingestor=ingestor)
+        new_leg.task = asyncio.create_task(downstream_task(new_leg, handle))
+        return new_leg
+
+    async def close_leg(old: _LiveLeg) -> None:
+        """
+        送信待ちの音声を送り切ってからキューを閉じ、Live セッションの終了を待つ。
+        """
+        old.closing = True
+        await old.ingestor.close()
+        logger.info(f"Upstream ingestion stats: {old.ingestor.stats()}")
+        old.queue.close()
+        if old.task is not None and old.task is not asyncio.current_task():
+            done, _ = await asyncio.wait({old.task}, timeout=_LEG_CLOSE_TIMEOUT_SEC)
+            if not done:
+                old.task.cancel()
+
+    async def suspend() -> None:
+        """アイドル状態の Live セッションを一時停止する。"""
+        nonlocal leg
+        async with leg_lock:
+            if leg is None or session_done.is_set():
+                return
+            old, leg = leg, None
+            logger.info(
+                f"Suspending idle live session ({idle_tracker.idle_for():.0f}s)"
+            )
+            await close_leg(old)
+            idle_tracker.mark_suspended()
+            SUSPENDED_SESSIONS.inc()
+            # 再開時に別のワーカーへ再接続された場合に備えて書き込んでおく
+            await resumption_store.flush(chat_id)
+            await websocket.send_text(_SUSPENDED_MESSAGE)
+
+    async def resume() -> _LiveLeg | None:
+        """
+        一時停止中の Live セッションを、保存済みの再開ハンドルで再開する。
+
+        一時停止していない (接続の終了処理中) 場合は None を返す。
+        """
+        nonlocal leg
+        async with leg_lock:
+            if leg is None and idle_tracker is not None and not session_done.is_set():
+                handle = await resumption_store.get(chat_id, session_id)
+                logger.info(f"Resuming suspended live session (handle={bool(handle)})")
+                leg = open_leg(handle)
+                idle_tracker.mark_resumed()
+                SUSPENDED_SESSIONS.dec()
+                await websocket.send_text(_RESUMED_MESSAGE)
+            return leg
 
     async def upstream_task():
         """
         WebSocket からメッセージを受信し、LiveRequestQueue に送信します。
+        一時停止中は発話またはテキストを受信した時点で Live セッションを再開します。
         """
         try:
             while True:
@@ -143,101 +410,343 @@ async def websocket_endpoint(
 
                 if "bytes" in message:
                     # 音声データ (bytes)
-                    data = message["bytes"]
-                    # ADK は types.Blob でラップする必要がある
-                    # サンプルレートを含めないと policy violation エラーが発生する
-                    blob = types.Blob(data=data, mime_type="audio/pcm;rate=16000")
-                    live_request_queue.send_realtime(blob)
+                    pcm = audio_input.process(message["bytes"])
+                    if not pcm:
+                        continue
+                    speech = (
+                        idle_tracker.observe_audio(pcm)
+                        if idle_tracker is not None
+                        else b""
+                    )
+                    current = leg
+                    if current is None:
+                        if not speech:
+                            # 一時停止中の無音はモデルに送信しない
+                            continue
+                        # 発話の先頭 (プリロールを含む) から再開後のセッションに送る
+                        current = await resume()
+                        if current is None:
+                            continue
+                        pcm = speech
+                    # 小さなフレームはチャンクにまとめてから送信する
+                    current.ingestor.feed(pcm)
 
                 elif "text" in message:
                     # テキストメッセージ
+                    if idle_tracker is not None:
+                        idle_tracker.touch()
+                    current = leg or await resume()
+                    if current is None:
+                        continue
                     text = message["text"]
                     content = types.Content(parts=[types.Part(text=text)])
-                    live_request_queue.send_content(content)
+                    current.queue.send_content(content)
 
         except WebSocketDisconnect:
             logger.info("クライアントが切断しました (Upstream)")
         except Exception as e:
             logger.error(f"Upstream エラー: {e}")
         finally:
-            # クライアント切断時はキューを閉じて終了シグナルを送る
-            live_request_queue.close()
+            session_done.set()
 
-    async def downstream_task():
+    async def downstream_task(current: _LiveLeg, handle: str | None):
         """
         Runner からのイベントを受信し、WebSocket に送信します。
-        文字起こしが完了したイベントを Firestore に保存します。
+        文字起こしが完了したイベントは write-behind バッファ経由で保存します。
         """
+        received_events = 0
+        # ユーザーの発話の文字起こしが完了した時刻 (応答音声の遅延の計測用)
+        utterance_finished_at: float | None = None
         try:
             async for event in runner.run_live(
                 user_id=user_id,
                 session_id=session_id,
-                live_request_queue=live_request_queue,
-                run_config=run_config,
+                live_request_queue=current.queue,
+                run_config=build_run_config(handle),
             ):
-                # イベントを JSON にシリアライズして送信
-                # exclude_none=True でデータ量を削減
-                event_json = event.model_dump_json(exclude_none=True, by_alias=True)
-                await websocket.send_text(event_json)
+                received_events += 1
+                if idle_tracker is not None and (
+                    event.content
+                    or event.input_transcription
+                    or event.output_transcription
+                ):
+                    idle_tracker.touch()
+                if utterance_finished_at is not None and has_audio_part(event):
+                    FIRST_AUDIO_SECONDS.observe(
+                        time.perf_counter() - utterance_finished_at
+                    )
+                    utterance_finished_at = None
+
+                with EVENT_SEND_SECONDS.labels(wire=wire).time():
+                    await _send_event(websocket, event, wire, audio_encoder, projector)
+
+                input_transcription = getattr(event, "input_transcription", None)
+                if input_transcription and input_transcription.finished:
+                    utterance_finished_at = time.perf_counter()
 
-                # 文字起こし完了イベントを Firestore に保存
-                await _save_transcription_if_finished(event, chat_id)
+                # 再接続用に最新のセッション再開ハンドルを保持
+                _capture_resumption_handle(event, chat_id, session_id)
+
+                # 文字起こし完了イベントを書き込みキューに追加
+                _save_transcription_if_finished(event, message_buffer)
 
         except SessionFinishedException:
-            # セッション終了: クライアントに通知してから再スロー
-            logger.info("SessionFinishedException caught in downstream_task")
+            # セッション終了: クライアントに通知して接続を終了する
+            logger.info("Session ended by tool (User requested termination).")
             try:
                 await websocket.send_text('{"type":"end_session"}')
-                logger.info("Sent end_session event to client from downstream_task")
+                logger.info("Sent end_session event to client")
             except Exception as e:
                 logger.warning(f"Failed to send end_session: {e}")
-            raise  # 外側の asyncio.gather に伝播させる
         except Exception as e:
             logger.error(f"Downstream エラー: {e}")
+            if handle and received_events == 0:
+                # ハンドルが失効している可能性があるため、次回は新規に開始する
+                await resumption_store.discard(chat_id)
             # エラー発生時も適切にクローズ処理へ
+        finally:
+            # 一時停止以外でモデルとの接続が終わった場合は接続を終了する
+            if not current.closing:
+                session_done.set()
+
+    async def job_events_task():
+        """
+        このチャットの画像生成ジョブの状態変化を WebSocket に送信します。
+        """
+        while True:
+            message = await job_subscription.get()
+            try:
+                await websocket.send_text(message)
+            except Exception as e:
+                logger.warning(f"Failed to push image job status: {e}")
+                return
 
-    # 双方向タスクの並行実行
+    async def idle_watch_task():
+        """
+        一定時間発話・応答がない Live セッションを一時停止します。
+        """
+        while not session_done.is_set():
+            await asyncio.sleep(settings.live_idle_check_interval_sec)
+            # シャットダウン中は一時停止せず、クライアントの再接続に任せる
+            if idle_tracker.should_suspend() and not shutdown_coordinator.draining:
+                await suspend()
+
+    # バイナリモードまたは射影を使用する場合はネゴシエーション結果を通知
+    if wire == WIRE_BINARY or projector is not None:
+        await websocket.send_text(
+            wire_handshake_message(wire, output_format, projection)
+        )
+
+    # シャットダウン時に再接続を依頼できるよう登録する
+    shutdown_token = shutdown_coordinator.register(
+        lambda: _request_reconnect(websocket)
+    )
+    ACTIVE_SESSIONS.inc()
+    # 画像生成ジョブの状態変化を Firestore のリスナーを介さずに通知する
+    job_subscription = job_event_bus.subscribe(chat_id)
+
+    # 上り・下り・ジョブ通知・アイドル監視のタスクを並行実行し、終了の通知まで待つ
+    leg = open_leg(resumption_handle)
+    background = [
+        asyncio.create_task(upstream_task()),
+        asyncio.create_task(job_events_task()),
+    ]
+    if idle_tracker is not None:
+        background.append(asyncio.create_task(idle_watch_task()))
     try:
-        await asyncio.gather(upstream_task(), downstream_task())
-    except SessionFinishedException:
-        logger.info("Session ended by tool (User requested termination).")
-        # クライアントにセッション終了を通知
-        try:
-            await websocket.send_text('{"type":"end_session"}')
-            logger.info("Sent end_session event to client")
-        except Exception as e:
-            logger.warning(f"Failed to send end_session: {e}")
+        await session_done.wait()
     except Exception as e:
         logger.error(f"セッション全体のエラー: {e}")
     finally:
         logger.info("セッション終了処理")
-        live_request_queue.close()
+        async with leg_lock:
+            if leg is not None:
+                await close_leg(leg)
+                leg = None
         try:
             await websocket.close()
         except Exception:
             pass
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        job_event_bus.unsubscribe(job_subscription)
+        if idle_tracker is not None and idle_tracker.suspended:
+            SUSPENDED_SESSIONS.dec()
+        if idle_tracker is not None and idle_tracker.suspensions:
+            logger.info(f"Idle suspension stats: {idle_tracker.stats()}")
+        if audio_input.decode_errors:
+            logger.warning(f"Upstream decode stats: {audio_input.stats()}")
+        if audio_encoder is not None:
+            logger.info(f"Downstream Opus stats: {audio_encoder.stats()}")
+        if projector is not None:
+            logger.info(f"Downstream projection stats: {projector.stats()}")
+        # 未保存のメッセージを Firestore にフラッシュ
+        await message_buffer.close()
+        await resumption_store.flush(chat_id)
+        ACTIVE_SESSIONS.dec()
+        shutdown_coordinator.unregister(shutdown_token)
+
+
+async def _reject_admission(websocket: WebSocket, rejected: AdmissionRejected) -> None:
+    """
+    上限超過などで受け入れられない接続に、再試行までの秒数を通知して切断する。
+
+    接続を受け入れる前に閉じるとクライアントには理由が届かないため、
+    受け入れてからメッセージを送信し、1013 (Try Again Later) で閉じる。
+
+    Args:
+        websocket: WebSocket 接続オブジェクト。
+        rejected: 拒否の理由と再試行までの秒数。
+    """
+    try:
+        await websocket.accept()
+        await websocket.send_text(
+            json.dumps(
+                {
+                    "type": "admission_rejected",
+                    "reason": rejected.reason,
+                    "retry_after": rejected.retry_after,
+                },
+                separators=(",", ":"),
+            )
+        )
+        await websocket.close(
+            code=CLOSE_TRY_AGAIN_LATER,
+            reason=f"retry_after={rejected.retry_after}",
+        )
+    except Exception as e:
+        logger.debug(f"Failed to notify admission rejection: {e}")
+
+
+async def _close_replaced_session(websocket: WebSocket) -> None:
+    """
+    同じ chat_id の新しい接続に置き換えられたセッションを切断する。
+
+    Args:
+        websocket: 置き換えられたセッションの WebSocket 接続オブジェクト。
+    """
+    try:
+        await websocket.send_text(_REPLACED_MESSAGE)
+    finally:
+        await websocket.close(
+            code=CLOSE_SESSION_REPLACED, reason="Replaced by a newer connection"
+        )
+
+
+async def _request_reconnect(websocket: WebSocket) -> None:
+    """
+    シャットダウン時にクライアントへ再接続を依頼し、接続を閉じる。
 
+    クライアントは同じ chat_id で再接続することで、
+    保存済みのセッションから会話を再開できる。
 
-async def _save_transcription_if_finished(event, chat_id: str) -> None:
+    Args:
+        websocket: WebSocket 接続オブジェクト。
+    """
+    try:
+        await websocket.send_text(_RECONNECT_MESSAGE)
+    finally:
+        # 1012 (Service Restart): 再接続すれば利用できることを示す
+        await websocket.close(code=1012, reason="Server is restarting")
+
+
+async def _send_event(
+    websocket: WebSocket,
+    event,
+    wire: str,
+    audio_encoder: OpusStreamEncoder | None = None,
+    projector: EventProjector | None = None,
+) -> None:
+    """
+    イベントをネゴシエーション済みの送信形式でクライアントに送信する。
+
+    Args:
+        websocket: WebSocket 接続オブジェクト。
+        event: ADK イベントオブジェクト。
+        wire: 送信形式 ("json" | "binary")。
+        audio_encoder: 音声を Opus で送信する場合のセッションのエンコーダー。
+        projector: イベントを射影して送信する場合のセッションの射影。
+    """
+    if wire == WIRE_BINARY:
+        interrupted = bool(getattr(event, "interrupted", None))
+        turn_complete = bool(getattr(event, "turn_complete", None))
+
+        # 音声パートは base64/JSON を経由せずバイナリフレームで送信
+        audio_blobs, event = split_audio_parts(event)
+        for blob in audio_blobs:
+            sample_rate = parse_sample_rate(blob.mime_type)
+            if audio_encoder is None or sample_rate != audio_encoder.sample_rate:
+                await websocket.send_bytes(encode_audio_frame(blob.data, sample_rate))
+                continue
+            for packet in audio_encoder.encode(blob.data):
+                await _send_opus_packet(websocket, packet, sample_rate)
+
+        if audio_encoder is not None:
+            if interrupted:
+                # 割り込まれた応答の残りは再生しない
+                audio_encoder.reset()
+            elif turn_complete:
+                for packet in audio_encoder.flush():
+                    await _send_opus_packet(
+                        websocket, packet, audio_encoder.sample_rate
+                    )
+
+        if event is None:
+            return
+
+    if projector is not None:
+        # クライアントが使用するフィールドだけを送信 (通知する情報がなければ送らない)
+        payload = projector.dump(event)
+        if payload is not None:
+            await websocket.send_text(payload)
+        return
+
+    # イベントを JSON にシリアライズして送信
+    # exclude_none=True でデータ量を削減
+    event_json = event.model_dump_json(exclude_none=True, by_alias=True)
+    await websocket.send_text(event_json)
+
+
+async def _send_opus_packet(websocket: WebSocket, packet: bytes, sample_rate: int):
+    frame = encode_audio_frame(packet, sample_rate, codec=AUDIO_CODEC_OPUS)
+    await websocket.send_bytes(frame)
+
+
+def _capture_resumption_handle(event, chat_id: str, session_id: str) -> None:
     """
-    イベントから完了した文字起こしを検出し Firestore に保存する。
+    セッション再開ハンドルの更新イベントであれば、最新のハンドルを保存する。
 
     Args:
         event: ADK イベントオブジェクト。
         chat_id: チャットセッションの ID。
+        session_id: ADK セッション ID。
+    """
+    update = getattr(event, "live_session_resumption_update", None)
+    if update and update.resumable and update.new_handle:
+        resumption_store.update(chat_id, session_id, update.new_handle)
+
+
+def _save_transcription_if_finished(event, message_buffer: MessageWriteBuffer) -> None:
+    """
+    イベントから完了した文字起こしを検出し、書き込みキューに追加する。
+
+    Args:
+        event: ADK イベントオブジェクト。
+        message_buffer: メッセージ永続化用の write-behind バッファ。
     """
     # ユーザーの入力文字起こし (input_transcription)
     input_transcription = getattr(event, "input_transcription", None)
     if input_transcription and getattr(input_transcription, "finished", False):
         text = getattr(input_transcription, "text", "")
         if text:
-            await save_message(chat_id, "user", text)
-            logger.debug(f"Saved user message: {text[:50]}...")
+            message_buffer.enqueue("user", text)
+            logger.debug(f"Queued user message: {text[:50]}...")
 
     # モデルの出力文字起こし (output_transcription)
     output_transcription = getattr(event, "output_transcription", None)
     if output_transcription and getattr(output_transcription, "finished", False):
         text = getattr(output_transcription, "text", "")
         if text:
-            await save_message(chat_id, "model", text)
-            logger.debug(f"Saved model message: {text[:50]}...")
+            message_buffer.enqueue("model", text)
+            logger.debug(f"Queued model message: {text[:50]}...")
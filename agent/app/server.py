@@ -0,0 +1,137 @@
+"""本番用のサーバーランチャー。
+
+CPU 数に合わせた複数のワーカープロセスで uvicorn を起動する。
+各ワーカーは `main:app` を個別に import するため、Runner やキャッシュは
+プロセスごとに作成され、プロセス間で共有されるのは Firestore / GCS /
+SessionService のバックエンドと、受け入れ制御の SQLite ファイルだけとなる。
+接続はカーネルがワーカーに
+振り分けるため、同じ chat_id の再接続が同じワーカーに届く保証はない
+(セッションアフィニティはない)。プロセスごとの状態の扱いは次のとおり。
+
+- 受け入れ制御: 共有ファイルでインスタンス全体の上限と chat_id の重複を
+  判定する (`app.services.admission`)。
+- チャットの所有者のキャッシュ: 所有者は作成時にしか書き込まれないため共有不要。
+- セッション再開ハンドル: 別のワーカーでは Firestore から読む。接続中の
+  ハンドルは `RESUMPTION_PERSIST_INTERVAL_SEC` ごとにしか書き込まれない。
+- 履歴 API のキャッシュ: 他のワーカーの書き込みでは破棄されないため、
+  最大 `HISTORY_CACHE_TTL_SEC` 秒古い結果を返すことがある。
+- 画像生成ジョブの通知: ジョブを実行しているワーカーの接続にだけ送信する。
+  別のワーカーに再接続した場合は `image_jobs` ドキュメントで状態を確認する。
+
+セッションの正しさがプロセス内の状態に依存する SessionService
+(`_SINGLE_WORKER_SESSION_TYPES`) では、ワーカー数を 1 に固定する。
+
+    python -m app.server
+"""
+
+import importlib.util
+import logging
+import math
+import os
+import tempfile
+
+import uvicorn
+
+from app.config import settings
+from app.logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+# cgroup v2 の CPU 上限 (Cloud Run では割り当てた vCPU 数が反映される)
+_CGROUP_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+
+# 1 ワーカーでしか正しく動作しない SessionService
+# - memory: セッションをプロセス内にしか保持しない
+# - cached-vertexai: バックエンドへの書き込みがプロセス内で保留されるため、
+#   書き込み前に別のワーカーへ再接続するとイベントが欠けたセッションを読む
+_SINGLE_WORKER_SESSION_TYPES = ("memory", "cached-vertexai")
+
+
+def available_cpus() -> int:
+    """
+    このプロセスが使用できる CPU 数を返す。
+
+    コンテナの CPU クォータ、CPU アフィニティ、論理 CPU 数の順に参照する。
+    """
+    try:
+        with open(_CGROUP_CPU_MAX) as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def resolve_workers() -> int:
+    """
+    起動するワーカープロセス数を決定する。
+
+    `SERVER_WORKERS` が 0 の場合は CPU 数に合わせる。
+    ただし、セッションの状態をプロセス内に持つ SessionService では、
+    再接続時に別のワーカーに振り分けられるとセッションが見つからない、
+    またはイベントが欠けるため 1 とする。
+    """
+    workers = settings.server_workers or available_cpus()
+    if workers > 1 and settings.session_type.lower() in _SINGLE_WORKER_SESSION_TYPES:
+        logger.warning(
+            f"SESSION_TYPE={settings.session_type} はワーカー間で"
+            "セッションを共有できないため、ワーカー数を 1 にします"
+        )
+        return 1
+    return workers
+
+
+def _has_module(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+
+def run() -> None:
+    """
+    uvicorn をマルチワーカーで起動する。
+
+    - uvloop / httptools がインストールされていれば使用する。
+    - SIGTERM を受けると、まず接続中のセッションに再接続を依頼してドレインし
+      (`app.services.shutdown`)、その後 uvicorn が新規接続の受け付けを停止して
+      `server_graceful_shutdown_sec` 秒まで処理中のリクエストの完了を待つ。
+    - 複数ワーカーの場合、`/metrics` が全ワーカーの値を集計できるよう
+      Prometheus のマルチプロセスモード用ディレクトリを用意し、受け入れ制御が
+      インスタンス全体で上限と chat_id の重複を判定できるよう共有ファイルを用意する。
+    """
+    workers = resolve_workers()
+    os.environ["SERVER_WORKERS"] = str(workers)
+    if workers > 1:
+        # ワーカーが prometheus_client を import する前に設定する必要がある
+        os.environ.setdefault(
+            "PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="prometheus_")
+        )
+        os.environ.setdefault(
+            "ADMISSION_STATE_PATH",
+            os.path.join(tempfile.mkdtemp(prefix="admission_"), "admission.db"),
+        )
+    loop = "uvloop" if _has_module("uvloop") else "asyncio"
+    http = "httptools" if _has_module("httptools") else "h11"
+    logger.info(f"Starting server: workers={workers}, loop={loop}, http={http}")
+
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=settings.port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        proxy_headers=True,
+        # Live セッションを一時停止中の接続も、切断をプロトコルレベルの ping で検出する
+        ws_ping_interval=settings.ws_ping_interval_sec,
+        ws_ping_timeout=settings.ws_ping_timeout_sec,
+        timeout_graceful_shutdown=settings.server_graceful_shutdown_sec,
+        # uvicorn のログもルートロガー (configure_logging) に流す
+        log_config=None,
+    )
+
+
+if __name__ == "__main__":
+    configure_logging()
+    run()
@@ -0,0 +1,396 @@
+"""Live セッションの受け入れ制御 (admission control)。
+
+1 つのインスタンスで同時に実行する Live セッション数を制限し、
+既に実行中のセッションのレイテンシを守る。
+
+- インスタンス全体とユーザーごとの同時セッション数に上限を設ける。
+  上限に達した場合は、クライアントに再試行までの秒数を返して即座に切断する。
+- 同じ chat_id の接続が重複した場合、古い接続を切断して新しい接続に置き換えるか
+  (replace)、新しい接続を拒否する (reject)。置き換えは同じユーザーの接続に限り、
+  他のユーザーの接続と重複した場合は常に拒否する。
+
+接続中のセッションは SQLite のテーブルに記録する。`app.server` でマルチワーカー
+起動した場合は全ワーカーが同じファイル (`ADMISSION_STATE_PATH`) を WAL モードで
+共有し、上限と chat_id の重複をインスタンス全体で判定する。別のワーカーの
+セッションを置き換える場合は行に印を付け、そのワーカーが
+`ADMISSION_REPLACED_CHECK_INTERVAL_SEC` ごとに確認して切断する。
+終了したワーカーの行は、プロセスの生存を確認して次の判定時に削除する。
+`ADMISSION_STATE_PATH` を設定せずに uvicorn の `--workers` で起動した場合は
+ワーカーごとの判定となる。
+"""
+
+import asyncio
+import logging
+import math
+import os
+import random
+import sqlite3
+import threading
+from collections.abc import Awaitable, Callable
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_REPLACE = "replace"
+DUPLICATE_REJECT = "reject"
+
+# 拒否の理由
+REJECT_INSTANCE_FULL = "instance_full"
+REJECT_USER_LIMIT = "user_limit"
+REJECT_DUPLICATE_CHAT = "duplicate_chat"
+
+# 1013 (Try Again Later): 一時的な過負荷のため、時間をおいて再接続する
+CLOSE_TRY_AGAIN_LATER = 1013
+# 同じ chat_id の新しい接続に置き換えられた (アプリケーション定義のコード)
+CLOSE_SESSION_REPLACED = 4001
+
+# replaced: 別のワーカーで置き換えられ、所有するワーカーによる切断を待っている
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS live_sessions (
+    token INTEGER PRIMARY KEY AUTOINCREMENT,
+    pid INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    replaced INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_live_sessions_chat ON live_sessions (chat_id);
+CREATE INDEX IF NOT EXISTS idx_live_sessions_user ON live_sessions (user_id);
+"""
+
+
+class AdmissionRejected(Exception):
+    """セッションの受け入れを拒否したことを示す例外。"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Admission rejected: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class AdmissionController:
+    """
+    接続中の Live セッションを数え、新しいセッションを受け入れるか判定するクラス。
+    """
+
+    def __init__(
+        self,
+        max_sessions: int,
+        per_user_limit: int,
+        duplicate_policy: str,
+        retry_after_sec: float,
+        state_path: str = "",
+        replaced_check_interval_sec: float = 1.0,
+    ):
+        """
+        Args:
+            max_sessions: インスタンスの最大同時セッション数 (0 で無制限)。
+            per_user_limit: ユーザーごとの最大同時セッション数 (0 で無制限)。
+            duplicate_policy: chat_id が重複した場合の動作 (replace | reject)。
+            retry_after_sec: 拒否した場合に再試行を促すまでの秒数の目安。
+            state_path: ワーカー間で共有する SQLite ファイルのパス。
+                空の場合はこのプロセスのメモリ上に記録する。
+            replaced_check_interval_sec: 別のワーカーで置き換えられた
+                セッションを確認する間隔 (秒)。
+        """
+        self.max_sessions = max_sessions
+        self.per_user_limit = per_user_limit
+        self.duplicate_policy = duplicate_policy.lower()
+        self.retry_after_sec = retry_after_sec
+        self.shared = bool(state_path)
+        self.replaced_check_interval_sec = replaced_check_interval_sec
+
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            state_path or ":memory:", check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(_SCHEMA)
+        # このプロセスのセッションを切断するコールバック (トークン -> evict)
+        self._local: dict[int, Callable[[], Awaitable[None]]] = {}
+        self._watch_task: asyncio.Task | None = None
+
+        self.admitted = 0
+        self.replaced = 0
+        self.replaced_by_other_workers = 0
+        self.rejected: dict[str, int] = {
+            REJECT_INSTANCE_FULL: 0,
+            REJECT_USER_LIMIT: 0,
+            REJECT_DUPLICATE_CHAT: 0,
+        }
+
+    def _run(self, fn, *args):
+        """ロックを取得したうえで、DB 操作をスレッドで実行する。"""
+
+        def locked():
+            with self._lock:
+                return fn(*args)
+
+        return asyncio.to_thread(locked)
+
+    @property
+    def active(self) -> int:
+        """接続中のセッション数 (共有している場合はインスタンス全体)。"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM live_sessions WHERE replaced = 0"
+            ).fetchone()[0]
+
+    # --- 内部の同期処理 (スレッドで実行) ---
+
+    def _purge_dead_workers(self) -> None:
+        rows = self._conn.execute(
+            "SELECT DISTINCT pid FROM live_sessions WHERE pid != ?", (self._pid,)
+        ).fetchall()
+        for (pid,) in rows:
+            if not _is_alive(pid):
+                self._conn.execute("DELETE FROM live_sessions WHERE pid = ?", (pid,))
+                logger.info(f"Removed sessions of exited worker: pid={pid}")
+
+    def _admit_locked(
+        self, user_id: str, chat_id: str
+    ) -> tuple[str | None, int, tuple[int, int] | None]:
+        """
+        Returns:
+            (拒否の理由, 新しいセッションのトークン, 置き換えたセッションの
+            (トークン, pid)) のタプル。拒否した場合、理由以外は使用しない。
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._purge_dead_workers()
+            previous = self._conn.execute(
+                "SELECT token, pid, user_id FROM live_sessions "
+                "WHERE chat_id = ? AND replaced = 0",
+                (chat_id,),
+            ).fetchone()
+            # 他のユーザーのセッションは置き換えない
+            if previous is not None and (
+                self.duplicate_policy == DUPLICATE_REJECT or previous[2] != user_id
+            ):
+                self._conn.execute("ROLLBACK")
+                return REJECT_DUPLICATE_CHAT, 0, None
+
+            # 置き換える古いセッションは上限の判定から除外する
+            replacing = 1 if previous is not None else 0
+            active = (
+                self._conn.execute(
+                    "SELECT COUNT(*) FROM live_sessions WHERE replaced = 0"
+                ).fetchone()[0]
+                - replacing
+            )
+            user_active = (
+                self._conn.execute(
+                    "SELECT COUNT(*) FROM live_sessions "
+                    "WHERE user_id = ? AND replaced = 0",
+                    (user_id,),
+                ).fetchone()[0]
+                - replacing
+            )
+            reason = None
+            if self.max_sessions and active >= self.max_sessions:
+                reason = REJECT_INSTANCE_FULL
+            elif self.per_user_limit and user_active >= self.per_user_limit:
+                reason = REJECT_USER_LIMIT
+            if reason is not None:
+                self._conn.execute("ROLLBACK")
+                return reason, 0, None
+
+            replaced = None
+            if previous is not None:
+                previous_token, previous_pid = previous[0], previous[1]
+                if previous_pid == self._pid:
+                    self._conn.execute(
+                        "DELETE FROM live_sessions WHERE token = ?", (previous_token,)
+                    )
+                else:
+                    # 所有するワーカーが切断して行を削除する
+                    self._conn.execute(
+                        "UPDATE live_sessions SET replaced = 1 WHERE token = ?",
+                        (previous_token,),
+                    )
+                replaced = (previous_token, previous_pid)
+
+            cursor = self._conn.execute(
+                "INSERT INTO live_sessions (pid, user_id, chat_id) VALUES (?, ?, ?)",
+                (self._pid, user_id, chat_id),
+            )
+            self._conn.execute("COMMIT")
+            return None, cursor.lastrowid, replaced
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _release_locked(self, token: int) -> None:
+        self._conn.execute("DELETE FROM live_sessions WHERE token = ?", (token,))
+
+    def _take_replaced_locked(self) -> list[int]:
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            tokens = [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT token FROM live_sessions WHERE pid = ? AND replaced = 1",
+                    (self._pid,),
+                )
+            ]
+            self._conn.execute(
+                "DELETE FROM live_sessions WHERE pid = ? AND replaced = 1",
+                (self._pid,),
+            )
+            self._conn.execute("COMMIT")
+            return tokens
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    # --- 公開 API ---
+
+    async def admit(
+        self,
+        user_id: str,
+        chat_id: str,
+        evict: Callable[[], Awaitable[None]],
+    ) -> tuple[int, Callable[[], Awaitable[None]] | None]:
+        """
+        新しいセッションの受け入れを判定し、受け入れる場合は登録する。
+
+        Args:
+            user_id: ユーザー ID。
+            chat_id: チャットセッションの ID。
+            evict: 後から同じ chat_id の接続が来て置き換えられる場合に
+                このセッションを切断するコールバック。
+
+        Returns:
+            (登録解除に使用するトークン, 置き換えられた古いセッションを切断する
+            コールバック) のタプル。置き換えがない場合と、古いセッションが
+            別のワーカーにある場合 (そのワーカーが切断する)、コールバックは None。
+            呼び出し元はコールバックを実行して古いセッションを切断する。
+
+        Raises:
+            AdmissionRejected: 上限に達している、chat_id が重複している (reject)、
+                または chat_id が他のユーザーのセッションと重複している場合。
+        """
+        reason, token, replaced = await self._run(self._admit_locked, user_id, chat_id)
+        if reason is not None:
+            self._reject(reason)
+
+        self._local[token] = evict
+        self.admitted += 1
+        if replaced is None:
+            return token, None
+
+        previous_token, previous_pid = replaced
+        self.replaced += 1
+        if previous_pid != self._pid:
+            logger.info(
+                f"Replacing existing session for chat: {chat_id} on pid={previous_pid}"
+            )
+            return token, None
+        logger.info(f"Replacing existing session for chat: {chat_id}")
+        return token, self._local.pop(previous_token, None)
+
+    async def release(self, token: int) -> None:
+        """
+        セッションの登録を解除する (セッションの終了処理で呼び出す)。
+
+        置き換えによって既に解除されている場合は何もしない。
+        """
+        self._local.pop(token, None)
+        await self._run(self._release_locked, token)
+
+    async def _evict_replaced(self) -> int:
+        """別のワーカーで置き換えられたこのプロセスのセッションを切断する。"""
+        tokens = await self._run(self._take_replaced_locked)
+        evicted = 0
+        for token in tokens:
+            evict = self._local.pop(token, None)
+            if evict is None:
+                continue
+            self.replaced_by_other_workers += 1
+            evicted += 1
+            try:
+                await evict()
+            except Exception as e:
+                logger.warning(f"Failed to close replaced session: {e}")
+        return evicted
+
+    async def _watch_replaced(self) -> None:
+        while True:
+            await asyncio.sleep(self.replaced_check_interval_sec)
+            try:
+                await self._evict_replaced()
+            except Exception as e:
+                logger.warning(f"Failed to check replaced sessions: {e}")
+
+    def start(self) -> None:
+        """
+        ワーカー間で共有している場合、別のワーカーで置き換えられた
+        セッションの確認を開始する (アプリケーションの起動時に呼び出す)。
+        """
+        if self.shared and self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch_replaced())
+
+    async def stop(self) -> None:
+        """置き換えられたセッションの確認を停止する。"""
+        if self._watch_task is None:
+            return
+        self._watch_task.cancel()
+        try:
+            await self._watch_task
+        except asyncio.CancelledError:
+            pass
+        self._watch_task = None
+
+    def _reject(self, reason: str) -> None:
+        self.rejected[reason] += 1
+        # 再接続が同時に集中しないよう、再試行までの秒数をばらつかせる
+        retry_after = math.ceil(self.retry_after_sec * (1 + random.random()))
+        raise AdmissionRejected(reason, retry_after)
+
+    def stats(self) -> dict:
+        """
+        受け入れ制御の統計情報を返す。
+
+        active / users は共有している場合はインスタンス全体、
+        それ以外はこのプロセスで受け付けた件数。
+        """
+        with self._lock:
+            active, users = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT user_id) FROM live_sessions "
+                "WHERE replaced = 0"
+            ).fetchone()
+        return {
+            "shared": self.shared,
+            "active": active,
+            "users": users,
+            "local": len(self._local),
+            "max_sessions": self.max_sessions,
+            "per_user_limit": self.per_user_limit,
+            "admitted": self.admitted,
+            "replaced": self.replaced,
+            "replaced_by_other_workers": self.replaced_by_other_workers,
+            "rejected": dict(self.rejected),
+        }
+
+
+admission_controller = AdmissionController(
+    max_sessions=settings.admission_max_sessions,
+    per_user_limit=settings.admission_per_user_limit,
+    duplicate_policy=settings.admission_duplicate_chat_policy,
+    retry_after_sec=settings.admission_retry_after_sec,
+    state_path=settings.admission_state_path,
+    replaced_check_interval_sec=settings.admission_replaced_check_interval_sec,
+)
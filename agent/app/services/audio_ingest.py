@@ -0,0 +1,248 @@
+"""上り (クライアント → モデル) 音声の取り込みステージ。
+
+WebSocket で受信した小さな PCM フレームを一定時間長のチャンクにまとめてから
+LiveRequestQueue に送信する。モデル側の処理が遅れている場合は
+上限付きのバッファに溜め、上限を超えた分はポリシーに従って破棄・結合する。
+"""
+
+import asyncio
+import logging
+import time
+
+from google.adk.agents.live_request_queue import LiveRequestQueue
+from google.genai import types
+
+from app.config import settings
+from app.services.vad import EnergyVad, VadEvent
+
+logger = logging.getLogger(__name__)
+
+# 入力音声のフォーマット (16bit モノラル PCM)
+INPUT_SAMPLE_RATE = 16000
+_BYTES_PER_SAMPLE = 2
+
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+OVERFLOW_MERGE = "merge"
+
+
+def _ms_to_bytes(ms: float, sample_rate: int) -> int:
+    samples = int(sample_rate * ms / 1000)
+    return samples * _BYTES_PER_SAMPLE
+
+
+class AudioIngestor:
+    """
+    PCM フレームをチャンクにまとめて LiveRequestQueue に送信するクラス。
+
+    - `chunk_ms` 分の音声が溜まるごとに 1 つの Blob として送信する。
+    - LiveRequestQueue の未処理件数が `max_backlog_chunks` 以上の間は送信を保留する。
+    - 保留中の音声が `max_buffer_ms` を超えた場合は `overflow_policy` に従う。
+        - "drop_oldest": 古い音声を破棄する (遅延を抑える)。
+        - "drop_newest": 新しく届いた音声を破棄する。
+        - "merge": 保留中の音声を 1 つの大きなチャンクにまとめて送信する
+          (音声は失われないが、モデル側のキューは増える)。
+    """
+
+    def __init__(
+        self,
+        live_request_queue: LiveRequestQueue,
+        sample_rate: int = INPUT_SAMPLE_RATE,
+        chunk_ms: float | None = None,
+        max_buffer_ms: float | None = None,
+        max_backlog_chunks: int | None = None,
+        overflow_policy: str | None = None,
+        vad: EnergyVad | None = None,
+    ):
+        """
+        Args:
+            live_request_queue: 送信先の LiveRequestQueue。
+            sample_rate: 入力音声のサンプルレート。
+            chunk_ms: 送信するチャンクの長さ (ミリ秒)。
+            max_buffer_ms: 保留できる音声の最大長 (ミリ秒)。
+            max_backlog_chunks: LiveRequestQueue に溜めてよい最大チャンク数。
+            overflow_policy: バッファ上限を超えた場合のポリシー。
+            vad: 無音区間を除外する場合の VAD。発話の開始・終了は
+                activity start / end として LiveRequestQueue に通知する。
+        """
+        self.live_request_queue = live_request_queue
+        self.sample_rate = sample_rate
+        self.mime_type = f"audio/pcm;rate={sample_rate}"
+        self.chunk_ms = chunk_ms or settings.upstream_chunk_ms
+        self.max_buffer_ms = max_buffer_ms or settings.upstream_max_buffer_ms
+        self.max_backlog_chunks = (
+            max_backlog_chunks or settings.upstream_max_backlog_chunks
+        )
+        self.overflow_policy = (
+            overflow_policy or settings.upstream_overflow_policy
+        ).lower()
+        self.vad = vad
+
+        self._chunk_bytes = _ms_to_bytes(self.chunk_ms, sample_rate)
+        self._max_buffer_bytes = max(
+            _ms_to_bytes(self.max_buffer_ms, sample_rate), self._chunk_bytes
+        )
+        self._buffer = bytearray()
+        # バッファ先頭の音声を受信した時刻
+        self._oldest_at: float | None = None
+        self._pump_task: asyncio.Task | None = None
+
+        self.frames_in = 0
+        self.bytes_in = 0
+        self.chunks_out = 0
+        self.bytes_dropped = 0
+        self.max_lag_ms = 0.0
+
+    def start(self) -> None:
+        """保留中の音声を定期的に送信するタスクを開始する。"""
+        if self._pump_task is None:
+            self._pump_task = asyncio.create_task(self._pump())
+
+    def feed(self, data: bytes) -> None:
+        """
+        受信した PCM フレームを取り込む。
+
+        Args:
+            data: 16bit PCM の音声データ。
+        """
+        self.frames_in += 1
+        self.bytes_in += len(data)
+        if self.vad is None:
+            self._append(data)
+            return
+
+        for event in self.vad.process(data):
+            self._handle_vad_event(event)
+
+    def _handle_vad_event(self, event: VadEvent) -> None:
+        if event.kind == "audio":
+            self._append(event.data)
+        elif event.kind == "start":
+            self.live_request_queue.send_activity_start()
+        elif event.kind == "end":
+            # 発話終了の通知より先に、発話区間の音声を送り切る
+            self._flush_buffer()
+            self.live_request_queue.send_activity_end()
+
+    def _append(self, data: bytes) -> None:
+        if not self._buffer:
+            self._oldest_at = time.monotonic()
+
+        if len(self._buffer) + len(data) > self._max_buffer_bytes:
+            self._handle_overflow(data)
+        else:
+            self._buffer += data
+
+        self._drain(flush_partial=False)
+
+    def _handle_overflow(self, data: bytes) -> None:
+        if self.overflow_policy == OVERFLOW_DROP_NEWEST:
+            self.bytes_dropped += len(data)
+            return
+
+        self._buffer += data
+        if self.overflow_policy == OVERFLOW_MERGE:
+            self._flush_buffer()
+            return
+
+        # drop_oldest: サンプル境界を保ったまま先頭を破棄する
+        excess = len(self._buffer) - self._max_buffer_bytes
+        excess += excess % _BYTES_PER_SAMPLE
+        del self._buffer[:excess]
+        self.bytes_dropped += excess
+        self._oldest_at = time.monotonic() - self.buffered_ms / 1000
+
+    def _backlog(self) -> int:
+        # LiveRequestQueue は内部の asyncio.Queue の長さを公開していない
+        queue = getattr(self.live_request_queue, "_queue", None)
+        return queue.qsize() if queue is not None else 0
+
+    def _drain(self, flush_partial: bool) -> None:
+        while self._buffer and self._backlog() < self.max_backlog_chunks:
+            if len(self._buffer) >= self._chunk_bytes:
+                chunk = bytes(self._buffer[: self._chunk_bytes])
+                del self._buffer[: self._chunk_bytes]
+            elif flush_partial:
+                chunk = bytes(self._buffer)
+                self._buffer.clear()
+            else:
+                break
+
+            if self._oldest_at is not None:
+                lag_ms = (time.monotonic() - self._oldest_at) * 1000
+                self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            self._send(chunk)
+            self._oldest_at = (
+                time.monotonic() - self.buffered_ms / 1000 if self._buffer else None
+            )
+
+    def _send(self, chunk: bytes) -> None:
+        # ADK は types.Blob でラップする必要がある
+        # サンプルレートを含めないと policy violation エラーが発生する
+        self.live_request_queue.send_realtime(
+            types.Blob(data=chunk, mime_type=self.mime_type)
+        )
+        self.chunks_out += 1
+
+    async def _pump(self) -> None:
+        interval = self.chunk_ms / 1000
+        while True:
+            await asyncio.sleep(interval)
+            # チャンク長以上待たされた端数の音声も送信する
+            stale = (
+                self._oldest_at is not None
+                and time.monotonic() - self._oldest_at >= interval
+            )
+            self._drain(flush_partial=stale)
+
+    async def close(self) -> None:
+        """
+        定期送信タスクを停止し、保留中の音声を送信する。
+        """
+        if self._pump_task is not None:
+            self._pump_task.cancel()
+            try:
+                await self._pump_task
+            except asyncio.CancelledError:
+                pass
+            self._pump_task = None
+        if self.vad is not None:
+            for event in self.vad.flush():
+                self._handle_vad_event(event)
+        self._flush_buffer()
+
+    def _flush_buffer(self) -> None:
+        # バックログに関係なく、保留中の音声をすべて送信する
+        if self._buffer:
+            self._send(bytes(self._buffer))
+            self._buffer.clear()
+            self._oldest_at = None
+
+    @property
+    def buffered_ms(self) -> float:
+        """保留中の音声の長さ (ミリ秒)。"""
+        samples = len(self._buffer) / _BYTES_PER_SAMPLE
+        return samples * 1000 / self.sample_rate
+
+    def stats(self) -> dict:
+        """
+        取り込みステージの統計情報を返す。
+        """
+        lag_ms = (
+            (time.monotonic() - self._oldest_at) * 1000
+            if self._oldest_at is not None
+            else 0.0
+        )
+        stats = {
+            "frames_in": self.frames_in,
+            "bytes_in": self.bytes_in,
+            "chunks_out": self.chunks_out,
+            "bytes_dropped": self.bytes_dropped,
+            "buffered_ms": round(self.buffered_ms, 1),
+            "backlog_chunks": self._backlog(),
+            "lag_ms": round(lag_ms, 1),
+            "max_lag_ms": round(self.max_lag_ms, 1),
+        }
+        if self.vad is not None:
+            stats["vad"] = self.vad.stats()
+        return stats
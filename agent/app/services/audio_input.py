@@ -0,0 +1,228 @@
+"""上り音声の入力フォーマット変換。
+
+モデルへの入力は 16kHz / 16bit モノラル PCM に固定されているため、
+端末側でリサンプリングすると安価なタブレットではバッテリーを消費する。
+`/ws` の `input_format` で受け付けるフォーマットを指定し、
+サーバー側でチャンクごとに 16kHz PCM へ変換する。
+
+- "pcm16" (既定): 16kHz PCM。変換しない。
+- "pcm16:<rate>": 任意のサンプルレートの PCM。ポリフェーズフィルタで 16kHz に変換する。
+- "opus": 1 メッセージ 1 パケットの Opus。16kHz で直接デコードする (要 opuslib)。
+  デコードできないパケットは破棄して数え、セッションは継続する。
+"""
+
+import logging
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.services.metrics import AUDIO_INPUT_DECODE_ERRORS
+
+try:
+    import opuslib
+except Exception:  # opuslib はオプション依存 (libopus も必要)
+    opuslib = None
+
+logger = logging.getLogger(__name__)
+
+# モデルに送信する入力音声のサンプルレート
+TARGET_SAMPLE_RATE = 16000
+_BYTES_PER_SAMPLE = 2
+_INT16_MAX = 32767
+
+INPUT_PCM16 = "pcm16"
+INPUT_OPUS = "opus"
+
+_MIN_SAMPLE_RATE = 8000
+_MAX_SAMPLE_RATE = 192000
+# Opus の 1 パケットの最大長 (120ms)
+_OPUS_MAX_FRAME_MS = 120
+
+
+@dataclass(frozen=True)
+class InputFormat:
+    """
+    クライアントから送られる音声のフォーマット。
+
+    Attributes:
+        codec: "pcm16" | "opus"。
+        sample_rate: PCM の場合のサンプルレート。
+    """
+
+    codec: str
+    sample_rate: int = TARGET_SAMPLE_RATE
+
+
+def parse_input_format(value: str | None) -> InputFormat:
+    """
+    `input_format` パラメータを解析する。
+
+    Args:
+        value: "pcm16" | "pcm16:<rate>" | "opus"。None の場合は "pcm16"。
+
+    Returns:
+        InputFormat。
+
+    Raises:
+        ValueError: 未対応のフォーマット、または Opus が利用できない場合。
+    """
+    if not value:
+        return InputFormat(INPUT_PCM16)
+
+    codec, _, rate = value.lower().partition(":")
+    if codec == INPUT_OPUS and not rate:
+        if opuslib is None:
+            raise ValueError("Opus input is not available on this server")
+        return InputFormat(INPUT_OPUS)
+
+    if codec == INPUT_PCM16:
+        if not rate:
+            return InputFormat(INPUT_PCM16)
+        if rate.isdigit() and _MIN_SAMPLE_RATE <= int(rate) <= _MAX_SAMPLE_RATE:
+            return InputFormat(INPUT_PCM16, int(rate))
+
+    raise ValueError(f"Unsupported input_format: {value}")
+
+
+class PolyphaseResampler:
+    """
+    有理数比 (L/M) のポリフェーズ FIR によるストリーミングリサンプラー。
+
+    出力サンプルごとに必要な位相のフィルタ係数だけを NumPy でまとめて畳み込む。
+    直前のチャンクの末尾をフィルタ長分だけ保持するため、
+    発話全体をバッファせずにチャンク単位で変換できる。
+    """
+
+    def __init__(
+        self,
+        input_rate: int,
+        output_rate: int = TARGET_SAMPLE_RATE,
+        zero_crossings: int = 12,
+        rolloff: float = 0.92,
+        kaiser_beta: float = 8.0,
+    ):
+        """
+        Args:
+            input_rate: 入力のサンプルレート。
+            output_rate: 出力のサンプルレート。
+            zero_crossings: 片側あたりの sinc のゼロ交差数 (大きいほど高品質・高負荷)。
+            rolloff: ナイキスト周波数に対するカットオフの比率。
+            kaiser_beta: Kaiser 窓のパラメータ。
+        """
+        divisor = math.gcd(input_rate, output_rate)
+        self.up = output_rate // divisor
+        self.down = input_rate // divisor
+
+        # アップサンプリング後のレートで設計したローパスフィルタ
+        cutoff = rolloff / max(self.up, self.down)
+        half_length = zero_crossings * max(self.up, self.down)
+        taps = np.arange(-half_length, half_length + 1, dtype=np.float64)
+        prototype = cutoff * np.sinc(cutoff * taps)
+        prototype *= np.kaiser(len(taps), kaiser_beta)
+        # 各位相の直流ゲインが 1 になるよう正規化する
+        prototype *= self.up / prototype.sum()
+
+        # (位相数, 位相あたりのタップ数) に並べ替える
+        self.taps_per_phase = math.ceil(len(prototype) / self.up)
+        padded = np.zeros(self.taps_per_phase * self.up, dtype=np.float64)
+        padded[: len(prototype)] = prototype
+        self._phases = padded.reshape(self.taps_per_phase, self.up).T.astype(np.float32)
+        self._offsets = np.arange(self.taps_per_phase)
+
+        # 直前までの入力の末尾 (フィルタの履歴)
+        self._history = np.zeros(self.taps_per_phase - 1, dtype=np.float32)
+        self._input_count = 0
+        self._output_count = 0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """
+        入力チャンクを変換する。
+
+        Args:
+            samples: int16 の入力サンプル。
+
+        Returns:
+            int16 の出力サンプル。
+        """
+        buffer = np.concatenate([self._history, samples.astype(np.float32)])
+        # buffer[0] に対応する入力サンプルの通し番号
+        buffer_start = self._input_count - len(self._history)
+        self._input_count += len(samples)
+
+        # 入力サンプルが揃っている出力サンプルだけを計算する
+        end = (self._input_count * self.up + self.down - 1) // self.down
+        outputs = np.arange(self._output_count, end, dtype=np.int64)
+        self._output_count = end
+        self._history = buffer[len(buffer) - len(self._history) :]
+        if len(outputs) == 0:
+            return np.zeros(0, dtype=np.int16)
+
+        positions = outputs * self.down
+        indices = positions // self.up - buffer_start
+        windows = buffer[indices[:, None] - self._offsets[None, :]]
+        filtered = np.einsum("ij,ij->i", windows, self._phases[positions % self.up])
+        return np.clip(np.rint(filtered), -_INT16_MAX - 1, _INT16_MAX).astype(np.int16)
+
+
+class AudioInputPipeline:
+    """
+    クライアントから受信した音声を 16kHz / 16bit PCM に変換するクラス。
+
+    接続ごとに 1 つ作成し、デコーダーやリサンプラーの状態を保持する。
+    """
+
+    def __init__(self, input_format: InputFormat):
+        """
+        Args:
+            input_format: クライアントから送られる音声のフォーマット。
+        """
+        self.input_format = input_format
+        self._remainder = b""
+        self._resampler: PolyphaseResampler | None = None
+        self._decoder = None
+        self.decode_errors = 0
+
+        if input_format.codec == INPUT_OPUS:
+            # libopus は 16kHz で直接デコードできるため、リサンプリングは不要
+            self._decoder = opuslib.Decoder(TARGET_SAMPLE_RATE, 1)
+            self._opus_frame_size = TARGET_SAMPLE_RATE * _OPUS_MAX_FRAME_MS // 1000
+        elif input_format.sample_rate != TARGET_SAMPLE_RATE:
+            self._resampler = PolyphaseResampler(input_format.sample_rate)
+
+    def process(self, data: bytes) -> bytes:
+        """
+        受信したデータを 16kHz PCM に変換する。
+
+        Args:
+            data: クライアントから受信したバイナリメッセージ。
+
+        Returns:
+            16kHz / 16bit モノラル PCM (空の場合もある)。
+            デコードできない Opus パケットの場合は空。
+        """
+        if self._decoder is not None:
+            try:
+                return self._decoder.decode(data, self._opus_frame_size)
+            except opuslib.OpusError as e:
+                # 壊れたパケットは 1 つだけ破棄する (セッションは終了しない)
+                self.decode_errors += 1
+                AUDIO_INPUT_DECODE_ERRORS.inc()
+                if self.decode_errors == 1:
+                    logger.warning(f"Dropped undecodable Opus packet: {e}")
+                return b""
+        if self._resampler is None:
+            return data
+
+        # サンプル境界に満たない端数は次のチャンクに回す
+        data = self._remainder + data
+        usable = len(data) - len(data) % _BYTES_PER_SAMPLE
+        self._remainder = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype=np.int16)
+        return self._resampler.process(samples).tobytes()
+
+    def stats(self) -> dict:
+        """
+        変換の統計情報を返す。
+        """
+        return {"codec": self.input_format.codec, "decode_errors": self.decode_errors}
@@ -0,0 +1,148 @@
+"""下り (モデル → クライアント) 音声の圧縮。
+
+モデルの応答音声は 24kHz / 16bit PCM (384kbps) で返されるため、
+モバイル回線では帯域が不足して音が途切れることがある。
+`output_format=opus` を指定した接続では、イベントが届くたびに
+音声を Opus フレームへ逐次エンコードしてからクライアントに送信する。
+"""
+
+import time
+
+from app.config import settings
+from app.services.wire_format import WIRE_BINARY
+
+try:
+    import opuslib
+except Exception:  # opuslib はオプション依存 (libopus も必要)
+    opuslib = None
+
+OUTPUT_PCM16 = "pcm16"
+OUTPUT_OPUS = "opus"
+
+_BYTES_PER_SAMPLE = 2
+# Opus がサポートするサンプルレート
+_OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def normalize_output_format(output_format: str | None, wire: str) -> str:
+    """
+    クライアントが指定した出力フォーマットを、実際に使用するものに正規化する。
+
+    Opus はフレーム単位で送信するためバイナリワイヤーフォーマットでのみ使用でき、
+    条件を満たさない場合は PCM にフォールバックする。
+
+    Args:
+        output_format: クライアントが指定した出力フォーマット。
+        wire: 正規化済みのワイヤーフォーマット。
+
+    Returns:
+        "opus" または "pcm16"。
+    """
+    if (
+        output_format
+        and output_format.lower() == OUTPUT_OPUS
+        and wire == WIRE_BINARY
+        and opuslib is not None
+    ):
+        return OUTPUT_OPUS
+    return OUTPUT_PCM16
+
+
+class OpusStreamEncoder:
+    """
+    PCM を固定長の Opus フレームに逐次エンコードするクラス。
+
+    接続ごとに 1 つ作成して使い回す。フレーム長に満たない端数は
+    次の音声と結合してからエンコードする。
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        frame_ms: int | None = None,
+        bitrate: int | None = None,
+    ):
+        """
+        Args:
+            sample_rate: 入力 PCM のサンプルレート (Opus がサポートするもの)。
+            frame_ms: 1 フレームの長さ (ミリ秒)。
+            bitrate: 目標ビットレート (bps)。
+        """
+        if sample_rate not in _OPUS_SAMPLE_RATES:
+            raise ValueError(f"Unsupported sample rate for Opus: {sample_rate}")
+
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms or settings.opus_frame_ms
+        self.bitrate = bitrate or settings.opus_bitrate
+        self._frame_samples = sample_rate * self.frame_ms // 1000
+        self._frame_bytes = self._frame_samples * _BYTES_PER_SAMPLE
+
+        self._encoder = opuslib.Encoder(sample_rate, 1, "voip")
+        self._encoder.bitrate = self.bitrate
+        self._pending = bytearray()
+
+        self.frames = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.encode_sec = 0.0
+
+    def encode(self, pcm: bytes) -> list[bytes]:
+        """
+        PCM を追加し、エンコードできたフレームを返す。
+
+        Args:
+            pcm: 16bit モノラル PCM。
+
+        Returns:
+            Opus パケットのリスト。
+        """
+        self.bytes_in += len(pcm)
+        self._pending += pcm
+        packets = []
+        while len(self._pending) >= self._frame_bytes:
+            frame = bytes(self._pending[: self._frame_bytes])
+            del self._pending[: self._frame_bytes]
+            packets.append(self._encode_frame(frame))
+        return packets
+
+    def flush(self) -> list[bytes]:
+        """
+        ターンの終了時に呼び出し、端数を無音で埋めてエンコードする。
+        """
+        if not self._pending:
+            return []
+        frame = bytes(self._pending).ljust(self._frame_bytes, b"\x00")
+        self._pending.clear()
+        return [self._encode_frame(frame)]
+
+    def reset(self) -> None:
+        """
+        割り込み時に呼び出し、未送信の端数とエンコーダーの状態を破棄する。
+        """
+        self._pending.clear()
+        self._encoder.reset_state()
+        self._encoder.bitrate = self.bitrate
+
+    def _encode_frame(self, frame: bytes) -> bytes:
+        started = time.perf_counter()
+        packet = self._encoder.encode(frame, self._frame_samples)
+        self.encode_sec += time.perf_counter() - started
+        self.frames += 1
+        self.bytes_out += len(packet)
+        return packet
+
+    def stats(self) -> dict:
+        """
+        圧縮率とフレームあたりのエンコード時間を返す。
+        """
+        return {
+            "frames": self.frames,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "compression_ratio": (
+                self.bytes_in / self.bytes_out if self.bytes_out else 0.0
+            ),
+            "avg_encode_ms": (
+                self.encode_sec * 1000 / self.frames if self.frames else 0.0
+            ),
+        }
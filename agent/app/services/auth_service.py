@@ -0,0 +1,241 @@
+"""Firebase ID トークン検証サービス。
+
+`auth.verify_id_token` をイベントループ上で同期的に呼び出すと、
+証明書の取得や署名検証の間に他のセッションがすべてブロックされる。
+本モジュールでは以下の仕組みで検証コストを抑える。
+
+- Google 公開鍵 (x509 証明書) を `Cache-Control` の有効期限に従ってキャッシュし、
+  期限が近づいたらバックグラウンドで更新する。
+- 署名検証はスレッドで実行し、イベントループをブロックしない。
+- 検証済みトークンをトークンのハッシュをキーとした LRU に保持し、
+  トークンの `exp` まで再検証を省略する。
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+
+import firebase_admin
+import requests
+from firebase_admin import auth
+from google.auth import jwt
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Firebase ID トークンの署名に使用される公開証明書
+_PUBLIC_CERTS_URL = (
+    "https://www.googleapis.com/robot/v1/metadata/x509/"
+    "securetoken@system.gserviceaccount.com"
+)
+_ISSUER_PREFIX = "https://securetoken.google.com/"
+_MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+# Cache-Control が取得できなかった場合の証明書キャッシュ期間 (秒)
+_DEFAULT_CERTS_MAX_AGE = 3600
+# トークン検証時に許容する時計のずれ (秒)
+_CLOCK_SKEW_SECONDS = 10
+
+
+class PublicKeyCache:
+    """
+    Firebase ID トークンの公開証明書をキャッシュするクラス。
+
+    有効期限内はメモリ上の証明書を返し、期限の `refresh_margin` 秒前になると
+    バックグラウンドで再取得する。同時に複数の取得が走らないよう制御する。
+    """
+
+    def __init__(self, refresh_margin: float):
+        """
+        Args:
+            refresh_margin: 有効期限の何秒前からバックグラウンド更新を行うか。
+        """
+        self.refresh_margin = refresh_margin
+        self._certs: dict[str, str] = {}
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task | None = None
+
+    async def get_certs(self) -> dict[str, str]:
+        """
+        公開証明書 (kid -> PEM) を取得する。
+
+        Returns:
+            公開証明書の辞書。
+        """
+        now = time.monotonic()
+        if self._certs and now < self._expires_at:
+            if now >= self._expires_at - self.refresh_margin:
+                self._schedule_refresh()
+            return self._certs
+
+        # キャッシュがない、または期限切れの場合は取得を待つ
+        async with self._lock:
+            if not self._certs or time.monotonic() >= self._expires_at:
+                await self._refresh()
+        return self._certs
+
+    def _schedule_refresh(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._background_refresh())
+
+    async def _background_refresh(self) -> None:
+        async with self._lock:
+            if time.monotonic() < self._expires_at - self.refresh_margin:
+                return
+            try:
+                await self._refresh()
+            except Exception as e:
+                # 既存の証明書は有効期限まで使い続ける
+                logger.warning(f"Background refresh of public certs failed: {e}")
+
+    async def _refresh(self) -> None:
+        response = await asyncio.to_thread(requests.get, _PUBLIC_CERTS_URL, timeout=10)
+        response.raise_for_status()
+
+        max_age = _DEFAULT_CERTS_MAX_AGE
+        match = _MAX_AGE_PATTERN.search(response.headers.get("Cache-Control", ""))
+        if match:
+            max_age = int(match.group(1))
+
+        self._certs = response.json()
+        self._expires_at = time.monotonic() + max_age
+        logger.info(f"Refreshed Firebase public certs (max-age={max_age}s)")
+
+
+class TokenVerifier:
+    """
+    Firebase ID トークンを検証し、結果をキャッシュするクラス。
+    """
+
+    def __init__(
+        self,
+        project_id: str | None,
+        max_cache_size: int,
+        refresh_margin: float,
+    ):
+        """
+        Args:
+            project_id: Firebase プロジェクト ID。None の場合は
+                Firebase Admin SDK の `verify_id_token` をスレッドで実行する。
+            max_cache_size: 検証済みトークンを保持する最大件数。
+            refresh_margin: 公開証明書のバックグラウンド更新を開始する猶予 (秒)。
+        """
+        self.project_id = project_id
+        self.max_cache_size = max_cache_size
+        self._key_cache = PublicKeyCache(refresh_margin)
+        self._verified: OrderedDict[str, dict] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def verify(self, token: str) -> dict:
+        """
+        ID トークンを検証し、デコード済みのクレームを返す。
+
+        Args:
+            token: Firebase ID トークン。
+
+        Returns:
+            デコード済みのクレーム (`uid` を含む)。
+
+        Raises:
+            ValueError: トークンが無効な場合。
+        """
+        key = hashlib.sha256(token.encode()).hexdigest()
+
+        claims = self._verified.get(key)
+        if claims is not None:
+            if time.time() < claims["exp"]:
+                self._verified.move_to_end(key)
+                self.hits += 1
+                return claims
+            del self._verified[key]
+
+        self.misses += 1
+        if self.project_id:
+            certs = await self._key_cache.get_certs()
+            claims = await asyncio.to_thread(self._decode, token, certs)
+        else:
+            claims = await asyncio.to_thread(auth.verify_id_token, token)
+
+        self._verified[key] = claims
+        if len(self._verified) > self.max_cache_size:
+            self._verified.popitem(last=False)
+        return claims
+
+    def _decode(self, token: str, certs: dict[str, str]) -> dict:
+        """
+        署名・有効期限・audience・issuer を検証してクレームを返す。
+        """
+        claims = jwt.decode(
+            token,
+            certs=certs,
+            audience=self.project_id,
+            clock_skew_in_seconds=_CLOCK_SKEW_SECONDS,
+        )
+
+        if claims.get("iss") != _ISSUER_PREFIX + self.project_id:
+            raise ValueError(f"Invalid token issuer: {claims.get('iss')}")
+        subject = claims.get("sub")
+        if not subject or not isinstance(subject, str) or len(subject) > 128:
+            raise ValueError("Invalid token subject")
+
+        claims["uid"] = subject
+        return claims
+
+    def stats(self) -> dict:
+        """
+        キャッシュの統計情報を返す。
+        """
+        return {
+            "size": len(self._verified),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def _resolve_project_id() -> str | None:
+    # ID トークンは Firebase プロジェクトに対して発行されるため、
+    # 初期化済みの Firebase アプリのプロジェクトを優先する
+    # (Vertex AI や GCS を別の GCP プロジェクトで使う場合がある)
+    try:
+        project_id = firebase_admin.get_app().project_id
+    except Exception:
+        project_id = None
+    return project_id or settings.google_cloud_project
+
+
+_verifier: TokenVerifier | None = None
+
+
+def get_token_verifier() -> TokenVerifier:
+    """
+    TokenVerifier をシングルトンとして取得する。
+
+    Firebase Admin SDK の初期化後に呼び出す必要があるため、遅延生成する。
+    """
+    global _verifier
+    if _verifier is None:
+        _verifier = TokenVerifier(
+            project_id=_resolve_project_id(),
+            max_cache_size=settings.auth_token_cache_size,
+            refresh_margin=settings.auth_certs_refresh_margin_sec,
+        )
+    return _verifier
+
+
+async def verify_id_token(token: str) -> dict:
+    """
+    Firebase ID トークンを非同期に検証する。
+
+    Args:
+        token: Firebase ID トークン。
+
+    Returns:
+        デコード済みのクレーム (`uid` を含む)。
+    """
+    return await get_token_verifier().verify(token)
@@ -0,0 +1,250 @@
+"""ローカルキャッシュ付きの SessionService。
+
+VertexAiSessionService の前段にプロセス内のキャッシュを置き、
+再接続時の `get_session` (全イベント履歴の取得) をローカルで返す。
+イベントの追加はキャッシュに即時反映し、バックエンドへは
+セッションごとに順序を保ったまま非同期で書き込む (write-through)。
+
+同じセッションには別のワーカーやインスタンスもイベントを追加しうるため、
+キャッシュを返す前に、キャッシュした最後のイベント以降のイベントだけを
+バックエンドから取得し、このプロセスが知らないイベントがあれば全体を取得し直す。
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import (
+    GetSessionConfig,
+    ListSessionsResponse,
+)
+
+logger = logging.getLogger(__name__)
+
+_SessionKey = tuple[str, str, str]
+
+# 他のワーカーが追加したイベントのタイムスタンプと比較する際に許容する時計のずれ (秒)
+_CLOCK_SKEW_SEC = 5.0
+
+
+class CachedSessionService(BaseSessionService):
+    """
+    バックエンドの SessionService をラップし、ホットなセッションを
+    LRU + TTL でメモリ上に保持するクラス。
+
+    キャッシュが最新とみなせない場合 (TTL 切れ、書き込み失敗、他のプロセスによる
+    イベントの追加、フィルタ付きの取得) は、保留中の書き込みを待ってから
+    バックエンドに問い合わせる。
+    """
+
+    def __init__(
+        self,
+        backend: BaseSessionService,
+        max_size: int,
+        ttl_sec: float,
+    ):
+        """
+        Args:
+            backend: 永続化を担う SessionService (例: VertexAiSessionService)。
+            max_size: メモリ上に保持する最大セッション数。
+            ttl_sec: キャッシュしたセッションの有効期間 (秒)。
+        """
+        self.backend = backend
+        self.max_size = max_size
+        self.ttl_sec = ttl_sec
+        # key -> (session, キャッシュした時刻)
+        self._sessions: OrderedDict[_SessionKey, tuple[Session, float]] = OrderedDict()
+        # key -> 最後に投入した書き込みタスク
+        self._pending_writes: dict[_SessionKey, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.write_failures = 0
+
+    @staticmethod
+    def _key(app_name: str, user_id: str, session_id: str) -> _SessionKey:
+        return (app_name, user_id, session_id)
+
+    def _remember(self, key: _SessionKey, session: Session) -> None:
+        self._sessions[key] = (session, time.monotonic())
+        self._sessions.move_to_end(key)
+        while len(self._sessions) > self.max_size:
+            evicted_key, _ = self._sessions.popitem(last=False)
+            logger.debug(f"Evicted cached session: {evicted_key[2]}")
+
+    def _get_current(self, key: _SessionKey) -> Session | None:
+        entry = self._sessions.get(key)
+        if entry is None:
+            return None
+        session, cached_at = entry
+        if time.monotonic() - cached_at > self.ttl_sec:
+            del self._sessions[key]
+            return None
+        self._sessions.move_to_end(key)
+        return session
+
+    async def _is_current(self, session: Session) -> bool:
+        """
+        キャッシュしたセッションの後に、他のプロセスがイベントを追加していないか確認する。
+
+        最後のイベント以降のイベントだけを取得するため、全履歴の取得より軽い。
+        このプロセスの書き込みが保留中でも、既知のイベントとして扱うため待たない。
+        """
+        latest = (
+            session.events[-1].timestamp if session.events else session.last_update_time
+        )
+        try:
+            recent = await self.backend.get_session(
+                app_name=session.app_name,
+                user_id=session.user_id,
+                session_id=session.id,
+                config=GetSessionConfig(
+                    after_timestamp=max(0.0, latest - _CLOCK_SKEW_SEC)
+                ),
+            )
+        except Exception as e:
+            logger.warning(f"Failed to validate cached session ({session.id}): {e}")
+            return False
+        if recent is None:
+            return False
+        known_ids = {event.id for event in session.events}
+        return all(event.id in known_ids for event in recent.events)
+
+    async def _wait_pending(self, key: _SessionKey) -> None:
+        task = self._pending_writes.get(key)
+        if task is not None:
+            await asyncio.shield(task)
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: dict[str, Any] | None = None,
+        session_id: str | None = None,
+    ) -> Session:
+        session = await self.backend.create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id
+        )
+        self._remember(self._key(app_name, user_id, session.id), session)
+        return session
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: GetSessionConfig | None = None,
+    ) -> Session | None:
+        key = self._key(app_name, user_id, session_id)
+
+        if config is None:
+            session = self._get_current(key)
+            if session is not None:
+                if await self._is_current(session):
+                    self.hits += 1
+                    return session
+                self.stale += 1
+                self._sessions.pop(key, None)
+                logger.info(f"Cached session is stale, reloading: {session_id}")
+
+        # バックエンドが最新の状態を返せるよう、保留中の書き込みを待つ
+        self.misses += 1
+        await self._wait_pending(key)
+        session = await self.backend.get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+        if session is not None and config is None:
+            self._remember(key, session)
+        return session
+
+    async def list_sessions(
+        self,
+        *,
+        app_name: str,
+        user_id: str | None = None,
+    ) -> ListSessionsResponse:
+        return await self.backend.list_sessions(app_name=app_name, user_id=user_id)
+
+    async def delete_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+    ) -> None:
+        key = self._key(app_name, user_id, session_id)
+        await self._wait_pending(key)
+        self._sessions.pop(key, None)
+        await self.backend.delete_session(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        )
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        # キャッシュ上のセッションに即時反映する
+        event = await super().append_event(session=session, event=event)
+        if event.partial:
+            # 部分イベントは永続化の対象外
+            return event
+
+        key = self._key(session.app_name, session.user_id, session.id)
+        if key in self._sessions:
+            self._remember(key, session)
+
+        # バックエンドが渡されたセッションを更新しても
+        # キャッシュに二重に反映されないよう、イベントを持たない複製を渡す
+        shadow = session.model_copy(update={"state": dict(session.state), "events": []})
+        previous = self._pending_writes.get(key)
+        task = asyncio.create_task(self._write_through(key, previous, shadow, event))
+        self._pending_writes[key] = task
+        task.add_done_callback(lambda t: self._on_write_done(key, t))
+        return event
+
+    async def _write_through(
+        self,
+        key: _SessionKey,
+        previous: asyncio.Task | None,
+        shadow: Session,
+        event: Event,
+    ) -> None:
+        # 同じセッションの書き込みは投入順に行う
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await self.backend.append_event(session=shadow, event=event)
+        except Exception as e:
+            # キャッシュとバックエンドが食い違うため、次回はバックエンドから取得する
+            self.write_failures += 1
+            self._sessions.pop(key, None)
+            logger.error(f"Session write-through failed ({key[2]}): {e}")
+
+    def _on_write_done(self, key: _SessionKey, task: asyncio.Task) -> None:
+        if self._pending_writes.get(key) is task:
+            del self._pending_writes[key]
+
+    async def flush(self) -> None:
+        """
+        保留中のバックエンドへの書き込みがすべて完了するまで待つ。
+        """
+        tasks = list(self._pending_writes.values())
+        if tasks:
+            logger.info(f"Flushing {len(tasks)} pending session writes...")
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        """
+        キャッシュの統計情報を返す。
+        """
+        return {
+            "size": len(self._sessions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "pending_writes": len(self._pending_writes),
+            "write_failures": self.write_failures,
+        }
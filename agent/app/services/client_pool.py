@@ -0,0 +1,128 @@
+"""Google Cloud クライアントのプール。
+
+genai.Client や storage.Client は生成のたびに認証情報の取得と
+HTTP コネクションプールの作成が行われ、TLS ハンドシェイクが繰り返される。
+本モジュールではプロジェクト・ロケーションごとに長寿命のクライアントを保持し、
+画像生成ジョブ間で再利用する。
+"""
+
+import logging
+
+from google import genai
+from google.cloud import storage
+
+logger = logging.getLogger(__name__)
+
+
+class ClientPool:
+    """
+    genai / GCS クライアントとバケットハンドルを保持するクラス。
+
+    クライアントは初回要求時に生成し、以降は同じインスタンスを返す。
+    """
+
+    def __init__(self):
+        self._genai_clients: dict[tuple[str | None, str], genai.Client] = {}
+        self._storage_clients: dict[str | None, storage.Client] = {}
+        self._buckets: dict[tuple[str | None, str], storage.Bucket] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def genai_client(self, project: str | None, location: str) -> genai.Client:
+        """
+        Vertex AI 用の genai.Client を取得する。
+
+        Args:
+            project: Google Cloud プロジェクト ID。
+            location: ロケーション。
+
+        Returns:
+            プロジェクト・ロケーションごとに共有される genai.Client。
+        """
+        key = (project, location)
+        client = self._genai_clients.get(key)
+        if client is not None:
+            self.hits += 1
+            return client
+
+        self.misses += 1
+        client = genai.Client(vertexai=True, project=project, location=location)
+        self._genai_clients[key] = client
+        logger.info(f"Created genai client: project={project}, location={location}")
+        return client
+
+    def storage_client(self, project: str | None = None) -> storage.Client:
+        """
+        GCS クライアントを取得する。
+
+        Args:
+            project: Google Cloud プロジェクト ID (省略時は環境から推定)。
+
+        Returns:
+            プロジェクトごとに共有される storage.Client。
+        """
+        client = self._storage_clients.get(project)
+        if client is not None:
+            return client
+
+        client = storage.Client(project=project)
+        self._storage_clients[project] = client
+        logger.info(f"Created storage client: project={project}")
+        return client
+
+    def bucket(self, bucket_name: str, project: str | None = None) -> storage.Bucket:
+        """
+        GCS バケットのハンドルを取得する。
+
+        Args:
+            bucket_name: バケット名。
+            project: Google Cloud プロジェクト ID (省略時は環境から推定)。
+
+        Returns:
+            共有される storage.Bucket。
+        """
+        key = (project, bucket_name)
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            self.hits += 1
+            return bucket
+
+        self.misses += 1
+        bucket = self.storage_client(project).bucket(bucket_name)
+        self._buckets[key] = bucket
+        return bucket
+
+    def stats(self) -> dict:
+        """
+        プールの統計情報を返す。
+        """
+        return {
+            "genai_clients": len(self._genai_clients),
+            "storage_clients": len(self._storage_clients),
+            "buckets": len(self._buckets),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    async def close(self) -> None:
+        """
+        保持しているクライアントのコネクションを解放する。
+        """
+        for client in self._genai_clients.values():
+            try:
+                await client.aio.aclose()
+                client.close()
+            except Exception as e:
+                logger.warning(f"Failed to close genai client: {e}")
+        for client in self._storage_clients.values():
+            try:
+                client.close()
+            except Exception as e:
+                logger.warning(f"Failed to close storage client: {e}")
+
+        self._genai_clients.clear()
+        self._storage_clients.clear()
+        self._buckets.clear()
+
+
+client_pool = ClientPool()
@@ -0,0 +1,222 @@
+"""クライアント向けのイベント射影 (projection)。
+
+ADK の Event をそのまま `model_dump_json` すると、クライアントが使用しない
+フィールド (id, invocation_id, actions, usage_metadata など) も含めて
+モデル全体を走査するため、イベントごとの CPU 時間と送信量が大きくなる。
+
+`?projection=1` を指定した接続では、クライアントが使用するフィールドだけを
+持つ辞書に射影してからシリアライズする。値のないフィールドは射影の時点で
+省略し、音声は base64 に変換する (キー名は ADK の JSON と同じ camelCase)。
+
+射影のバージョン 1 のスキーマ:
+
+    {
+      "content": {"parts": [{"inlineData": {"data": "...", "mimeType": "..."}},
+                            {"text": "..."}]},
+      "inputTranscription": {"text": "...", "finished": true},
+      "outputTranscription": {"text": "...", "finished": true},
+      "turnComplete": true,
+      "interrupted": true,
+      "toolStatus": [{"id": "...", "name": "...", "status": "started"}],
+      "errorCode": "...",
+      "errorMessage": "..."
+    }
+"""
+
+from typing import TypedDict
+
+import pydantic_core
+
+# 射影なし (ADK の Event をそのまま送信する)
+PROJECTION_NONE = 0
+# サポートする最新の射影バージョン
+PROJECTION_LATEST = 1
+
+TOOL_STARTED = "started"
+TOOL_COMPLETED = "completed"
+
+
+class InlineData(TypedDict, total=False):
+    data: bytes
+    mimeType: str
+
+
+class Part(TypedDict, total=False):
+    inlineData: InlineData
+    text: str
+
+
+class Content(TypedDict):
+    parts: list[Part]
+
+
+class Transcription(TypedDict, total=False):
+    text: str
+    finished: bool
+
+
+class ToolStatus(TypedDict, total=False):
+    id: str
+    name: str
+    status: str
+
+
+class ClientEventV1(TypedDict, total=False):
+    """射影のバージョン 1 でクライアントに送信するイベント。"""
+
+    content: Content
+    inputTranscription: Transcription
+    outputTranscription: Transcription
+    turnComplete: bool
+    interrupted: bool
+    toolStatus: list[ToolStatus]
+    errorCode: str
+    errorMessage: str
+
+
+def negotiate_projection(requested: int | None) -> int:
+    """
+    クライアントが要求した射影バージョンから、実際に使用するものを決定する。
+
+    Args:
+        requested: クライアントが指定したバージョン (0 または未指定で射影なし)。
+
+    Returns:
+        サーバーがサポートする範囲で最も新しいバージョン。
+    """
+    if not requested or requested < 0:
+        return PROJECTION_NONE
+    return min(requested, PROJECTION_LATEST)
+
+
+def _project_transcription(transcription) -> Transcription | None:
+    if transcription is None or (not transcription.text and not transcription.finished):
+        return None
+    projected: Transcription = {}
+    if transcription.text:
+        projected["text"] = transcription.text
+    if transcription.finished:
+        projected["finished"] = True
+    return projected
+
+
+def project_event_v1(event) -> ClientEventV1 | None:
+    """
+    ADK の Event をバージョン 1 のスキーマに射影する。
+
+    Args:
+        event: ADK イベントオブジェクト。
+
+    Returns:
+        射影したイベント。クライアントに通知する情報がない場合は None。
+    """
+    projected: ClientEventV1 = {}
+
+    content = event.content
+    if content is not None and content.parts:
+        parts: list[Part] = []
+        tool_status: list[ToolStatus] = []
+        for part in content.parts:
+            inline_data = part.inline_data
+            if inline_data is not None and inline_data.data:
+                parts.append(
+                    {
+                        "inlineData": {
+                            "data": inline_data.data,
+                            "mimeType": inline_data.mime_type or "",
+                        }
+                    }
+                )
+            elif part.text and not part.thought:
+                parts.append({"text": part.text})
+            elif part.function_call is not None:
+                call = part.function_call
+                tool_status.append(
+                    {
+                        "id": call.id or "",
+                        "name": call.name or "",
+                        "status": TOOL_STARTED,
+                    }
+                )
+            elif part.function_response is not None:
+                response = part.function_response
+                tool_status.append(
+                    {
+                        "id": response.id or "",
+                        "name": response.name or "",
+                        "status": TOOL_COMPLETED,
+                    }
+                )
+        if parts:
+            projected["content"] = {"parts": parts}
+        if tool_status:
+            projected["toolStatus"] = tool_status
+
+    input_transcription = _project_transcription(event.input_transcription)
+    if input_transcription:
+        projected["inputTranscription"] = input_transcription
+    output_transcription = _project_transcription(event.output_transcription)
+    if output_transcription:
+        projected["outputTranscription"] = output_transcription
+
+    if event.turn_complete:
+        projected["turnComplete"] = True
+    if event.interrupted:
+        projected["interrupted"] = True
+    if event.error_code:
+        projected["errorCode"] = str(event.error_code)
+        projected["errorMessage"] = event.error_message or ""
+
+    return projected or None
+
+
+_PROJECTORS = {1: project_event_v1}
+
+
+class EventProjector:
+    """
+    接続ごとに作成し、イベントを射影したうえで JSON にシリアライズするクラス。
+    """
+
+    def __init__(self, version: int):
+        """
+        Args:
+            version: `negotiate_projection` で決定した射影バージョン (1 以上)。
+        """
+        self.version = version
+        self._project = _PROJECTORS[version]
+        self.events = 0
+        self.skipped = 0
+        self.bytes_out = 0
+
+    def dump(self, event) -> str | None:
+        """
+        イベントを射影して JSON 文字列を返す。
+
+        Args:
+            event: ADK イベントオブジェクト。
+
+        Returns:
+            JSON 文字列。クライアントに通知する情報がない場合は None。
+        """
+        projected = self._project(event)
+        if projected is None:
+            self.skipped += 1
+            return None
+        # 射影済みの辞書はスキーマの検証が不要なため、pydantic-core の
+        # シリアライザで直接 JSON にする (bytes は ADK の JSON と同じく base64)
+        payload = pydantic_core.to_json(projected, bytes_mode="base64")
+        self.events += 1
+        self.bytes_out += len(payload)
+        return payload.decode()
+
+    def stats(self) -> dict:
+        """
+        送信したイベント数と送信量を返す。
+        """
+        return {
+            "version": self.version,
+            "events": self.events,
+            "skipped": self.skipped,
+            "bytes_out": self.bytes_out,
+        }
@@ -4,10 +4,16 @@ users, chats, messages, image_jobs コレクションへのデータ操作を提
 """
 
 import logging
+from collections import OrderedDict
+from datetime import UTC, datetime, timedelta
 
+from google.api_core.exceptions import AlreadyExists
 from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
 
 from app.config import settings
+from app.services.history_cache import history_cache
+from app.services.metrics import SAVE_MESSAGE_SECONDS
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +25,175 @@ except Exception as e:
     db = None
 
 
+class ChatAccessDenied(Exception):
+    """チャットが別のユーザーの所有であることを示す例外。"""
+
+    def __init__(self, chat_id: str):
+        super().__init__(f"Chat belongs to another user: {chat_id}")
+        self.chat_id = chat_id
+
+
+# 存在が確認済みのユーザー・チャットのプロセス内キャッシュ
+# 再接続時に Firestore の読み取りを省略するために使用する
+_known_users: OrderedDict[str, None] = OrderedDict()
+# chat_id -> {"userId": str, "sessionId": str | None}
+_known_chats: OrderedDict[str, dict] = OrderedDict()
+
+# 作成の競合 (AlreadyExists) で読み直す場合を含めた試行回数
+_BOOTSTRAP_ATTEMPTS = 2
+
+
+def _remember(cache: OrderedDict, key: str, value) -> None:
+    """LRU キャッシュに値を登録し、上限を超えた古いエントリを削除する。"""
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > settings.bootstrap_cache_size:
+        cache.popitem(last=False)
+
+
+def _invalidate_history(chat_id: str) -> None:
+    """チャットへの書き込み後に、所有者の履歴 API のキャッシュを破棄する。"""
+    known_chat = _known_chats.get(chat_id)
+    history_cache.invalidate_chat(
+        chat_id, known_chat["userId"] if known_chat is not None else None
+    )
+
+
+async def bootstrap_connection(
+    user_id: str,
+    chat_id: str,
+) -> tuple[bool, str | None]:
+    """
+    接続開始時に必要なユーザー・チャットの準備を 1 回の往復でまとめて行う。
+
+    ユーザーとチャットのドキュメントを一括取得し、存在しないものを
+    1 つの WriteBatch で作成する。作成は `create` で行い、同じ chat_id で
+    同時に接続された場合も先に作成した側が所有者になる (後の側は読み直す)。
+    存在が確認済みのユーザー・チャットはプロセス内にキャッシュし、
+    再接続時は読み取り自体を省略する。
+
+    Args:
+        user_id: Firebase Authentication の UID。
+        chat_id: チャットセッションの ID。
+
+    Returns:
+        (is_new_chat, session_id) のタプル。
+        is_new_chat はチャットを新規作成した場合に True。
+        session_id はチャットに紐付く ADK セッション ID (未設定の場合は None)。
+
+    Raises:
+        ChatAccessDenied: チャットが既に別のユーザーの所有である場合。
+    """
+    if db is None:
+        logger.warning("Firestore not initialized. Skipping connection bootstrap.")
+        return False, None
+
+    known_chat = _known_chats.get(chat_id)
+    if (
+        user_id in _known_users
+        and known_chat is not None
+        and known_chat["userId"] == user_id
+    ):
+        _known_users.move_to_end(user_id)
+        _known_chats.move_to_end(chat_id)
+        logger.debug(f"Bootstrap cache hit: user={user_id}, chat={chat_id}")
+        return False, known_chat["sessionId"]
+
+    user_ref = db.collection(settings.users_collection).document(user_id)
+    chat_ref = db.collection(settings.chats_collection).document(chat_id)
+
+    try:
+        for attempt in range(_BOOTSTRAP_ATTEMPTS):
+            try:
+                is_new_chat, session_id = await _bootstrap_documents(
+                    user_id, chat_id, user_ref, chat_ref
+                )
+                break
+            except AlreadyExists:
+                # 読み取りから作成までの間に別の接続が作成した場合は読み直す
+                if attempt + 1 == _BOOTSTRAP_ATTEMPTS:
+                    raise
+                logger.info(f"Bootstrap raced with another writer: chat={chat_id}")
+
+        _remember(_known_users, user_id, None)
+        # 所有者は作成時にしか書き込まれないため、確認済みの所有者はキャッシュしてよい
+        _remember(_known_chats, chat_id, {"userId": user_id, "sessionId": session_id})
+        return is_new_chat, session_id
+    except ChatAccessDenied:
+        raise
+    except Exception as e:
+        logger.error(f"Error bootstrapping connection: {e}", exc_info=True)
+        return False, None
+
+
+async def _bootstrap_documents(
+    user_id: str,
+    chat_id: str,
+    user_ref,
+    chat_ref,
+) -> tuple[bool, str | None]:
+    """
+    ユーザーとチャットを一括取得し、存在しないものを作成する。
+
+    作成は `create` で行うため、読み取り後に別の接続が同じドキュメントを
+    作成していた場合は上書きせずにバッチ全体が AlreadyExists で失敗する。
+
+    Raises:
+        ChatAccessDenied: チャットが別のユーザーの所有である場合。
+        AlreadyExists: 作成しようとしたドキュメントが既に存在した場合。
+    """
+    snapshots = {
+        snapshot.reference.path: snapshot
+        async for snapshot in db.get_all([user_ref, chat_ref])
+    }
+    user_doc = snapshots.get(user_ref.path)
+    chat_doc = snapshots.get(chat_ref.path)
+
+    batch = db.batch()
+    has_writes = False
+
+    if user_doc is None or not user_doc.exists:
+        batch.create(
+            user_ref,
+            {
+                "displayName": "",
+                "createdAt": firestore.SERVER_TIMESTAMP,
+            },
+        )
+        has_writes = True
+
+    is_new_chat = chat_doc is None or not chat_doc.exists
+    session_id = None
+    if is_new_chat:
+        batch.create(
+            chat_ref,
+            {
+                "userId": user_id,
+                "title": "",  # タイトルは後でエージェントが設定
+                "sessionId": None,  # ADK セッション ID（自動生成後に設定）
+                "createdAt": firestore.SERVER_TIMESTAMP,
+                "updatedAt": firestore.SERVER_TIMESTAMP,
+            },
+        )
+        has_writes = True
+    else:
+        chat_data = chat_doc.to_dict() or {}
+        # 他のユーザーのチャットは再利用せず、セッション ID も返さない
+        if chat_data.get("userId") != user_id:
+            raise ChatAccessDenied(chat_id)
+        session_id = chat_data.get("sessionId")
+
+    if has_writes:
+        await batch.commit()
+        if is_new_chat:
+            history_cache.invalidate_user(user_id)
+        logger.info(
+            f"Bootstrapped documents: user={user_id}, chat={chat_id}, "
+            f"is_new_chat={is_new_chat}"
+        )
+    return is_new_chat, session_id
+
+
 async def ensure_user_exists(
     user_id: str,
     display_name: str | None = None,
@@ -43,10 +218,12 @@ async def ensure_user_exists(
                 "displayName": display_name or "",
                 "createdAt": firestore.SERVER_TIMESTAMP,
             }
-            await user_ref.set(user_data)
+            await user_ref.create(user_data)
             logger.info(f"Created user document: {user_id}")
         else:
             logger.debug(f"User already exists: {user_id}")
+    except AlreadyExists:
+        logger.debug(f"User already exists: {user_id}")
     except Exception as e:
         logger.error(f"Error ensuring user exists: {e}", exc_info=True)
 
@@ -81,12 +258,16 @@ async def ensure_chat_exists(
                 "createdAt": firestore.SERVER_TIMESTAMP,
                 "updatedAt": firestore.SERVER_TIMESTAMP,
             }
-            await chat_ref.set(chat_data)
+            # 同時に作成された場合に所有者を上書きしないよう create で作成する
+            await chat_ref.create(chat_data)
             logger.info(f"Created chat document: {chat_id}")
             return True
         else:
             logger.debug(f"Chat already exists: {chat_id}")
             return False
+    except AlreadyExists:
+        logger.debug(f"Chat already exists: {chat_id}")
+        return False
     except Exception as e:
         logger.error(f"Error ensuring chat exists: {e}", exc_info=True)
         return False
@@ -137,6 +318,11 @@ async def set_session_id_for_chat(chat_id: str, session_id: str) -> None:
             }
         )
         logger.info(f"Updated chat {chat_id} with session ID: {session_id}")
+        _invalidate_history(chat_id)
+
+        known_chat = _known_chats.get(chat_id)
+        if known_chat is not None:
+            known_chat["sessionId"] = session_id
     except Exception as e:
         logger.error(f"Error setting session ID: {e}", exc_info=True)
 
@@ -178,13 +364,15 @@ async def save_message(
         if tool_calls:
             message_data["toolCalls"] = tool_calls
 
-        doc_ref = await messages_ref.add(message_data)
-        message_id = doc_ref[1].id
-        logger.info(f"Saved message: {chat_id}/messages/{message_id}")
+        with SAVE_MESSAGE_SECONDS.labels(mode="single").time():
+            doc_ref = await messages_ref.add(message_data)
+            message_id = doc_ref[1].id
 
-        # チャットの updatedAt を更新
-        chat_ref = db.collection(settings.chats_collection).document(chat_id)
-        await chat_ref.update({"updatedAt": firestore.SERVER_TIMESTAMP})
+            # チャットの updatedAt を更新
+            chat_ref = db.collection(settings.chats_collection).document(chat_id)
+            await chat_ref.update({"updatedAt": firestore.SERVER_TIMESTAMP})
+        logger.debug(f"Saved message: {chat_id}/messages/{message_id}")
+        _invalidate_history(chat_id)
 
         return message_id
     except Exception as e:
@@ -192,6 +380,64 @@ async def save_message(
         return None
 
 
+async def save_messages_batch(
+    chat_id: str,
+    messages: list[dict],
+) -> list[str]:
+    """
+    複数のメッセージを 1 つの WriteBatch でサブコレクションに保存する。
+
+    チャットの updatedAt 更新も同じバッチにまとめ、1 回のコミットで書き込む。
+
+    Args:
+        chat_id: チャットセッションの ID。
+        messages: 保存するメッセージのリスト。
+            各要素は {"role": str, "content": str, "toolCalls": list | None,
+            "createdAt": datetime | None}。同一バッチ内で順序を保つため、
+            createdAt にはキュー投入時刻を指定することを推奨する。
+
+    Returns:
+        作成されたメッセージ ID のリスト。エラー時は空リスト。
+    """
+    if db is None:
+        logger.warning("Firestore not initialized. Skipping batch message save.")
+        return []
+
+    if not messages:
+        return []
+
+    chat_ref = db.collection(settings.chats_collection).document(chat_id)
+    messages_ref = chat_ref.collection(settings.messages_collection)
+
+    try:
+        batch = db.batch()
+        message_ids: list[str] = []
+        for message in messages:
+            message_data: dict = {
+                "role": message["role"],
+                "content": message["content"],
+                "createdAt": message.get("createdAt") or firestore.SERVER_TIMESTAMP,
+            }
+            if message.get("toolCalls"):
+                message_data["toolCalls"] = message["toolCalls"]
+
+            doc_ref = messages_ref.document()
+            batch.set(doc_ref, message_data)
+            message_ids.append(doc_ref.id)
+
+        # チャットの updatedAt 更新はフラッシュごとに 1 回だけ行う
+        batch.update(chat_ref, {"updatedAt": firestore.SERVER_TIMESTAMP})
+        with SAVE_MESSAGE_SECONDS.labels(mode="batch").time():
+            await batch.commit()
+
+        logger.debug(f"Saved {len(message_ids)} messages to chat: {chat_id}")
+        _invalidate_history(chat_id)
+        return message_ids
+    except Exception as e:
+        logger.error(f"Error saving message batch: {e}", exc_info=True)
+        return []
+
+
 async def update_chat_title(
     chat_id: str,
     title: str,
@@ -220,12 +466,137 @@ async def update_chat_title(
             }
         )
         logger.info(f"Updated chat title: {chat_id} -> {title}")
+        _invalidate_history(chat_id)
         return True
     except Exception as e:
         logger.error(f"Error updating chat title: {e}", exc_info=True)
         return False
 
 
+# --- Chat History 関連 ---
+
+
+async def get_chat_owner(chat_id: str) -> str | None:
+    """
+    チャットの所有者のユーザー ID を取得する。
+
+    Args:
+        chat_id: チャットセッションの ID。
+
+    Returns:
+        所有者のユーザー ID、またはチャットが存在しない場合は None。
+
+    Raises:
+        Exception: Firestore の読み取りに失敗した場合。
+    """
+    if db is None:
+        return None
+
+    known_chat = _known_chats.get(chat_id)
+    if known_chat is not None:
+        return known_chat["userId"]
+
+    chat_ref = db.collection(settings.chats_collection).document(chat_id)
+    doc = await chat_ref.get(field_paths=["userId"])
+    if not doc.exists:
+        return None
+    return (doc.to_dict() or {}).get("userId")
+
+
+async def _query_page(
+    query,
+    order_field: str,
+    limit: int,
+    start_after: tuple[datetime, str] | None,
+    fields: list[str],
+) -> list[dict]:
+    """
+    更新日時などの降順、同じ値はドキュメント ID の降順で 1 ページ分を取得する。
+
+    Returns:
+        ドキュメントのリスト。各要素は指定したフィールドと "id" を持つ。
+    """
+    query = query.order_by(order_field, direction=firestore.Query.DESCENDING)
+    query = query.order_by(
+        FieldPath.document_id(), direction=firestore.Query.DESCENDING
+    )
+    if start_after is not None:
+        query = query.start_after(list(start_after))
+    # カーソルの作成に使うため、並び替えのフィールドは常に取得する
+    query = query.select(sorted({order_field, *fields})).limit(limit)
+
+    documents = []
+    async for snapshot in query.stream():
+        document = snapshot.to_dict() or {}
+        document["id"] = snapshot.id
+        documents.append(document)
+    return documents
+
+
+async def list_chats(
+    user_id: str,
+    limit: int,
+    start_after: tuple[datetime, str] | None = None,
+    fields: list[str] | None = None,
+) -> list[dict]:
+    """
+    ユーザーのチャットを更新日時の新しい順に取得する。
+
+    `userId` / `updatedAt` の複合インデックスを使用する。
+
+    Args:
+        user_id: ユーザー ID。
+        limit: 取得する最大件数。
+        start_after: 前のページの最後のチャットの (updatedAt, chat_id)。
+        fields: 取得するフィールド (updatedAt は常に含む)。
+
+    Returns:
+        チャットのリスト。各要素は指定したフィールドと "id" を持つ。
+
+    Raises:
+        Exception: Firestore の読み取りに失敗した場合。
+    """
+    if db is None:
+        return []
+
+    query = db.collection(settings.chats_collection).where(
+        filter=firestore.FieldFilter("userId", "==", user_id)
+    )
+    return await _query_page(query, "updatedAt", limit, start_after, fields or [])
+
+
+async def list_messages(
+    chat_id: str,
+    limit: int,
+    start_after: tuple[datetime, str] | None = None,
+    fields: list[str] | None = None,
+) -> list[dict]:
+    """
+    チャットのメッセージを作成日時の新しい順に取得する。
+
+    Args:
+        chat_id: チャットセッションの ID。
+        limit: 取得する最大件数。
+        start_after: 前のページの最後のメッセージの (createdAt, message_id)。
+        fields: 取得するフィールド (createdAt は常に含む)。
+
+    Returns:
+        メッセージのリスト。各要素は指定したフィールドと "id" を持つ。
+
+    Raises:
+        Exception: Firestore の読み取りに失敗した場合。
+    """
+    if db is None:
+        return []
+
+    query = (
+        db.collection(settings.chats_collection)
+        .document(chat_id)
+        .collection(settings.messages_collection)
+    )
+    return await _query_page(query, "createdAt", limit, start_after, fields or [])
+
+
 # --- Image Jobs 関連 ---
 
 
@@ -302,8 +673,167 @@ async def update_image_job_status(
 
         job_ref = db.collection(settings.image_jobs_collection).document(job_id)
         await job_ref.set(update_payload, merge=True)
-        logger.info(f"[{job_id}] Job status updated to: {status}")
+        logger.debug(f"[{job_id}] Job status updated to: {status}")
         return True
     except Exception as e:
         logger.error(f"[{job_id}] Error updating job status: {e}", exc_info=True)
         return False
+
+
+# --- Prompt Cache 関連 ---
+
+
+async def get_prompt_cache_entry(prompt_hash: str) -> dict | None:
+    """
+    画像生成プロンプトキャッシュのエントリを取得する。
+
+    Args:
+        prompt_hash: 正規化したプロンプトのハッシュ。
+
+    Returns:
+        {"imageUrl": str, "expiresAt": datetime, ...}、または未登録の場合は None。
+    """
+    if db is None:
+        return None
+
+    try:
+        doc_ref = db.collection(settings.prompt_cache_collection).document(prompt_hash)
+        doc = await doc_ref.get()
+        if doc.exists:
+            return doc.to_dict()
+        return None
+    except Exception as e:
+        logger.error(f"Error getting prompt cache entry: {e}", exc_info=True)
+        return None
+
+
+async def set_prompt_cache_entry(
+    prompt_hash: str,
+    normalized_prompt: str,
+    image_url: str,
+    expires_at: datetime,
+) -> None:
+    """
+    画像生成プロンプトキャッシュのエントリを保存する。
+
+    Args:
+        prompt_hash: 正規化したプロンプトのハッシュ。
+        normalized_prompt: 正規化したプロンプト。
+        image_url: 生成画像の GCS URI。
+        expires_at: エントリの有効期限。
+    """
+    if db is None:
+        return
+
+    try:
+        doc_ref = db.collection(settings.prompt_cache_collection).document(prompt_hash)
+        await doc_ref.set(
+            {
+                "normalizedPrompt": normalized_prompt,
+                "imageUrl": image_url,
+                "createdAt": firestore.SERVER_TIMESTAMP,
+                "expiresAt": expires_at,
+            }
+        )
+        logger.debug(f"Saved prompt cache entry: {prompt_hash}")
+    except Exception as e:
+        logger.error(f"Error saving prompt cache entry: {e}", exc_info=True)
+
+
+async def is_prompt_cache_opted_out(user_id: str | None) -> bool:
+    """
+    ユーザーが画像のプロンプトキャッシュをオプトアウトしているかを返す。
+
+    `users/{user_id}.promptCacheOptOut` が true の場合はオプトアウトとみなす。
+
+    Args:
+        user_id: ユーザー ID。
+
+    Returns:
+        オプトアウトしている場合は True。
+    """
+    if db is None or not user_id:
+        return False
+
+    try:
+        user_ref = db.collection(settings.users_collection).document(user_id)
+        doc = await user_ref.get(field_paths=["promptCacheOptOut"])
+        if doc.exists:
+            return bool((doc.to_dict() or {}).get("promptCacheOptOut", False))
+        return False
+    except Exception as e:
+        logger.error(f"Error getting prompt cache opt-out: {e}", exc_info=True)
+        return False
+
+
+async def get_resumption_handle(chat_id: str) -> dict | None:
+    """
+    チャットの Live API セッション再開ハンドルを取得する。
+
+    Args:
+        chat_id: チャットセッションの ID。
+
+    Returns:
+        {"handle": str, "sessionId": str, "expiresAt": datetime, ...}、
+        または未登録の場合は None。
+    """
+    if db is None:
+        return None
+
+    try:
+        doc_ref = db.collection(settings.resumption_collection).document(chat_id)
+        doc = await doc_ref.get()
+        if doc.exists:
+            return doc.to_dict()
+        return None
+    except Exception as e:
+        logger.error(f"Error getting resumption handle: {e}", exc_info=True)
+        return None
+
+
+async def set_resumption_handle(chat_id: str, session_id: str, handle: str) -> None:
+    """
+    チャットの Live API セッション再開ハンドルを保存する。
+
+    ハンドルはサーバーのみが使用するため、クライアントから読み取れる
+    chats コレクションとは別のコレクションに保存する。
+
+    Args:
+        chat_id: チャットセッションの ID。
+        session_id: ハンドルを発行した ADK セッション ID。
+        handle: セッション再開ハンドル。
+    """
+    if db is None:
+        return
+
+    try:
+        doc_ref = db.collection(settings.resumption_collection).document(chat_id)
+        await doc_ref.set(
+            {
+                "sessionId": session_id,
+                "handle": handle,
+                "updatedAt": firestore.SERVER_TIMESTAMP,
+                "expiresAt": datetime.now(UTC)
+                + timedelta(seconds=settings.resumption_ttl_sec),
+            }
+        )
+        logger.debug(f"Saved resumption handle for chat: {chat_id}")
+    except Exception as e:
+        logger.error(f"Error saving resumption handle: {e}", exc_info=True)
+
+
+async def delete_resumption_handle(chat_id: str) -> None:
+    """
+    チャットの Live API セッション再開ハンドルを削除する。
+
+    Args:
+        chat_id: チャットセッションの ID。
+    """
+    if db is None:
+        return
+
+    try:
+        doc_ref = db.collection(settings.resumption_collection).document(chat_id)
+        await doc_ref.delete()
+    except Exception as e:
+        logger.error(f"Error deleting resumption handle: {e}", exc_info=True)
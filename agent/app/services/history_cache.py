@@ -0,0 +1,190 @@
+"""チャット履歴 API のプロセス内キャッシュ。
+
+アプリの起動時にはチャット一覧と直近のメッセージをまとめて読み込むため、
+同じユーザーのページを短時間に何度も Firestore から読み取ることになる。
+レスポンス本文と ETag をユーザーごとに保持し、再読み込みを省略する。
+
+キャッシュはこのプロセスが行う書き込み (`save_message`, `update_chat_title` など)
+で該当ユーザーの分をまとめて破棄する。他のプロセスやクライアントによる
+書き込みは検知できないため、TTL を短くして古い結果を返す期間を抑える。
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from app.config import settings
+
+
+@dataclass
+class CachedPage:
+    """キャッシュしたレスポンス。"""
+
+    etag: str
+    body: bytes
+    expires_at: float
+
+
+@dataclass
+class _UserEntry:
+    pages: OrderedDict[str, CachedPage] = field(default_factory=OrderedDict)
+    # このユーザーのページに含まれるチャット ID (書き込み時の無効化に使用)
+    chat_ids: set[str] = field(default_factory=set)
+
+
+class HistoryCache:
+    """
+    ユーザーごとにチャット履歴 API のレスポンスを保持する LRU キャッシュ。
+    """
+
+    def __init__(self, max_users: int, max_pages_per_user: int, ttl_sec: float):
+        """
+        Args:
+            max_users: キャッシュするユーザー数の上限 (0 で無効)。
+            max_pages_per_user: ユーザーごとにキャッシュするページ数の上限。
+            ttl_sec: キャッシュの有効期間 (秒)。
+        """
+        self.max_users = max_users
+        self.max_pages_per_user = max_pages_per_user
+        self.ttl_sec = ttl_sec
+        self._users: OrderedDict[str, _UserEntry] = OrderedDict()
+        # chat_id -> 所有者の user_id
+        self._owners: dict[str, str] = {}
+        # 無効化のたびに進める世代 (読み取り中に無効化された結果を保存しないため)
+        self._generations: OrderedDict[str, int] = OrderedDict()
+        self._next_generation = 0
+        # 記録から削除した世代の最大値 (記録のないユーザーの世代として使う)
+        self._generation_floor = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        """キャッシュが有効かどうか。"""
+        return self.max_users > 0 and self.ttl_sec > 0
+
+    def generation(self, user_id: str) -> int:
+        """
+        ユーザーの現在の世代を返す。
+
+        Firestore から読み取る前に取得し、`put` に渡す。
+        """
+        return self._generations.get(user_id, self._generation_floor)
+
+    def get(self, user_id: str, key: str) -> CachedPage | None:
+        """
+        キャッシュしたレスポンスを取得する。
+
+        Args:
+            user_id: ユーザー ID。
+            key: ページを識別するキー (パス、カーソル、件数、フィールドから作成)。
+
+        Returns:
+            有効期限内のレスポンス、または存在しない場合は None。
+        """
+        entry = self._users.get(user_id)
+        page = entry.pages.get(key) if entry is not None else None
+        if page is None or time.monotonic() >= page.expires_at:
+            self.misses += 1
+            return None
+        self._users.move_to_end(user_id)
+        entry.pages.move_to_end(key)
+        self.hits += 1
+        return page
+
+    def put(
+        self,
+        user_id: str,
+        key: str,
+        etag: str,
+        body: bytes,
+        chat_ids: list[str],
+        generation: int,
+    ) -> None:
+        """
+        レスポンスをキャッシュする。
+
+        読み取りの開始後にこのユーザーのキャッシュが無効化されていた場合は
+        古い結果の可能性があるため保存しない。
+
+        Args:
+            user_id: ユーザー ID。
+            key: ページを識別するキー。
+            etag: レスポンスの ETag。
+            body: レスポンス本文。
+            chat_ids: レスポンスに含まれるチャット ID。
+            generation: 読み取り前に `generation` で取得した世代。
+        """
+        if not self.enabled or generation != self.generation(user_id):
+            return
+
+        entry = self._users.get(user_id)
+        if entry is None:
+            entry = self._users[user_id] = _UserEntry()
+        self._users.move_to_end(user_id)
+
+        entry.pages[key] = CachedPage(etag, body, time.monotonic() + self.ttl_sec)
+        entry.pages.move_to_end(key)
+        while len(entry.pages) > self.max_pages_per_user:
+            entry.pages.popitem(last=False)
+        for chat_id in chat_ids:
+            entry.chat_ids.add(chat_id)
+            self._owners[chat_id] = user_id
+
+        while len(self._users) > self.max_users:
+            evicted_user, evicted = self._users.popitem(last=False)
+            self._forget(evicted_user, evicted)
+
+    def invalidate_user(self, user_id: str) -> None:
+        """ユーザーのキャッシュをすべて破棄する。"""
+        self._next_generation += 1
+        self._generations[user_id] = self._next_generation
+        self._generations.move_to_end(user_id)
+        while len(self._generations) > self.max_users:
+            _, generation = self._generations.popitem(last=False)
+            self._generation_floor = max(self._generation_floor, generation)
+        entry = self._users.pop(user_id, None)
+        if entry is not None:
+            self._forget(user_id, entry)
+            self.invalidations += 1
+
+    def invalidate_chat(self, chat_id: str, user_id: str | None = None) -> None:
+        """
+        チャットへの書き込みに合わせて、所有者のキャッシュを破棄する。
+
+        Args:
+            chat_id: 書き込んだチャットの ID。
+            user_id: 所有者のユーザー ID (わかっている場合)。
+                キャッシュ済みのページに含まれないチャットでも、
+                更新日時の変更で一覧の先頭に来るため、所有者がわかれば破棄する。
+        """
+        owners = {self._owners.get(chat_id), user_id}
+        for owner in owners:
+            if owner is not None:
+                self.invalidate_user(owner)
+
+    def _forget(self, user_id: str, entry: _UserEntry) -> None:
+        for chat_id in entry.chat_ids:
+            if self._owners.get(chat_id) == user_id:
+                del self._owners[chat_id]
+
+    def stats(self) -> dict:
+        """
+        キャッシュの統計情報を返す。
+        """
+        return {
+            "users": len(self._users),
+            "pages": sum(len(entry.pages) for entry in self._users.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+history_cache = HistoryCache(
+    max_users=settings.history_cache_users,
+    max_pages_per_user=settings.history_cache_pages_per_user,
+    ttl_sec=settings.history_cache_ttl_sec,
+)
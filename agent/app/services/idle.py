@@ -0,0 +1,111 @@
+"""無操作 (アイドル) セッションの検出。
+
+子供がその場を離れても、クライアントは無音の音声を送り続けるため、
+受信したバイト数ではなく発話 (エネルギーベースの VAD) とモデルの応答を
+活動とみなし、最後の活動からの経過時間を計測する。
+
+一定時間活動がなければ Live セッションを一時停止し、
+次に発話を検出したときに、発話の直前 (プリロール) を含めた音声を
+再開後のセッションに送信する。
+"""
+
+import time
+
+from app.config import settings
+from app.services.vad import EnergyVad
+
+
+class IdleTracker:
+    """
+    セッションの最後の活動時刻と、一時停止・再開の回数を管理するクラス。
+    """
+
+    def __init__(self, timeout_sec: float | None = None):
+        """
+        Args:
+            timeout_sec: 活動がない場合に一時停止するまでの時間 (秒)。0 で無効。
+        """
+        self.timeout_sec = (
+            timeout_sec if timeout_sec is not None else settings.live_idle_timeout_sec
+        )
+        # 発話の検出用 (接続ごとの VAD とは独立に、無音も含めて判定する)
+        self._vad = EnergyVad()
+        self._last_activity = time.monotonic()
+        self._suspended_at: float | None = None
+
+        self.suspensions = 0
+        self.resumes = 0
+        self.suspended_sec = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        """アイドル検出が有効かどうか。"""
+        return self.timeout_sec > 0
+
+    @property
+    def suspended(self) -> bool:
+        """Live セッションを一時停止中かどうか。"""
+        return self._suspended_at is not None
+
+    def touch(self) -> None:
+        """活動 (テキストの受信、モデルの応答など) を記録する。"""
+        self._last_activity = time.monotonic()
+
+    def observe_audio(self, pcm: bytes) -> bytes:
+        """
+        受信した音声を判定し、発話であれば活動として記録する。
+
+        Args:
+            pcm: 16kHz / 16bit モノラル PCM。
+
+        Returns:
+            この音声で発話が始まった場合は、プリロールを含む発話の先頭の音声。
+            それ以外は空のバイト列。一時停止中に発話が始まった場合、
+            再開後のセッションにはこの音声を送信する。
+        """
+        started = False
+        speech = bytearray()
+        for event in self._vad.process(pcm):
+            if event.kind == "start":
+                started = True
+            elif event.kind == "audio" and started:
+                speech += event.data
+        if started or self._vad.in_speech:
+            self.touch()
+        return bytes(speech)
+
+    def idle_for(self) -> float:
+        """最後の活動からの経過時間 (秒)。"""
+        return time.monotonic() - self._last_activity
+
+    def should_suspend(self) -> bool:
+        """一時停止すべきかどうか。"""
+        return (
+            self.enabled and not self.suspended and self.idle_for() >= self.timeout_sec
+        )
+
+    def mark_suspended(self) -> None:
+        """Live セッションを一時停止したことを記録する。"""
+        self._suspended_at = time.monotonic()
+        self.suspensions += 1
+
+    def mark_resumed(self) -> None:
+        """Live セッションを再開したことを記録する。"""
+        if self._suspended_at is not None:
+            self.suspended_sec += time.monotonic() - self._suspended_at
+            self._suspended_at = None
+        self.resumes += 1
+        self.touch()
+
+    def stats(self) -> dict:
+        """
+        一時停止の回数と合計時間を返す。
+        """
+        suspended_sec = self.suspended_sec
+        if self._suspended_at is not None:
+            suspended_sec += time.monotonic() - self._suspended_at
+        return {
+            "suspensions": self.suspensions,
+            "resumes": self.resumes,
+            "suspended_sec": round(suspended_sec, 1),
+        }
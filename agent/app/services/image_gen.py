@@ -2,97 +2,24 @@
 
 import asyncio
 import logging
-import ssl
 import uuid
 
-import requests
-from google import genai
-from google.cloud import storage
 from google.genai import types
-from tenacity import (
-    before_sleep_log,
-    retry,
-    retry_if_exception,
-    stop_after_attempt,
-    wait_exponential,
-)
-from urllib3.exceptions import SSLError as UrllibSSLError
 
 from app.config import settings
+from app.services.client_pool import client_pool
 from app.services.firestore_service import (
     create_image_job,
     update_image_job_status,
 )
+from app.services.image_upload import copy_generated_image, upload_generated_image
+from app.services.job_events import job_event_bus
+from app.services.job_executor import image_job_executor
+from app.services.metrics import IMAGE_JOB_STAGE_SECONDS
+from app.services.prompt_cache import prompt_cache
 
 logger = logging.getLogger(__name__)
 
-# GCS クライアントの初期化
-storage_client = storage.Client()
-
-
-# --- リトライロジック ---
-def is_ssl_error(exc: BaseException) -> bool:
-    """
-    SSL 関連のエラーかどうかを判定する。
-
-    tenacity のリトライ条件として使用される述語関数。
-
-    Args:
-        exc: 発生した例外。
-
-    Returns:
-        SSL 関連のエラーの場合は True。
-    """
-    ssl_types = (requests.exceptions.SSLError, UrllibSSLError, ssl.SSLError)
-    if isinstance(exc, ssl_types):
-        return True
-    cause = getattr(exc, "__cause__", None)
-    if isinstance(cause, ssl_types):
-        return True
-    context = getattr(exc, "__context__", None)
-    if isinstance(context, ssl_types):
-        return True
-    return False
-
-
-gcs_retry_decorator = retry(
-    stop=stop_after_attempt(5),
-    wait=wait_exponential(multiplier=1, min=10, max=60),
-    retry=retry_if_exception(is_ssl_error),
-    before_sleep=before_sleep_log(logger, logging.WARNING),
-    reraise=True,
-)
-
-
-@gcs_retry_decorator
-async def upload_blob_from_memory(
-    bucket_name: str,
-    destination_blob_name: str,
-    data: bytes,
-    content_type: str,
-) -> str:
-    """
-    バイトデータを GCS バケットにアップロードする。
-
-    Args:
-        bucket_name: アップロード先のバケット名。
-        destination_blob_name: アップロード先の Blob 名。
-        data: アップロードするバイトデータ。
-        content_type: コンテンツタイプ (例: "image/png")。
-
-    Returns:
-        GCS URI (gs://bucket/blob_name 形式)。
-    """
-    logger.info(f"Uploading to GCS: gs://{bucket_name}/{destination_blob_name}")
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(destination_blob_name)
-
-    await asyncio.to_thread(blob.upload_from_string, data, content_type=content_type)
-
-    gcs_path = f"gs://{bucket_name}/{destination_blob_name}"
-    logger.info(f"Uploaded: {gcs_path}")
-    return gcs_path
-
 
 # --- 画像生成 API ---
 async def generate_image(
@@ -102,7 +29,11 @@ async def generate_image(
     message_id: str | None = None,
 ) -> str:
     """
-    Gen AI SDK を使用して画像を生成する。
+    画像生成ジョブを作成し、バックグラウンドで実行する。
+
+    ジョブの作成 (pending 状態) までを待ち、生成・アップロードは
+    ジョブ実行基盤に任せて即座に戻る。結果はチャットの WebSocket 接続に
+    直接通知し、`image_jobs` のステータスにも記録する。
 
     Args:
         prompt: 画像生成のための詳細なプロンプト。
@@ -116,10 +47,11 @@ async def generate_image(
     # message_id が指定されていない場合は UUID を生成
     if not message_id:
         message_id = str(uuid.uuid4())
-        logger.info(f"Generated message_id: {message_id}")
+        logger.debug(f"Generated message_id: {message_id}")
 
+    # プロンプト全文はログに出さない (長文でログ出力が重くなるため)
     logger.info(
-        f"generate_image called: prompt='{prompt}', "
+        f"generate_image called: prompt_chars={len(prompt)}, "
         f"user_id={user_id}, chat_id={chat_id}, message_id={message_id}"
     )
 
@@ -128,30 +60,100 @@ async def generate_image(
         return "Error: Server configuration error (GCS bucket not set)."
 
     # 1. ジョブの作成 (pending 状態)
-    job_id = await create_image_job(prompt, user_id, chat_id, message_id)
+    with IMAGE_JOB_STAGE_SECONDS.labels(stage="create").time():
+        job_id = await create_image_job(prompt, user_id, chat_id, message_id)
     if not job_id:
         return "Error: Failed to create image job."
+    job_event_bus.publish(chat_id, job_id, "pending", message_id)
 
-    # 2. Run Generation
-    try:
-        await update_image_job_status(job_id, "processing")
-
-        client = genai.Client(
-            vertexai=True,
-            project=settings.google_cloud_project,
-            location=settings.image_gen_location,
+    # 2. バックグラウンド実行に投入
+    accepted = image_job_executor.submit(
+        user_id or "unknown_user",
+        job_id,
+        lambda: _run_image_job(job_id, prompt, user_id, chat_id, message_id),
+    )
+    if not accepted:
+        await _set_job_status(
+            job_id,
+            "failed",
+            chat_id,
+            message_id,
+            {"error": "Image generation is busy."},
         )
+        return "Error: Image generation is busy. Please try again later."
+
+    return f"画像生成ジョブを開始しました。ID: {job_id}"
 
-        response = await asyncio.to_thread(
-            client.models.generate_content,
-            model=settings.image_gen_model_id,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                response_modalities=["IMAGE"],
-                image_config=types.ImageConfig(aspect_ratio="16:9"),
-            ),
+
+async def _set_job_status(
+    job_id: str,
+    status: str,
+    chat_id: str | None,
+    message_id: str | None,
+    data: dict | None = None,
+) -> bool:
+    """
+    ジョブのステータスをチャットの接続に通知してから Firestore に記録する。
+
+    Returns:
+        Firestore への記録に成功した場合は True。
+    """
+    job_event_bus.publish(chat_id, job_id, status, message_id, data)
+    return await update_image_job_status(job_id, status, data)
+
+
+async def _run_image_job(
+    job_id: str,
+    prompt: str,
+    user_id: str | None,
+    chat_id: str | None = None,
+    message_id: str | None = None,
+) -> None:
+    """
+    画像を生成して GCS にアップロードし、ジョブのステータスを更新する。
+
+    プロンプトキャッシュにヒットした場合は画像生成を省略し、
+    保存済みの画像でジョブを完了させる。
+
+    Args:
+        job_id: 画像生成ジョブの ID。
+        prompt: 画像生成のための詳細なプロンプト。
+        user_id: ユーザー ID。
+        chat_id: チャット ID (ステータスの通知先)。
+        message_id: メッセージ ID。
+    """
+    try:
+        use_cache = await prompt_cache.is_enabled_for(user_id)
+        if use_cache:
+            image_url = await _get_cached_image(prompt, user_id)
+            if image_url:
+                logger.info(f"[{job_id}] Prompt cache hit: {image_url}")
+                await _set_job_status(
+                    job_id,
+                    "completed",
+                    chat_id,
+                    message_id,
+                    {"imageUrl": image_url, "cached": True},
+                )
+                return
+
+        await _set_job_status(job_id, "processing", chat_id, message_id)
+
+        # 接続プール済みのクライアントを再利用し、非同期 API で呼び出す
+        client = client_pool.genai_client(
+            settings.google_cloud_project, settings.image_gen_location
         )
 
+        with IMAGE_JOB_STAGE_SECONDS.labels(stage="generate").time():
+            response = await client.aio.models.generate_content(
+                model=settings.image_gen_model_id,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    response_modalities=["IMAGE"],
+                    image_config=types.ImageConfig(aspect_ratio="16:9"),
+                ),
+            )
+
         if not response.candidates or not response.candidates[0].content.parts:
             raise ValueError("No content generated.")
 
@@ -164,26 +166,56 @@ async def generate_image(
         if not generated_image_bytes:
             raise ValueError("No image data found in response.")
 
-        # 3. Upload to GCS
-        filename = f"{job_id}.png"
-        upload_path = (
-            f"generated_images/{user_id}/{filename}"
-            if user_id
-            else f"generated_images/unknown_user/{filename}"
-        )
+        # 3. Upload to GCS (内容ハッシュで重複排除)
+        with IMAGE_JOB_STAGE_SECONDS.labels(stage="upload").time():
+            image_url = await upload_generated_image(
+                settings.gcs_bucket_name, user_id, generated_image_bytes
+            )
 
-        image_url = await upload_blob_from_memory(
-            settings.gcs_bucket_name,
-            upload_path,
-            generated_image_bytes,
-            "image/png",
+        # 4. Complete
+        with IMAGE_JOB_STAGE_SECONDS.labels(stage="complete").time():
+            await _set_job_status(
+                job_id, "completed", chat_id, message_id, {"imageUrl": image_url}
+            )
+        if use_cache:
+            await prompt_cache.put(prompt, image_url)
+
+    except asyncio.CancelledError:
+        # シャットダウン時に期限内に完了しなかったジョブ
+        logger.warning(f"[{job_id}] Image generation cancelled.")
+        await _set_job_status(
+            job_id,
+            "failed",
+            chat_id,
+            message_id,
+            {"error": "Cancelled during server shutdown."},
         )
+        raise
+    except Exception as e:
+        logger.error(f"Error during image generation: {e}", exc_info=True)
+        await _set_job_status(job_id, "failed", chat_id, message_id, {"error": str(e)})
+        # ジョブ実行基盤に失敗として数えさせる
+        raise
 
-        # 4. Complete
-        await update_image_job_status(job_id, "completed", {"imageUrl": image_url})
-        return f"画像生成ジョブを開始しました。ID: {job_id}"
 
+async def _get_cached_image(prompt: str, user_id: str | None) -> str | None:
+    """
+    プロンプトキャッシュから生成済み画像を取得し、ユーザーのパスの URI を返す。
+
+    Args:
+        prompt: 画像生成のための詳細なプロンプト。
+        user_id: ユーザー ID。
+
+    Returns:
+        GCS URI、またはキャッシュにない場合は None。
+    """
+    cached_url = await prompt_cache.get(prompt)
+    if not cached_url:
+        return None
+
+    try:
+        # 他のユーザーの画像の場合は、ユーザーのパスにサーバーサイドでコピーする
+        return await copy_generated_image(settings.gcs_bucket_name, cached_url, user_id)
     except Exception as e:
-        logger.error(f"Error during image generation: {e}", exc_info=True)
-        await update_image_job_status(job_id, "failed", {"error": str(e)})
-        return f"Image generation failed: {e}"
+        logger.warning(f"Failed to reuse cached image {cached_url}: {e}")
+        return None
@@ -0,0 +1,291 @@
+"""生成画像の GCS アップロードサービス。
+
+- 画像の内容ハッシュをオブジェクト名に使用し、同じ画像は一度だけ保存する。
+  既に存在する場合はアップロード自体を行わない。
+- チャンクサイズを超える画像は resumable upload で送信し、
+  失敗時は最後にコミットされたチャンクから再開する。
+- Pillow が利用可能な場合、WebP/AVIF への変換で転送量を削減する。
+"""
+
+import asyncio
+import hashlib
+import io
+import logging
+import ssl
+from collections import OrderedDict
+
+import requests
+from google.api_core.exceptions import PreconditionFailed
+from google.cloud.storage.retry import DEFAULT_RETRY
+from tenacity import (
+    before_sleep_log,
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_exponential,
+)
+from urllib3.exceptions import SSLError as UrllibSSLError
+
+from app.config import settings
+from app.services.client_pool import client_pool
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow はオプション依存
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# resumable upload のチャンクサイズは 256KiB の倍数である必要がある
+_CHUNK_ALIGNMENT = 256 * 1024
+
+# 変換先フォーマットごとの (Pillow のフォーマット名, Content-Type, 拡張子)
+_FORMATS = {
+    "png": ("PNG", "image/png", "png"),
+    "webp": ("WEBP", "image/webp", "webp"),
+    "avif": ("AVIF", "image/avif", "avif"),
+}
+
+# アップロード済みであることを確認したオブジェクト名の LRU
+_known_objects: OrderedDict[str, None] = OrderedDict()
+
+
+def _is_known_object(object_name: str) -> bool:
+    """アップロード済みであることを確認済みかどうか。"""
+    if object_name not in _known_objects:
+        return False
+    _known_objects.move_to_end(object_name)
+    return True
+
+
+def _remember_object(object_name: str) -> None:
+    """アップロード済みのオブジェクト名を記録し、上限を超えた古いものを削除する。"""
+    _known_objects[object_name] = None
+    _known_objects.move_to_end(object_name)
+    while len(_known_objects) > settings.gcs_known_objects_cache_size:
+        _known_objects.popitem(last=False)
+
+
+# --- リトライロジック ---
+def is_ssl_error(exc: BaseException) -> bool:
+    """
+    SSL 関連のエラーかどうかを判定する。
+
+    tenacity のリトライ条件として使用される述語関数。
+
+    Args:
+        exc: 発生した例外。
+
+    Returns:
+        SSL 関連のエラーの場合は True。
+    """
+    ssl_types = (requests.exceptions.SSLError, UrllibSSLError, ssl.SSLError)
+    if isinstance(exc, ssl_types):
+        return True
+    cause = getattr(exc, "__cause__", None)
+    if isinstance(cause, ssl_types):
+        return True
+    context = getattr(exc, "__context__", None)
+    if isinstance(context, ssl_types):
+        return True
+    return False
+
+
+# チャンク単位の再送は resumable upload 側で行うため、
+# アップロード全体のやり直しは短い待ち時間で行う
+gcs_retry_decorator = retry(
+    stop=stop_after_attempt(5),
+    wait=wait_exponential(multiplier=1, min=1, max=10),
+    retry=retry_if_exception(is_ssl_error),
+    before_sleep=before_sleep_log(logger, logging.WARNING),
+    reraise=True,
+)
+
+
+def _chunk_size() -> int:
+    size = max(settings.gcs_upload_chunk_size, _CHUNK_ALIGNMENT)
+    return size - size % _CHUNK_ALIGNMENT
+
+
+def _upload(blob, data: bytes, content_type: str) -> None:
+    """
+    Blob にデータをアップロードする (スレッドで実行)。
+
+    `if_generation_match=0` により既存オブジェクトの上書きを防ぎ、
+    条件付きリクエストとして安全にリトライできるようにする。
+    """
+    chunk_size = _chunk_size()
+    try:
+        if len(data) > chunk_size:
+            # size を指定しないことで resumable upload を使用する
+            blob.chunk_size = chunk_size
+            blob.upload_from_file(
+                io.BytesIO(data),
+                content_type=content_type,
+                if_generation_match=0,
+                retry=DEFAULT_RETRY,
+            )
+        else:
+            blob.upload_from_string(
+                data,
+                content_type=content_type,
+                if_generation_match=0,
+                retry=DEFAULT_RETRY,
+            )
+    except PreconditionFailed:
+        # 同じ内容のオブジェクトが既に存在する
+        logger.debug(f"Object already exists: {blob.name}")
+
+
+@gcs_retry_decorator
+async def upload_blob_from_memory(
+    bucket_name: str,
+    destination_blob_name: str,
+    data: bytes,
+    content_type: str,
+) -> str:
+    """
+    バイトデータを GCS バケットにアップロードする。
+
+    Args:
+        bucket_name: アップロード先のバケット名。
+        destination_blob_name: アップロード先の Blob 名。
+        data: アップロードするバイトデータ。
+        content_type: コンテンツタイプ (例: "image/png")。
+
+    Returns:
+        GCS URI (gs://bucket/blob_name 形式)。
+    """
+    logger.info(f"Uploading to GCS: gs://{bucket_name}/{destination_blob_name}")
+    bucket = client_pool.bucket(bucket_name, settings.google_cloud_project)
+    blob = bucket.blob(destination_blob_name)
+
+    await asyncio.to_thread(_upload, blob, data, content_type)
+
+    gcs_path = f"gs://{bucket_name}/{destination_blob_name}"
+    logger.info(f"Uploaded: {gcs_path}")
+    return gcs_path
+
+
+def transcode_image(data: bytes, image_format: str) -> tuple[bytes, str, str]:
+    """
+    画像を指定フォーマットに変換する。
+
+    Pillow が利用できない場合や変換に失敗した場合は、元の PNG を返す。
+
+    Args:
+        data: PNG 画像のバイトデータ。
+        image_format: 変換先フォーマット ("png" | "webp" | "avif")。
+
+    Returns:
+        (変換後のバイトデータ, Content-Type, 拡張子) のタプル。
+    """
+    original = (data, "image/png", "png")
+    target = _FORMATS.get(image_format.lower())
+    if target is None or target[2] == "png":
+        return original
+    if Image is None:
+        return original
+
+    pil_format, content_type, extension = target
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            output = io.BytesIO()
+            image.save(output, format=pil_format, quality=settings.image_upload_quality)
+        return output.getvalue(), content_type, extension
+    except Exception as e:
+        logger.warning(f"Image transcoding to {pil_format} failed: {e}")
+        return original
+
+
+async def upload_generated_image(
+    bucket_name: str,
+    user_id: str | None,
+    data: bytes,
+) -> str:
+    """
+    生成画像を内容ハッシュをキーとしたオブジェクト名でアップロードする。
+
+    同じ画像が既に保存されている場合はアップロードせずに既存の URI を返す。
+
+    Args:
+        bucket_name: アップロード先のバケット名。
+        user_id: ユーザー ID。
+        data: 生成された PNG 画像のバイトデータ。
+
+    Returns:
+        GCS URI (gs://bucket/blob_name 形式)。
+    """
+    image_format = settings.image_upload_format.lower()
+    if image_format not in _FORMATS or Image is None:
+        image_format = "png"
+    extension = _FORMATS[image_format][2]
+    digest = hashlib.sha256(data).hexdigest()
+    # Storage のセキュリティルールに合わせ、ユーザーごとのパスに保存する
+    object_name = f"generated_images/{user_id or 'unknown_user'}/{digest}.{extension}"
+    gcs_path = f"gs://{bucket_name}/{object_name}"
+
+    if _is_known_object(object_name):
+        logger.info(f"Reusing uploaded image: {gcs_path}")
+        return gcs_path
+
+    bucket = client_pool.bucket(bucket_name, settings.google_cloud_project)
+    if await asyncio.to_thread(bucket.blob(object_name).exists):
+        _remember_object(object_name)
+        logger.info(f"Reusing uploaded image: {gcs_path}")
+        return gcs_path
+
+    # 変換に失敗した場合は PNG のまま (Content-Type も image/png で) 保存される
+    payload, content_type, _ = await asyncio.to_thread(
+        transcode_image, data, image_format
+    )
+
+    await upload_blob_from_memory(bucket_name, object_name, payload, content_type)
+    _remember_object(object_name)
+    return gcs_path
+
+
+async def copy_generated_image(
+    bucket_name: str,
+    source_uri: str,
+    user_id: str | None,
+) -> str:
+    """
+    他のユーザー向けに保存済みの生成画像を、指定ユーザーのパスにコピーする。
+
+    コピーは GCS 内のサーバーサイドで行われ、画像データの再送信は発生しない。
+
+    Args:
+        bucket_name: バケット名。
+        source_uri: コピー元の GCS URI (gs://bucket/generated_images/...)。
+        user_id: コピー先のユーザー ID。
+
+    Returns:
+        コピー先の GCS URI。
+    """
+    source_name = source_uri.removeprefix(f"gs://{bucket_name}/")
+    filename = source_name.rsplit("/", 1)[-1]
+    object_name = f"generated_images/{user_id or 'unknown_user'}/{filename}"
+    gcs_path = f"gs://{bucket_name}/{object_name}"
+
+    if object_name == source_name or _is_known_object(object_name):
+        return gcs_path
+
+    bucket = client_pool.bucket(bucket_name, settings.google_cloud_project)
+
+    def _copy() -> None:
+        try:
+            bucket.copy_blob(
+                bucket.blob(source_name),
+                bucket,
+                object_name,
+                if_generation_match=0,
+                retry=DEFAULT_RETRY,
+            )
+        except PreconditionFailed:
+            logger.debug(f"Object already exists: {object_name}")
+
+    await asyncio.to_thread(_copy)
+    _remember_object(object_name)
+    logger.info(f"Copied cached image: {source_uri} -> {gcs_path}")
+    return gcs_path
@@ -0,0 +1,138 @@
+"""画像生成ジョブの状態変化を WebSocket に配信するプロセス内 pub/sub。
+
+画像生成ジョブはツールを呼び出したセッションと同じプロセスで実行されるため、
+Firestore のリスナーを介さずに、状態が変わった時点でそのチャットの接続へ
+直接通知できる。Firestore への書き込みは永続的な記録として引き続き行う。
+
+配信するメッセージ:
+
+    {"type": "image_job", "jobId": "...", "status": "completed",
+     "messageId": "...", "imageUrl": "gs://..."}
+
+`imageUrl` は completed、`error` は failed の場合のみ含む。
+"""
+
+import asyncio
+import json
+import logging
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class JobSubscription:
+    """
+    1 つの接続の購読。送信待ちのメッセージをキューに保持する。
+    """
+
+    def __init__(self, chat_id: str, queue_size: int):
+        self.chat_id = chat_id
+        self._queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def offer(self, message: str) -> None:
+        """メッセージを送信待ちに追加する。"""
+        # 送信が詰まっている場合は古い通知を捨てる (最新の状態が届けばよい)
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(message)
+
+    async def get(self) -> str:
+        """次に送信するメッセージを待つ。"""
+        return await self._queue.get()
+
+
+class JobEventBus:
+    """
+    chat_id ごとに購読中の接続を管理し、ジョブの状態変化を配信するクラス。
+    """
+
+    def __init__(self, queue_size: int):
+        """
+        Args:
+            queue_size: 接続ごとに送信待ちにできるメッセージの最大数。
+        """
+        self.queue_size = queue_size
+        self._subscriptions: dict[str, set[JobSubscription]] = {}
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, chat_id: str) -> JobSubscription:
+        """
+        チャットのジョブの状態変化の購読を開始する。
+
+        Args:
+            chat_id: チャットセッションの ID。
+
+        Returns:
+            購読。接続の終了時に `unsubscribe` に渡す。
+        """
+        subscription = JobSubscription(chat_id, self.queue_size)
+        self._subscriptions.setdefault(chat_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: JobSubscription) -> None:
+        """購読を終了する。"""
+        subscriptions = self._subscriptions.get(subscription.chat_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.chat_id]
+
+    def publish(
+        self,
+        chat_id: str | None,
+        job_id: str,
+        status: str,
+        message_id: str | None = None,
+        data: dict | None = None,
+    ) -> int:
+        """
+        ジョブの状態変化をチャットの接続に配信する。
+
+        送信は各接続のタスクが行うため、呼び出し元は待たされない。
+
+        Args:
+            chat_id: ジョブを作成したチャットの ID。
+            job_id: 画像生成ジョブの ID。
+            status: 新しいステータス。
+            message_id: ジョブに紐付くメッセージ ID。
+            data: ステータスと一緒に更新するデータ (imageUrl, error を配信する)。
+
+        Returns:
+            配信した接続の数。
+        """
+        self.published += 1
+        subscriptions = self._subscriptions.get(chat_id) if chat_id else None
+        if not subscriptions:
+            return 0
+
+        event: dict = {"type": "image_job", "jobId": job_id, "status": status}
+        if message_id:
+            event["messageId"] = message_id
+        for key in ("imageUrl", "error"):
+            if data and data.get(key):
+                event[key] = data[key]
+        message = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+
+        for subscription in subscriptions:
+            subscription.offer(message)
+        self.delivered += len(subscriptions)
+        logger.debug(f"[{job_id}] Pushed job status {status} to {chat_id}")
+        return len(subscriptions)
+
+    def stats(self) -> dict:
+        """
+        配信の統計情報を返す。
+        """
+        return {
+            "subscriptions": sum(len(subs) for subs in self._subscriptions.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+        }
+
+
+job_event_bus = JobEventBus(queue_size=settings.job_event_queue_size)
@@ -0,0 +1,190 @@
+"""プロセス内のバックグラウンドジョブ実行基盤。
+
+画像生成のような時間のかかる処理をツール呼び出しから切り離し、
+同時実行数を制限したうえでバックグラウンドで実行する。
+"""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+
+from app.config import settings
+from app.services.metrics import JOB_QUEUE_DEPTH, JOB_RUNNING
+
+logger = logging.getLogger(__name__)
+
+
+class JobExecutor:
+    """
+    同時実行数を制限してジョブをバックグラウンド実行するクラス。
+
+    - インスタンス全体の同時実行数を `max_workers` に制限する。
+    - ユーザーごとの同時実行数を `per_user_limit` に制限する。
+      上限に達したユーザーのジョブは、他ユーザーのジョブを妨げずに待機する。
+    - 待機中・実行中のジョブ数が `max_pending` を超える場合は受け付けない。
+    - `shutdown` で新規受付を停止し、実行中のジョブの完了を待つ。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        per_user_limit: int,
+        max_pending: int,
+    ):
+        """
+        Args:
+            name: ログ出力用の名前。
+            max_workers: インスタンス全体の最大同時実行数。
+            per_user_limit: ユーザーごとの最大同時実行数。
+            max_pending: 待機中・実行中を合わせた最大ジョブ数。
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self.per_user_limit = per_user_limit
+        self.max_pending = max_pending
+
+        self._worker_slots = asyncio.Semaphore(max_workers)
+        self._user_slots: dict[str, asyncio.Semaphore] = {}
+        self._user_outstanding: dict[str, int] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._accepting = True
+
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._waiting_gauge = JOB_QUEUE_DEPTH.labels(executor=name)
+        self._running_gauge = JOB_RUNNING.labels(executor=name)
+
+    def submit(
+        self,
+        user_key: str,
+        job_id: str,
+        job: Callable[[], Awaitable[None]],
+    ) -> bool:
+        """
+        ジョブを投入する。
+
+        Args:
+            user_key: 同時実行数を制限する単位 (ユーザー ID)。
+            job_id: ログ出力用のジョブ ID。
+            job: 実行するコルーチンを返す関数。
+
+        Returns:
+            受け付けた場合は True、停止中または上限超過の場合は False。
+        """
+        if not self._accepting:
+            logger.warning(f"[{job_id}] {self.name} is shutting down. Job rejected.")
+            self.rejected += 1
+            return False
+
+        if len(self._tasks) >= self.max_pending:
+            logger.warning(
+                f"[{job_id}] {self.name} queue is full ({len(self._tasks)}). "
+                "Job rejected."
+            )
+            self.rejected += 1
+            return False
+
+        self._user_outstanding[user_key] = self._user_outstanding.get(user_key, 0) + 1
+        task = asyncio.create_task(self._run(user_key, job_id, job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _run(
+        self,
+        user_key: str,
+        job_id: str,
+        job: Callable[[], Awaitable[None]],
+    ) -> None:
+        user_slot = self._user_slots.setdefault(
+            user_key, asyncio.Semaphore(self.per_user_limit)
+        )
+        self.waiting += 1
+        self._waiting_gauge.inc()
+        started = False
+        try:
+            async with user_slot, self._worker_slots:
+                self.waiting -= 1
+                self._waiting_gauge.dec()
+                self.running += 1
+                self._running_gauge.inc()
+                started = True
+                try:
+                    await job()
+                    self.completed += 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"[{job_id}] {self.name} job failed: {e}")
+                finally:
+                    self.running -= 1
+                    self._running_gauge.dec()
+        finally:
+            if not started:
+                self.waiting -= 1
+                self._waiting_gauge.dec()
+            self._release_user(user_key)
+
+    def _release_user(self, user_key: str) -> None:
+        remaining = self._user_outstanding.get(user_key, 1) - 1
+        if remaining <= 0:
+            self._user_outstanding.pop(user_key, None)
+            self._user_slots.pop(user_key, None)
+        else:
+            self._user_outstanding[user_key] = remaining
+
+    async def shutdown(self, timeout: float) -> dict:
+        """
+        新規受付を停止し、実行中・待機中のジョブの完了を待つ。
+
+        `timeout` 秒以内に完了しなかったジョブはキャンセルされる。
+
+        Args:
+            timeout: 完了を待つ最大時間 (秒)。
+
+        Returns:
+            完了・キャンセルしたジョブ数を含む統計情報。
+        """
+        self._accepting = False
+        pending = set(self._tasks)
+        cancelled = 0
+
+        if pending:
+            logger.info(f"{self.name}: draining {len(pending)} jobs...")
+            _, not_done = await asyncio.wait(pending, timeout=timeout)
+            for task in not_done:
+                task.cancel()
+            if not_done:
+                await asyncio.gather(*not_done, return_exceptions=True)
+            cancelled = len(not_done)
+
+        result = {
+            **self.stats(),
+            "drained": len(pending) - cancelled,
+            "cancelled": cancelled,
+        }
+        logger.info(f"{self.name} shutdown complete: {result}")
+        return result
+
+    def stats(self) -> dict:
+        """
+        キューの統計情報を返す。
+        """
+        return {
+            "queue_depth": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+image_job_executor = JobExecutor(
+    name="ImageJobExecutor",
+    max_workers=settings.image_job_max_workers,
+    per_user_limit=settings.image_job_per_user_limit,
+    max_pending=settings.image_job_max_pending,
+)
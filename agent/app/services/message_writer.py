@@ -0,0 +1,156 @@
+"""メッセージ永続化の write-behind バッファ。
+
+WebSocket 接続ごとにメッセージをキューへ積み、バックグラウンドタスクが
+Firestore の WriteBatch にまとめて書き込む。音声転送のループが
+ストレージ書き込みを待たないようにするために使用する。
+"""
+
+import asyncio
+import logging
+from datetime import UTC, datetime
+
+from app.config import settings
+from app.services.firestore_service import save_messages_batch
+from app.services.metrics import MESSAGE_WRITE_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+# Firestore の WriteBatch は 1 コミットあたり 500 操作まで
+# (updatedAt 更新の 1 操作分を差し引く)
+_MAX_FIRESTORE_BATCH_SIZE = 499
+
+# キューのクローズを通知する番兵
+_CLOSE = object()
+
+
+class MessageWriteBuffer:
+    """
+    1 つのチャットに対するメッセージ書き込みをバッファリングするクラス。
+
+    `enqueue` は即座に戻り、バックグラウンドタスクが件数または経過時間の
+    しきい値に達した時点でまとめて Firestore に書き込む。
+    `close` で残りのメッセージをフラッシュしてタスクを終了する。
+    """
+
+    def __init__(
+        self,
+        chat_id: str,
+        max_batch_size: int | None = None,
+        flush_interval: float | None = None,
+    ):
+        """
+        Args:
+            chat_id: 書き込み先のチャット ID。
+            max_batch_size: 1 回のフラッシュで書き込む最大件数。
+                省略時は設定値 `message_flush_batch_size` を使用する。
+            flush_interval: 最初のメッセージを受け取ってからフラッシュするまでの
+                最大待ち時間 (秒)。省略時は設定値 `message_flush_interval_sec`。
+        """
+        self.chat_id = chat_id
+        self.max_batch_size = min(
+            max_batch_size or settings.message_flush_batch_size,
+            _MAX_FIRESTORE_BATCH_SIZE,
+        )
+        self.flush_interval = (
+            flush_interval
+            if flush_interval is not None
+            else settings.message_flush_interval_sec
+        )
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+        self._closed = False
+
+    def start(self) -> None:
+        """バックグラウンドのフラッシュタスクを開始する。"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def enqueue(
+        self,
+        role: str,
+        content: str,
+        tool_calls: list[dict] | None = None,
+    ) -> None:
+        """
+        メッセージを書き込みキューに追加する (ノンブロッキング)。
+
+        Args:
+            role: 発言者 ("user" | "model" | "tool")。
+            content: メッセージ内容。
+            tool_calls: ツール呼び出し情報（オプション）。
+        """
+        if self._closed:
+            logger.warning(f"MessageWriteBuffer already closed: {self.chat_id}")
+            return
+
+        self._queue.put_nowait(
+            {
+                "role": role,
+                "content": content,
+                "toolCalls": tool_calls,
+                # バッチ内の順序を保つため、キュー投入時刻を createdAt とする
+                "createdAt": datetime.now(UTC),
+            }
+        )
+        MESSAGE_WRITE_QUEUE_DEPTH.inc()
+
+    async def close(self) -> None:
+        """
+        残りのメッセージをフラッシュし、バックグラウンドタスクを終了する。
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put_nowait(_CLOSE)
+
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception as e:
+                logger.error(f"MessageWriteBuffer task failed: {e}", exc_info=True)
+
+    async def _run(self) -> None:
+        """
+        キューを監視し、しきい値に達したらバッチ書き込みを行う。
+        """
+        loop = asyncio.get_running_loop()
+        closing = False
+
+        while not closing:
+            item = await self._queue.get()
+            if item is _CLOSE:
+                break
+
+            pending = [item]
+            deadline = loop.time() + self.flush_interval
+
+            # 件数または時間のしきい値に達するまで追加で収集する
+            while len(pending) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except TimeoutError:
+                    break
+                if item is _CLOSE:
+                    closing = True
+                    break
+                pending.append(item)
+
+            await self._write(pending)
+
+        # クローズ後に残っているメッセージを書き込む
+        remaining = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _CLOSE:
+                remaining.append(item)
+        for i in range(0, len(remaining), self.max_batch_size):
+            await self._write(remaining[i : i + self.max_batch_size])
+
+    async def _write(self, messages: list[dict]) -> None:
+        try:
+            await save_messages_batch(self.chat_id, messages)
+        finally:
+            MESSAGE_WRITE_QUEUE_DEPTH.dec(len(messages))
@@ -0,0 +1,155 @@
+"""Prometheus メトリクス。
+
+レイテンシのヒストグラムとキュー長などのゲージを定義し、`/metrics` で公開する。
+
+マルチワーカーで起動した場合 (`app.server`)、環境変数
+`PROMETHEUS_MULTIPROC_DIR` のディレクトリを介して全ワーカーの値を集計する。
+"""
+
+import functools
+import os
+import time
+from collections.abc import Awaitable, Callable
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+# 秒単位のバケット
+_FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_JOB_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# --- WebSocket セッション ---
+WS_HANDSHAKE_SECONDS = Histogram(
+    "ws_handshake_seconds",
+    "WebSocket 接続要求から accept までの時間 (トークン検証を含む)",
+    buckets=_LATENCY_BUCKETS,
+)
+BOOTSTRAP_SECONDS = Histogram(
+    "firestore_bootstrap_seconds",
+    "接続時のユーザー・チャット準備 (Firestore) にかかった時間",
+    buckets=_LATENCY_BUCKETS,
+)
+FIRST_AUDIO_SECONDS = Histogram(
+    "model_first_audio_seconds",
+    "ユーザーの発話の文字起こし完了から、応答音声の最初のチャンクまでの時間",
+    buckets=_LATENCY_BUCKETS,
+)
+EVENT_SEND_SECONDS = Histogram(
+    "ws_event_send_seconds",
+    "イベント 1 件のシリアライズとクライアントへの送信にかかった時間",
+    ["wire"],
+    buckets=_FAST_BUCKETS,
+)
+ACTIVE_SESSIONS = Gauge(
+    "ws_active_sessions",
+    "接続中の WebSocket セッション数",
+    multiprocess_mode="livesum",
+)
+SUSPENDED_SESSIONS = Gauge(
+    "live_suspended_sessions",
+    "アイドルのため Live セッションを一時停止している接続数",
+    multiprocess_mode="livesum",
+)
+AUDIO_INPUT_DECODE_ERRORS = Counter(
+    "audio_input_decode_errors",
+    "デコードできずに破棄した入力音声のパケット数",
+)
+
+# --- Firestore ---
+SAVE_MESSAGE_SECONDS = Histogram(
+    "firestore_save_message_seconds",
+    "メッセージの保存にかかった時間",
+    ["mode"],
+    buckets=_LATENCY_BUCKETS,
+)
+MESSAGE_WRITE_QUEUE_DEPTH = Gauge(
+    "message_write_queue_depth",
+    "保存待ちのメッセージ数",
+    multiprocess_mode="livesum",
+)
+
+# --- バックグラウンドジョブ ---
+IMAGE_JOB_STAGE_SECONDS = Histogram(
+    "image_job_stage_seconds",
+    "画像生成ジョブの各段階にかかった時間",
+    ["stage"],
+    buckets=_JOB_BUCKETS,
+)
+JOB_QUEUE_DEPTH = Gauge(
+    "job_queue_depth",
+    "実行待ちのジョブ数",
+    ["executor"],
+    multiprocess_mode="livesum",
+)
+JOB_RUNNING = Gauge(
+    "job_running",
+    "実行中のジョブ数",
+    ["executor"],
+    multiprocess_mode="livesum",
+)
+
+# --- ツール ---
+TOOL_CALL_SECONDS = Histogram(
+    "tool_call_seconds",
+    "エージェントのツール呼び出しにかかった時間",
+    ["tool", "outcome"],
+    buckets=_LATENCY_BUCKETS,
+)
+
+
+def timed_tool(func: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+    """
+    ツール関数の実行時間を記録するデコレーター。
+
+    ADK はシグネチャと docstring からツールの定義を作成するため、
+    `functools.wraps` で元の関数の情報を引き継ぐ。
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            return await func(*args, **kwargs)
+        except BaseException:
+            outcome = "raised"
+            raise
+        finally:
+            TOOL_CALL_SECONDS.labels(tool=func.__name__, outcome=outcome).observe(
+                time.perf_counter() - started
+            )
+
+    return wrapper
+
+
+def render_latest() -> tuple[bytes, str]:
+    """
+    Prometheus のテキスト形式でメトリクスを出力する。
+
+    Returns:
+        (本文, Content-Type) のタプル。
+    """
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    """
+    ワーカーの終了時に呼び出し、このプロセスのゲージを集計対象から外す。
+    """
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        multiprocess.mark_process_dead(os.getpid())
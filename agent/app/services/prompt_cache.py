@@ -0,0 +1,242 @@
+"""画像生成プロンプトのキャッシュ。
+
+子供からのリクエストは「ねこの絵」のように似たものが多く、
+モデルが作成する英語プロンプトも語順や大文字小文字が違うだけのことが多い。
+プロンプトを正規化したハッシュをキーに生成済み画像の GCS URI を保持し、
+同じプロンプトでは画像生成を省略する。
+
+- 1 段目: プロセス内の LRU (TTL 付き)
+- 2 段目: Firestore (`prompt_cache_collection`)
+"""
+
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import UTC, datetime, timedelta
+
+from app.config import settings
+from app.services.firestore_service import (
+    get_prompt_cache_entry,
+    is_prompt_cache_opted_out,
+    set_prompt_cache_entry,
+)
+
+logger = logging.getLogger(__name__)
+
+_SEPARATOR_PATTERN = re.compile(r"[.;:!?、。]")
+_PUNCTUATION_PATTERN = re.compile(r"[^\w\s,]")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+_ARTICLES = {"a", "an", "the"}
+
+# 並び順が意味を変えないスタイル系の形容詞
+_STYLE_ADJECTIVES = {
+    "adorable",
+    "bright",
+    "cheerful",
+    "colorful",
+    "cute",
+    "dreamy",
+    "friendly",
+    "fluffy",
+    "gentle",
+    "happy",
+    "little",
+    "lovely",
+    "magical",
+    "playful",
+    "pretty",
+    "simple",
+    "small",
+    "soft",
+    "sparkling",
+    "sweet",
+    "vibrant",
+    "warm",
+    "whimsical",
+}
+
+
+def _normalize_segment(segment: str) -> str:
+    words = [word for word in segment.split() if word]
+    if words and words[0] in _ARTICLES:
+        words = words[1:]
+
+    # 連続するスタイル形容詞の並びを辞書順にそろえる
+    normalized: list[str] = []
+    run: list[str] = []
+    for word in words:
+        if word in _STYLE_ADJECTIVES:
+            run.append(word)
+            continue
+        normalized.extend(sorted(run))
+        run = []
+        normalized.append(word)
+    normalized.extend(sorted(run))
+    return " ".join(normalized)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    画像生成プロンプトを正規化する。
+
+    - Unicode 正規化 (NFKC) と小文字化
+    - 句読点の除去と空白の統一 (文末記号は句の区切りとして扱う)
+    - 形容詞だけの句を次の句に結合する
+    - 各句の先頭の冠詞を除去し、連続するスタイル形容詞を辞書順に並べ替え
+    - 先頭の句 (被写体) 以外の句を辞書順に並べ替え
+
+    Args:
+        prompt: 画像生成プロンプト。
+
+    Returns:
+        正規化したプロンプト。
+    """
+    text = unicodedata.normalize("NFKC", prompt).lower()
+    text = _SEPARATOR_PATTERN.sub(",", text)
+    text = _PUNCTUATION_PATTERN.sub(" ", text)
+    text = _WHITESPACE_PATTERN.sub(" ", text)
+
+    # "cute, playful cat" のように形容詞だけの句は次の句に結合する
+    segments: list[str] = []
+    carry = ""
+    for segment in text.split(","):
+        segment = f"{carry} {segment}".strip()
+        words = [word for word in segment.split() if word not in _ARTICLES]
+        if words and all(word in _STYLE_ADJECTIVES for word in words):
+            carry = segment
+            continue
+        carry = ""
+        segments.append(segment)
+    if carry:
+        segments.append(carry)
+
+    segments = [_normalize_segment(segment) for segment in segments]
+    segments = [segment for segment in segments if segment]
+    if not segments:
+        return ""
+
+    subject, modifiers = segments[0], sorted(set(segments[1:]))
+    return ", ".join([subject, *modifiers])
+
+
+def hash_prompt(normalized_prompt: str) -> str:
+    """正規化したプロンプトのハッシュを返す。"""
+    return hashlib.sha256(normalized_prompt.encode()).hexdigest()
+
+
+class PromptCache:
+    """
+    正規化したプロンプトのハッシュ → 生成画像の GCS URI を保持するキャッシュ。
+    """
+
+    def __init__(self, max_size: int, ttl_sec: int):
+        """
+        Args:
+            max_size: メモリ上に保持する最大件数。
+            ttl_sec: エントリの有効期間 (秒)。
+        """
+        self.max_size = max_size
+        self.ttl_sec = ttl_sec
+        # prompt_hash -> (image_url, expires_at の UNIX 時刻)
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self.memory_hits = 0
+        self.firestore_hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    async def is_enabled_for(self, user_id: str | None) -> bool:
+        """
+        ユーザーに対してキャッシュを使用するかを返す。
+
+        Args:
+            user_id: ユーザー ID。
+
+        Returns:
+            キャッシュが有効で、ユーザーがオプトアウトしていない場合は True。
+        """
+        if not settings.prompt_cache_enabled:
+            return False
+        if await is_prompt_cache_opted_out(user_id):
+            self.skipped += 1
+            return False
+        return True
+
+    async def get(self, prompt: str) -> str | None:
+        """
+        プロンプトに対応する生成画像の GCS URI を取得する。
+
+        Args:
+            prompt: 画像生成プロンプト。
+
+        Returns:
+            GCS URI、またはキャッシュにない場合は None。
+        """
+        prompt_hash = hash_prompt(normalize_prompt(prompt))
+        now = time.time()
+
+        entry = self._entries.get(prompt_hash)
+        if entry is not None:
+            image_url, expires_at = entry
+            if now < expires_at:
+                self._entries.move_to_end(prompt_hash)
+                self.memory_hits += 1
+                return image_url
+            del self._entries[prompt_hash]
+
+        doc = await get_prompt_cache_entry(prompt_hash)
+        if doc and doc.get("imageUrl") and doc.get("expiresAt"):
+            expires_at = doc["expiresAt"].timestamp()
+            if now < expires_at:
+                self._remember(prompt_hash, doc["imageUrl"], expires_at)
+                self.firestore_hits += 1
+                return doc["imageUrl"]
+
+        self.misses += 1
+        return None
+
+    async def put(self, prompt: str, image_url: str) -> None:
+        """
+        プロンプトと生成画像の GCS URI を登録する。
+
+        Args:
+            prompt: 画像生成プロンプト。
+            image_url: 生成画像の GCS URI。
+        """
+        normalized_prompt = normalize_prompt(prompt)
+        prompt_hash = hash_prompt(normalized_prompt)
+        expires_at = datetime.now(UTC) + timedelta(seconds=self.ttl_sec)
+
+        self._remember(prompt_hash, image_url, expires_at.timestamp())
+        await set_prompt_cache_entry(
+            prompt_hash, normalized_prompt, image_url, expires_at
+        )
+
+    def _remember(self, prompt_hash: str, image_url: str, expires_at: float) -> None:
+        self._entries[prompt_hash] = (image_url, expires_at)
+        self._entries.move_to_end(prompt_hash)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        キャッシュの統計情報 (ヒット率を含む) を返す。
+        """
+        hits = self.memory_hits + self.firestore_hits
+        lookups = hits + self.misses
+        return {
+            "size": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "firestore_hits": self.firestore_hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+        }
+
+
+prompt_cache = PromptCache(
+    max_size=settings.prompt_cache_size,
+    ttl_sec=settings.prompt_cache_ttl_sec,
+)
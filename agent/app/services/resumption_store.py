@@ -0,0 +1,184 @@
+"""Live API のセッション再開ハンドルの保存先。
+
+Live API は `session_resumption` を有効にすると、会話の進行に合わせて
+再開用のハンドルを送ってくる。チャットごとに最新のハンドルを保持し、
+同じ chat_id で再接続したときに渡すことで、履歴を送り直さずに
+Live セッションを再開する。
+
+- 1 段目: プロセス内の LRU (TTL 付き)
+- 2 段目: Firestore (`resumption_collection`)。別のワーカーやインスタンスに
+  再接続した場合に使用する。書き込みは `persist_interval` ごとに間引き、
+  セッション終了時に最新のハンドルを書き込む。
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.config import settings
+from app.services.firestore_service import (
+    delete_resumption_handle,
+    get_resumption_handle,
+    set_resumption_handle,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Entry:
+    session_id: str
+    handle: str
+    # ハンドルを受信した時刻 (time.time())
+    updated_at: float
+    # Firestore に書き込んだ時刻 (time.monotonic())。未書き込みの場合は None
+    persisted_at: float | None = None
+    dirty: bool = True
+
+
+class ResumptionStore:
+    """
+    chat_id → 最新のセッション再開ハンドルを保持するクラス。
+    """
+
+    def __init__(self, max_size: int, ttl_sec: float, persist_interval: float):
+        """
+        Args:
+            max_size: メモリ上に保持する最大件数。
+            ttl_sec: ハンドルの有効期間 (秒)。
+            persist_interval: Firestore に書き込む最小間隔 (秒)。
+        """
+        self.max_size = max_size
+        self.ttl_sec = ttl_sec
+        self.persist_interval = persist_interval
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._tasks: set[asyncio.Task] = set()
+        self.memory_hits = 0
+        self.firestore_hits = 0
+        self.misses = 0
+
+    async def get(self, chat_id: str, session_id: str | None) -> str | None:
+        """
+        再接続時に使用するハンドルを取得する。
+
+        Args:
+            chat_id: チャットセッションの ID。
+            session_id: チャットに紐付く ADK セッション ID。
+                ハンドルを発行したセッションと異なる場合は使用しない。
+
+        Returns:
+            セッション再開ハンドル、または使用できるものがない場合は None。
+        """
+        if not session_id:
+            return None
+
+        entry = self._entries.get(chat_id)
+        if entry is not None and self._is_valid(entry, session_id):
+            self._entries.move_to_end(chat_id)
+            self.memory_hits += 1
+            return entry.handle
+
+        doc = await get_resumption_handle(chat_id)
+        if doc and doc.get("handle") and doc.get("expiresAt"):
+            entry = _Entry(
+                session_id=doc.get("sessionId") or "",
+                handle=doc["handle"],
+                updated_at=doc["expiresAt"].timestamp() - self.ttl_sec,
+                persisted_at=time.monotonic(),
+                dirty=False,
+            )
+            if self._is_valid(entry, session_id):
+                self._remember(chat_id, entry)
+                self.firestore_hits += 1
+                return entry.handle
+
+        self.misses += 1
+        return None
+
+    def _is_valid(self, entry: _Entry, session_id: str) -> bool:
+        return (
+            entry.session_id == session_id
+            and time.time() - entry.updated_at < self.ttl_sec
+        )
+
+    def update(self, chat_id: str, session_id: str, handle: str) -> None:
+        """
+        Live API から受信した最新のハンドルを登録する。
+
+        メモリには即時反映し、Firestore には `persist_interval` ごとに書き込む。
+
+        Args:
+            chat_id: チャットセッションの ID。
+            session_id: ADK セッション ID。
+            handle: セッション再開ハンドル。
+        """
+        previous = self._entries.get(chat_id)
+        entry = _Entry(session_id=session_id, handle=handle, updated_at=time.time())
+        if previous is not None:
+            entry.persisted_at = previous.persisted_at
+        self._remember(chat_id, entry)
+
+        if (
+            entry.persisted_at is None
+            or time.monotonic() - entry.persisted_at >= self.persist_interval
+        ):
+            self._persist_in_background(chat_id, entry)
+
+    def _persist_in_background(self, chat_id: str, entry: _Entry) -> None:
+        entry.persisted_at = time.monotonic()
+        entry.dirty = False
+        task = asyncio.create_task(
+            set_resumption_handle(chat_id, entry.session_id, entry.handle)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self, chat_id: str) -> None:
+        """
+        セッション終了時に呼び出し、未書き込みのハンドルを Firestore に書き込む。
+
+        Args:
+            chat_id: チャットセッションの ID。
+        """
+        entry = self._entries.get(chat_id)
+        if entry is None or not entry.dirty:
+            return
+        entry.persisted_at = time.monotonic()
+        entry.dirty = False
+        await set_resumption_handle(chat_id, entry.session_id, entry.handle)
+
+    async def discard(self, chat_id: str) -> None:
+        """
+        再開に失敗したハンドルを削除する (次回は新しい Live セッションを開始する)。
+
+        Args:
+            chat_id: チャットセッションの ID。
+        """
+        self._entries.pop(chat_id, None)
+        await delete_resumption_handle(chat_id)
+
+    def _remember(self, chat_id: str, entry: _Entry) -> None:
+        self._entries[chat_id] = entry
+        self._entries.move_to_end(chat_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        ストアの統計情報を返す。
+        """
+        return {
+            "size": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "firestore_hits": self.firestore_hits,
+            "misses": self.misses,
+        }
+
+
+resumption_store = ResumptionStore(
+    max_size=settings.resumption_cache_size,
+    ttl_sec=settings.resumption_ttl_sec,
+    persist_interval=settings.resumption_persist_interval_sec,
+)
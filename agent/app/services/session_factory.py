@@ -7,6 +7,8 @@ from google.adk.sessions import (
 )
 
 from app.config import settings
+from app.services.cached_session_service import CachedSessionService
+from app.services.sqlite_session_service import SqliteSessionService
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +23,8 @@ def get_session_service(app_name: str) -> BaseSessionService:
     Returns:
         初期化された BaseSessionService インスタンス。
         - "vertexai": VertexAiSessionService を使用 (本番環境向け)。
+        - "cached-vertexai": VertexAiSessionService の前段にローカルキャッシュを置く。
+        - "sqlite": SqliteSessionService を使用 (セルフホスト環境向け)。
         - "memory": InMemorySessionService を使用 (ローカル開発向け)。
     """
     session_type = settings.session_type.lower()
@@ -29,7 +33,7 @@ def get_session_service(app_name: str) -> BaseSessionService:
 
     logger.info(f"Initializing SessionService with type: {session_type}")
 
-    if session_type == "vertexai":
+    if session_type in ("vertexai", "cached-vertexai"):
         if not project_id:
             # ローカルなどでプロジェクトIDがない場合、memoryにフォールバック、
             # またはエラーにする
@@ -38,11 +42,23 @@ def get_session_service(app_name: str) -> BaseSessionService:
             )
             return InMemorySessionService()
 
-        return VertexAiSessionService(
+        vertex_session_service = VertexAiSessionService(
             project=project_id,
             location=location,
             agent_engine_id=settings.vertex_ai_agent_engine_id,
         )
+        if session_type == "cached-vertexai":
+            return CachedSessionService(
+                vertex_session_service,
+                max_size=settings.session_cache_size,
+                ttl_sec=settings.session_cache_ttl_sec,
+            )
+        return vertex_session_service
+    elif session_type == "sqlite":
+        return SqliteSessionService(
+            settings.sqlite_session_db_path,
+            max_events_per_session=settings.sqlite_session_max_events,
+        )
     elif session_type == "memory":
         return InMemorySessionService()
     else:
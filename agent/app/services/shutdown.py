@@ -0,0 +1,163 @@
+"""シャットダウン時の接続ドレインと後処理の調整。
+
+Cloud Run のリビジョン切り替えやスケールインでは SIGTERM の後、
+猶予時間 (10 秒) を過ぎるとプロセスが強制終了される。
+uvicorn は SIGTERM を受けると WebSocket を即座に 1012 で閉じるため、
+その前に次の処理を行う。
+
+1. 新規の `/ws` 接続の受け付けを停止する。
+2. 接続中のクライアントに再接続を依頼し、各セッションの終了処理
+   (未保存メッセージのフラッシュ) が終わるのを待つ。
+3. uvicorn のシャットダウンを開始し、lifespan の終了処理で
+   画像生成ジョブとセッションの書き込みを期限内に完了させる。
+"""
+
+import asyncio
+import logging
+import signal
+import time
+from collections.abc import Awaitable, Callable
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ShutdownCoordinator:
+    """
+    接続中のセッションを管理し、シャットダウン時のドレインを行うクラス。
+    """
+
+    def __init__(self, drain_timeout: float, deadline: float):
+        """
+        Args:
+            drain_timeout: セッションの終了を待つ最大時間 (秒)。
+            deadline: SIGTERM から後処理の完了までの最大時間 (秒)。
+        """
+        self.drain_timeout = drain_timeout
+        self.deadline = deadline
+        # token -> 再接続を依頼するコールバック
+        self._sessions: dict[int, Callable[[], Awaitable[None]]] = {}
+        self._next_token = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._started_at: float | None = None
+        self._drain_task: asyncio.Task | None = None
+        self._drain_report: dict | None = None
+
+    @property
+    def draining(self) -> bool:
+        """シャットダウン中 (新規接続を受け付けない) かどうか。"""
+        return self._started_at is not None
+
+    def remaining(self) -> float:
+        """後処理に使える残り時間 (秒)。"""
+        if self._started_at is None:
+            return self.deadline
+        return max(0.0, self.deadline - (time.monotonic() - self._started_at))
+
+    def register(self, notify: Callable[[], Awaitable[None]]) -> int:
+        """
+        接続中のセッションを登録する。
+
+        Args:
+            notify: シャットダウン時にクライアントへ再接続を依頼するコールバック。
+
+        Returns:
+            登録解除に使用するトークン。
+        """
+        self._next_token += 1
+        self._sessions[self._next_token] = notify
+        self._idle.clear()
+        return self._next_token
+
+    def unregister(self, token: int) -> None:
+        """
+        セッションの登録を解除する (セッションの終了処理の最後に呼び出す)。
+        """
+        self._sessions.pop(token, None)
+        if not self._sessions:
+            self._idle.set()
+
+    def install_signal_handler(self) -> None:
+        """
+        SIGTERM を受けたときに、ドレインしてから元のハンドラー
+        (uvicorn のシャットダウン) を呼び出すようにする。
+
+        lifespan の起動時 (uvicorn がシグナルハンドラーを設定した後) に呼び出す。
+        """
+        loop = asyncio.get_running_loop()
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def _handle() -> None:
+            if self._drain_task is not None:
+                # 2 回目の SIGTERM はドレインを待たずに終了する
+                self._restore_signal_handler(loop, previous)
+                return
+            logger.info("SIGTERM received. Draining live sessions...")
+            self._drain_task = loop.create_task(self._drain_then_exit(loop, previous))
+
+        try:
+            loop.add_signal_handler(signal.SIGTERM, _handle)
+        except (NotImplementedError, RuntimeError, ValueError):
+            # Windows やメインスレッド以外では uvicorn の既定の動作に任せる
+            logger.debug("SIGTERM handler is not available on this platform")
+
+    def _restore_signal_handler(self, loop, previous) -> None:
+        loop.remove_signal_handler(signal.SIGTERM)
+        signal.signal(signal.SIGTERM, previous)
+        if callable(previous):
+            previous(signal.SIGTERM, None)
+        else:
+            signal.raise_signal(signal.SIGTERM)
+
+    async def _drain_then_exit(self, loop, previous) -> None:
+        try:
+            await self.drain_sessions()
+        finally:
+            self._restore_signal_handler(loop, previous)
+
+    async def drain_sessions(self) -> dict:
+        """
+        新規接続の受け付けを停止し、接続中のセッションに再接続を依頼して
+        終了を待つ。複数回呼び出された場合は最初の結果を返す。
+
+        Returns:
+            ドレインしたセッション数を含む結果。
+        """
+        if self._drain_report is not None:
+            return self._drain_report
+        if self._started_at is None:
+            self._started_at = time.monotonic()
+
+        notified = len(self._sessions)
+        if notified:
+            logger.info(f"Asking {notified} live sessions to reconnect...")
+            results = await asyncio.gather(
+                *(notify() for notify in list(self._sessions.values())),
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.warning(f"Failed to notify session: {result}")
+
+        timeout = min(self.drain_timeout, self.remaining())
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+        except TimeoutError:
+            logger.warning(
+                f"{len(self._sessions)} sessions did not close within {timeout:.1f}s"
+            )
+
+        self._drain_report = {
+            "notified": notified,
+            "drained": notified - len(self._sessions),
+            "remaining": len(self._sessions),
+        }
+        return self._drain_report
+
+
+shutdown_coordinator = ShutdownCoordinator(
+    drain_timeout=settings.shutdown_drain_timeout_sec,
+    deadline=settings.shutdown_deadline_sec,
+)
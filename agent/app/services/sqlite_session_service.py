@@ -0,0 +1,442 @@
+"""SQLite を使用した永続 SessionService。
+
+セルフホスト環境向けに、Agent Engine を使わずにセッションを永続化する。
+
+- WAL モードで動作し、同一ホスト上の複数ワーカープロセスから共有できる。
+- (app_name, user_id, session_id) の主キー・インデックスで検索する。
+- イベントは 1 行ずつ追記し、セッション全体を書き換えない。
+- セッションごとに保持するイベント数を超えた古いイベントを削除 (コンパクション) する。
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import (
+    GetSessionConfig,
+    ListSessionsResponse,
+)
+from google.adk.sessions.state import State
+
+logger = logging.getLogger(__name__)
+
+# 何件のイベント追加ごとにセッションのコンパクションを行うか
+_COMPACT_INTERVAL = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_session
+    ON events (app_name, user_id, session_id, seq);
+CREATE TABLE IF NOT EXISTS app_states (
+    app_name TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_states (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+);
+"""
+
+
+def _split_state(state: dict[str, Any]) -> tuple[dict, dict, dict]:
+    """
+    state を app / user / session のスコープに分割する。
+
+    `temp:` で始まるキーは永続化しない。
+    """
+    app_state: dict[str, Any] = {}
+    user_state: dict[str, Any] = {}
+    session_state: dict[str, Any] = {}
+    for key, value in state.items():
+        if key.startswith(State.APP_PREFIX):
+            app_state[key.removeprefix(State.APP_PREFIX)] = value
+        elif key.startswith(State.USER_PREFIX):
+            user_state[key.removeprefix(State.USER_PREFIX)] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session_state[key] = value
+    return app_state, user_state, session_state
+
+
+def _merge_state(app_state: dict, user_state: dict, session_state: dict) -> dict:
+    merged = dict(session_state)
+    merged.update({State.APP_PREFIX + k: v for k, v in app_state.items()})
+    merged.update({State.USER_PREFIX + k: v for k, v in user_state.items()})
+    return merged
+
+
+class SqliteSessionService(BaseSessionService):
+    """
+    SQLite にセッションとイベントを保存する SessionService。
+
+    DB アクセスはスレッドで実行し、イベントループをブロックしない。
+    """
+
+    def __init__(self, db_path: str, max_events_per_session: int = 0):
+        """
+        Args:
+            db_path: SQLite データベースファイルのパス。
+            max_events_per_session: セッションごとに保持する最大イベント数。
+                0 の場合はコンパクションを行わない。
+        """
+        self.db_path = db_path
+        self.max_events_per_session = max_events_per_session
+        self._lock = threading.Lock()
+        self._appends_since_compaction: dict[tuple[str, str, str], int] = {}
+
+        self._conn = sqlite3.connect(
+            db_path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(_SCHEMA)
+        logger.info(f"SqliteSessionService initialized: {db_path}")
+
+    def _run(self, fn, *args):
+        """ロックを取得したうえで、DB 操作をスレッドで実行する。"""
+
+        def locked():
+            with self._lock:
+                return fn(*args)
+
+        return asyncio.to_thread(locked)
+
+    # --- 内部の同期処理 (スレッドで実行) ---
+
+    def _load_scoped_state(self, app_name: str, user_id: str) -> tuple[dict, dict]:
+        row = self._conn.execute(
+            "SELECT state FROM app_states WHERE app_name = ?", (app_name,)
+        ).fetchone()
+        app_state = json.loads(row[0]) if row else {}
+        row = self._conn.execute(
+            "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?",
+            (app_name, user_id),
+        ).fetchone()
+        user_state = json.loads(row[0]) if row else {}
+        return app_state, user_state
+
+    def _apply_scoped_delta(
+        self,
+        app_name: str,
+        user_id: str,
+        app_delta: dict,
+        user_delta: dict,
+    ) -> None:
+        if not app_delta and not user_delta:
+            return
+        app_state, user_state = self._load_scoped_state(app_name, user_id)
+        if app_delta:
+            app_state.update(app_delta)
+            self._conn.execute(
+                "INSERT INTO app_states (app_name, state) VALUES (?, ?) "
+                "ON CONFLICT (app_name) DO UPDATE SET state = excluded.state",
+                (app_name, json.dumps(app_state)),
+            )
+        if user_delta:
+            user_state.update(user_delta)
+            self._conn.execute(
+                "INSERT INTO user_states (app_name, user_id, state) VALUES (?, ?, ?) "
+                "ON CONFLICT (app_name, user_id) DO UPDATE SET state = excluded.state",
+                (app_name, user_id, json.dumps(user_state)),
+            )
+
+    def _create(
+        self,
+        app_name: str,
+        user_id: str,
+        state: dict[str, Any],
+        session_id: str,
+    ) -> Session:
+        app_delta, user_delta, session_state = _split_state(state)
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._apply_scoped_delta(app_name, user_id, app_delta, user_delta)
+            self._conn.execute(
+                "INSERT INTO sessions (app_name, user_id, id, state, update_time) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (app_name, user_id, session_id, json.dumps(session_state), now),
+            )
+            app_state, user_state = self._load_scoped_state(app_name, user_id)
+            self._conn.execute("COMMIT")
+        except sqlite3.IntegrityError as e:
+            self._conn.execute("ROLLBACK")
+            raise ValueError(f"Session already exists: {session_id}") from e
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+        return Session(
+            id=session_id,
+            app_name=app_name,
+            user_id=user_id,
+            state=_merge_state(app_state, user_state, session_state),
+            last_update_time=now,
+        )
+
+    def _get(
+        self,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: GetSessionConfig | None,
+    ) -> Session | None:
+        row = self._conn.execute(
+            "SELECT state, update_time FROM sessions "
+            "WHERE app_name = ? AND user_id = ? AND id = ?",
+            (app_name, user_id, session_id),
+        ).fetchone()
+        if row is None:
+            return None
+        session_state, update_time = json.loads(row[0]), row[1]
+
+        where = "app_name = ? AND user_id = ? AND session_id = ?"
+        params: list[Any] = [app_name, user_id, session_id]
+        if config and config.after_timestamp:
+            where += " AND timestamp >= ?"
+            params.append(config.after_timestamp)
+        if config and config.num_recent_events:
+            # 最新 N 件を取得し、時系列順に並べ直す
+            query = (
+                f"SELECT data FROM (SELECT seq, data FROM events WHERE {where} "
+                "ORDER BY seq DESC LIMIT ?) ORDER BY seq"
+            )
+            params.append(config.num_recent_events)
+        else:
+            query = f"SELECT data FROM events WHERE {where} ORDER BY seq"
+
+        events = [
+            Event.model_validate_json(data)
+            for (data,) in self._conn.execute(query, params).fetchall()
+        ]
+        app_state, user_state = self._load_scoped_state(app_name, user_id)
+
+        return Session(
+            id=session_id,
+            app_name=app_name,
+            user_id=user_id,
+            state=_merge_state(app_state, user_state, session_state),
+            events=events,
+            last_update_time=update_time,
+        )
+
+    def _list(self, app_name: str, user_id: str | None) -> list[Session]:
+        if user_id is None:
+            rows = self._conn.execute(
+                "SELECT user_id, id, update_time FROM sessions WHERE app_name = ?",
+                (app_name,),
+            ).fetchall()
+        else:
+            rows = self._conn.execute(
+                "SELECT user_id, id, update_time FROM sessions "
+                "WHERE app_name = ? AND user_id = ?",
+                (app_name, user_id),
+            ).fetchall()
+        return [
+            Session(
+                id=session_id,
+                app_name=app_name,
+                user_id=row_user_id,
+                state={},
+                last_update_time=update_time,
+            )
+            for row_user_id, session_id, update_time in rows
+        ]
+
+    def _delete(self, app_name: str, user_id: str, session_id: str) -> None:
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(
+                "DELETE FROM events "
+                "WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (app_name, user_id, session_id),
+            )
+            self._conn.execute(
+                "DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+                (app_name, user_id, session_id),
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _append(self, session: Session, event: Event) -> None:
+        state_delta = event.actions.state_delta if event.actions else None
+        app_delta, user_delta, session_delta = _split_state(state_delta or {})
+        timestamp = event.timestamp or time.time()
+
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._apply_scoped_delta(
+                session.app_name, session.user_id, app_delta, user_delta
+            )
+            if session_delta:
+                row = self._conn.execute(
+                    "SELECT state FROM sessions "
+                    "WHERE app_name = ? AND user_id = ? AND id = ?",
+                    (session.app_name, session.user_id, session.id),
+                ).fetchone()
+                session_state = json.loads(row[0]) if row else {}
+                session_state.update(session_delta)
+                self._conn.execute(
+                    "UPDATE sessions SET state = ?, update_time = ? "
+                    "WHERE app_name = ? AND user_id = ? AND id = ?",
+                    (
+                        json.dumps(session_state),
+                        timestamp,
+                        session.app_name,
+                        session.user_id,
+                        session.id,
+                    ),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE sessions SET update_time = ? "
+                    "WHERE app_name = ? AND user_id = ? AND id = ?",
+                    (timestamp, session.app_name, session.user_id, session.id),
+                )
+            self._conn.execute(
+                "INSERT INTO events "
+                "(app_name, user_id, session_id, timestamp, data) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    session.app_name,
+                    session.user_id,
+                    session.id,
+                    timestamp,
+                    event.model_dump_json(exclude_none=True),
+                ),
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _compact_session(self, app_name: str, user_id: str, session_id: str) -> int:
+        cursor = self._conn.execute(
+            "DELETE FROM events WHERE app_name = ? AND user_id = ? "
+            "AND session_id = ? AND seq NOT IN ("
+            "SELECT seq FROM events WHERE app_name = ? AND user_id = ? "
+            "AND session_id = ? ORDER BY seq DESC LIMIT ?)",
+            (
+                app_name,
+                user_id,
+                session_id,
+                app_name,
+                user_id,
+                session_id,
+                self.max_events_per_session,
+            ),
+        )
+        return cursor.rowcount
+
+    def _compact_all(self) -> int:
+        sessions = self._conn.execute(
+            "SELECT app_name, user_id, id FROM sessions"
+        ).fetchall()
+        deleted = sum(self._compact_session(*key) for key in sessions)
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return deleted
+
+    # --- BaseSessionService の実装 ---
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: dict[str, Any] | None = None,
+        session_id: str | None = None,
+    ) -> Session:
+        session_id = (session_id or "").strip() or str(uuid.uuid4())
+        return await self._run(self._create, app_name, user_id, state or {}, session_id)
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: GetSessionConfig | None = None,
+    ) -> Session | None:
+        return await self._run(self._get, app_name, user_id, session_id, config)
+
+    async def list_sessions(
+        self,
+        *,
+        app_name: str,
+        user_id: str | None = None,
+    ) -> ListSessionsResponse:
+        sessions = await self._run(self._list, app_name, user_id)
+        return ListSessionsResponse(sessions=sessions)
+
+    async def delete_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+    ) -> None:
+        await self._run(self._delete, app_name, user_id, session_id)
+        self._appends_since_compaction.pop((app_name, user_id, session_id), None)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        event = await super().append_event(session=session, event=event)
+        if event.partial:
+            return event
+
+        await self._run(self._append, session, event)
+
+        if self.max_events_per_session > 0:
+            key = (session.app_name, session.user_id, session.id)
+            count = self._appends_since_compaction.get(key, 0) + 1
+            if count >= _COMPACT_INTERVAL:
+                count = 0
+                deleted = await self._run(self._compact_session, *key)
+                if deleted:
+                    logger.info(f"Compacted {deleted} events of session {session.id}")
+            self._appends_since_compaction[key] = count
+        return event
+
+    async def compact(self) -> int:
+        """
+        すべてのセッションで保持上限を超えた古いイベントを削除し、
+        WAL ファイルをチェックポイントする。
+
+        Returns:
+            削除したイベント数。
+        """
+        if self.max_events_per_session <= 0:
+            return 0
+        deleted = await self._run(self._compact_all)
+        logger.info(f"Compacted {deleted} events")
+        return deleted
+
+    def close(self) -> None:
+        """データベース接続を閉じる。"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,197 @@
+"""エネルギーベースの音声区間検出 (VAD)。
+
+子供が考えている間の無音もクライアントからは送られ続けるため、
+サーバー側で発話区間だけを残し、無音区間はモデルに送信しない。
+発話の開始・終了は activity start / end としてモデルに明示的に通知する。
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.config import settings
+
+# VAD の入力フォーマット (16kHz / 16bit モノラル PCM)
+VAD_SAMPLE_RATE = 16000
+_BYTES_PER_SAMPLE = 2
+# int16 のフルスケール
+_FULL_SCALE = 32768.0
+
+
+@dataclass
+class VadEvent:
+    """
+    VAD の出力。
+
+    Attributes:
+        kind: "start" (発話開始) | "audio" (発話区間の音声) | "end" (発話終了)。
+        data: kind が "audio" の場合の PCM データ。
+    """
+
+    kind: str
+    data: bytes = b""
+
+
+class EnergyVad:
+    """
+    フレームごとの RMS エネルギー (dBFS) としきい値を比較して発話区間を検出するクラス。
+
+    - しきい値を超えたフレームが `min_speech_frames` 続くと発話開始とみなす。
+    - 発話中はしきい値を下回っても `hangover_ms` の間は発話を継続する。
+    - 発話開始直前の `preroll_ms` 分の音声も送信し、語頭の欠けを防ぐ。
+    """
+
+    def __init__(
+        self,
+        frame_ms: int | None = None,
+        threshold_db: float | None = None,
+        hangover_ms: int | None = None,
+        preroll_ms: int | None = None,
+        min_speech_frames: int | None = None,
+    ):
+        """
+        Args:
+            frame_ms: 判定するフレームの長さ (ミリ秒)。
+            threshold_db: 発話とみなす RMS のしきい値 (dBFS)。
+            hangover_ms: 発話終了とみなすまでに許容する無音の長さ (ミリ秒)。
+            preroll_ms: 発話開始前に含める音声の長さ (ミリ秒)。
+            min_speech_frames: 発話開始とみなす連続フレーム数。
+        """
+        self.frame_ms = frame_ms or settings.vad_frame_ms
+        self.threshold_db = (
+            threshold_db if threshold_db is not None else settings.vad_threshold_db
+        )
+        hangover_ms = (
+            hangover_ms if hangover_ms is not None else settings.vad_hangover_ms
+        )
+        preroll_ms = preroll_ms if preroll_ms is not None else settings.vad_preroll_ms
+        self.min_speech_frames = min_speech_frames or settings.vad_min_speech_frames
+
+        self._frame_samples = VAD_SAMPLE_RATE * self.frame_ms // 1000
+        self._frame_bytes = self._frame_samples * _BYTES_PER_SAMPLE
+        self._hangover_frames = hangover_ms // self.frame_ms
+        self._preroll_frames = max(preroll_ms // self.frame_ms, self.min_speech_frames)
+
+        # フレーム境界に満たない端数
+        self._remainder = b""
+        # 発話開始前の直近フレーム
+        self._preroll: list[bytes] = []
+        self._in_speech = False
+        self._voiced_run = 0
+        self._silent_run = 0
+
+        self.bytes_kept = 0
+        self.bytes_dropped = 0
+        self.segments = 0
+
+    @property
+    def in_speech(self) -> bool:
+        """発話区間中かどうか。"""
+        return self._in_speech
+
+    def frame_energies(self, frames: np.ndarray) -> np.ndarray:
+        """
+        フレームごとの RMS エネルギー (dBFS) を計算する。
+
+        Args:
+            frames: (フレーム数, フレーム長) の int16 配列。
+
+        Returns:
+            フレームごとの dBFS。
+        """
+        samples = frames.astype(np.float32) / _FULL_SCALE
+        mean_square = np.einsum("ij,ij->i", samples, samples) / samples.shape[1]
+        return 10.0 * np.log10(np.maximum(mean_square, 1e-10))
+
+    def process(self, data: bytes) -> list[VadEvent]:
+        """
+        PCM データを判定し、送信すべき音声と発話の開始・終了を返す。
+
+        Args:
+            data: 16kHz / 16bit モノラル PCM。
+
+        Returns:
+            VadEvent のリスト (入力順)。
+        """
+        data = self._remainder + data
+        usable = len(data) - len(data) % self._frame_bytes
+        self._remainder = data[usable:]
+        if usable == 0:
+            return []
+
+        frames = np.frombuffer(data[:usable], dtype=np.int16).reshape(
+            -1, self._frame_samples
+        )
+        voiced = self.frame_energies(frames) > self.threshold_db
+
+        events: list[VadEvent] = []
+        for index, is_voiced in enumerate(voiced.tolist()):
+            frame = data[index * self._frame_bytes : (index + 1) * self._frame_bytes]
+            self._process_frame(frame, is_voiced, events)
+        return self._merge_audio(events)
+
+    def _process_frame(
+        self, frame: bytes, is_voiced: bool, events: list[VadEvent]
+    ) -> None:
+        if self._in_speech:
+            self._silent_run = 0 if is_voiced else self._silent_run + 1
+            self.bytes_kept += len(frame)
+            events.append(VadEvent("audio", frame))
+            if self._silent_run > self._hangover_frames:
+                self._in_speech = False
+                self._voiced_run = 0
+                events.append(VadEvent("end"))
+            return
+
+        self._voiced_run = self._voiced_run + 1 if is_voiced else 0
+        self._preroll.append(frame)
+        if self._voiced_run >= self.min_speech_frames:
+            self._in_speech = True
+            self._silent_run = 0
+            self.segments += 1
+            preroll = b"".join(self._preroll)
+            self._preroll.clear()
+            self.bytes_kept += len(preroll)
+            events.append(VadEvent("start"))
+            events.append(VadEvent("audio", preroll))
+            return
+
+        if len(self._preroll) > self._preroll_frames:
+            dropped = self._preroll.pop(0)
+            self.bytes_dropped += len(dropped)
+
+    @staticmethod
+    def _merge_audio(events: list[VadEvent]) -> list[VadEvent]:
+        # 連続する音声はまとめて返す
+        merged: list[VadEvent] = []
+        for event in events:
+            if event.kind == "audio" and merged and merged[-1].kind == "audio":
+                merged[-1] = VadEvent("audio", merged[-1].data + event.data)
+            else:
+                merged.append(event)
+        return merged
+
+    def flush(self) -> list[VadEvent]:
+        """
+        ストリーム終了時に呼び出し、発話中であれば終了を通知する。
+        """
+        self.bytes_dropped += len(self._remainder) + sum(map(len, self._preroll))
+        self._remainder = b""
+        self._preroll.clear()
+        if not self._in_speech:
+            return []
+        self._in_speech = False
+        return [VadEvent("end")]
+
+    def stats(self) -> dict:
+        """
+        送信した音声と破棄した音声の割合を返す。
+        """
+        total = self.bytes_kept + self.bytes_dropped
+        return {
+            "segments": self.segments,
+            "bytes_kept": self.bytes_kept,
+            "bytes_dropped": self.bytes_dropped,
+            "kept_ratio": self.bytes_kept / total if total else 0.0,
+            "dropped_ratio": self.bytes_dropped / total if total else 0.0,
+        }
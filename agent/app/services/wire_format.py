@@ -0,0 +1,178 @@
+"""WebSocket のワイヤーフォーマット (送信形式) に関するユーティリティ。
+
+- "json" (デフォルト): ADK イベントをそのまま JSON にシリアライズして送信する。
+  音声 PCM は inline_data 内で base64 エンコードされる。
+- "binary": 音声パートを生の PCM としてバイナリフレームで送信し、
+  音声以外のメタデータのみを JSON で送信する。
+  `output_format=opus` の場合、payload は Opus パケット 1 つとなる。
+
+バイナリフレームの構造 (ネットワークバイトオーダー):
+
+    +------------+-------------+---------------------+-----------------+
+    | frame_type | codec       | sample_rate         | payload         |
+    | uint8      | uint8       | uint32              | bytes           |
+    +------------+-------------+---------------------+-----------------+
+"""
+
+import json
+import re
+import struct
+
+WIRE_JSON = "json"
+WIRE_BINARY = "binary"
+
+# バイナリワイヤーフォーマットのバージョン
+WIRE_BINARY_VERSION = 1
+
+# フレーム種別
+FRAME_TYPE_AUDIO = 0x01
+
+# 音声コーデック
+AUDIO_CODEC_PCM16 = 0x00
+# 1 フレームに 1 パケットの Opus (output_format=opus)
+AUDIO_CODEC_OPUS = 0x01
+
+# 出力音声のデフォルトサンプルレート (Gemini Live API は 24kHz PCM を返す)
+DEFAULT_OUTPUT_SAMPLE_RATE = 24000
+
+_FRAME_HEADER = struct.Struct("!BBI")
+_RATE_PATTERN = re.compile(r"rate=(\d+)")
+
+# 音声パート以外に、クライアントへ通知すべき情報を持つイベントのフィールド
+_SIGNAL_FIELDS = (
+    "turn_complete",
+    "interrupted",
+    "input_transcription",
+    "output_transcription",
+    "error_code",
+    "error_message",
+    "live_session_resumption_update",
+)
+
+
+def normalize_wire(wire: str | None) -> str:
+    """
+    クエリパラメータで指定されたワイヤーフォーマットを正規化する。
+
+    Args:
+        wire: クライアントが指定したワイヤーフォーマット。
+
+    Returns:
+        "binary" または "json"。未知の値は "json" として扱う。
+    """
+    if wire and wire.lower() == WIRE_BINARY:
+        return WIRE_BINARY
+    return WIRE_JSON
+
+
+def wire_handshake_message(wire: str, audio: str = "pcm16", projection: int = 0) -> str:
+    """
+    接続直後にクライアントへ送信する、ネゴシエーション結果のメッセージを返す。
+
+    Args:
+        wire: 正規化済みのワイヤーフォーマット。
+        audio: 正規化済みの出力音声フォーマット ("pcm16" | "opus")。
+        projection: 使用するイベント射影のバージョン (0 は射影なし)。
+
+    Returns:
+        JSON 文字列。
+    """
+    return json.dumps(
+        {
+            "type": "wire_format",
+            "wire": wire,
+            "version": WIRE_BINARY_VERSION,
+            "audio": audio,
+            "projection": projection,
+        },
+        separators=(",", ":"),
+    )
+
+
+def parse_sample_rate(
+    mime_type: str | None, default: int = DEFAULT_OUTPUT_SAMPLE_RATE
+) -> int:
+    """
+    MIME タイプ (例: "audio/pcm;rate=24000") からサンプルレートを取得する。
+
+    Args:
+        mime_type: 音声の MIME タイプ。
+        default: rate が含まれない場合のサンプルレート。
+
+    Returns:
+        サンプルレート (Hz)。
+    """
+    if mime_type:
+        match = _RATE_PATTERN.search(mime_type)
+        if match:
+            return int(match.group(1))
+    return default
+
+
+def encode_audio_frame(
+    data: bytes,
+    sample_rate: int,
+    codec: int = AUDIO_CODEC_PCM16,
+) -> bytes:
+    """
+    音声データにフレームヘッダーを付与したバイナリフレームを作成する。
+
+    Args:
+        data: 音声データ。
+        sample_rate: サンプルレート (Hz)。
+        codec: 音声コーデック。
+
+    Returns:
+        ヘッダー付きのバイナリフレーム。
+    """
+    return _FRAME_HEADER.pack(FRAME_TYPE_AUDIO, codec, sample_rate) + data
+
+
+def _is_audio_part(part) -> bool:
+    inline_data = getattr(part, "inline_data", None)
+    if not inline_data or not inline_data.data:
+        return False
+    mime_type = inline_data.mime_type or ""
+    return mime_type.startswith("audio/")
+
+
+def has_audio_part(event) -> bool:
+    """
+    イベントに音声パートが含まれるかどうかを返す。
+
+    Args:
+        event: ADK イベントオブジェクト。
+    """
+    content = getattr(event, "content", None)
+    parts = getattr(content, "parts", None) if content else None
+    return any(_is_audio_part(part) for part in parts or ())
+
+
+def split_audio_parts(event) -> tuple[list, object | None]:
+    """
+    イベントから音声パートを分離する。
+
+    Args:
+        event: ADK イベントオブジェクト。
+
+    Returns:
+        (音声 Blob のリスト, 音声を除いたイベント) のタプル。
+        音声以外にクライアントへ通知すべき情報がない場合、
+        イベントは None となる。
+    """
+    content = getattr(event, "content", None)
+    parts = getattr(content, "parts", None) if content else None
+    if not parts:
+        return [], event
+
+    audio_blobs = [part.inline_data for part in parts if _is_audio_part(part)]
+    if not audio_blobs:
+        return [], event
+
+    other_parts = [part for part in parts if not _is_audio_part(part)]
+    has_signal = any(getattr(event, name, None) for name in _SIGNAL_FIELDS)
+    if not other_parts and not has_signal:
+        return audio_blobs, None
+
+    stripped_content = content.model_copy(update={"parts": other_parts or None})
+    return audio_blobs, event.model_copy(update={"content": stripped_content})
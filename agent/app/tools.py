@@ -6,6 +6,7 @@ from google.adk.tools import ToolContext
 
 from app.services.firestore_service import update_chat_title
 from app.services.image_gen import generate_image
+from app.services.metrics import timed_tool
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +17,7 @@ class SessionFinishedException(Exception):
     pass
 
 
+@timed_tool
 async def end_session_tool() -> None:
     """
     ユーザーがさようならを言ったり、会話の終了を求めたりしたときに現在のセッションを終了します。
@@ -29,6 +31,7 @@ async def end_session_tool() -> None:
     raise SessionFinishedException("Session ended by user.")
 
 
+@timed_tool
 async def generate_image_tool(
     prompt: str,
     tool_context: ToolContext,
@@ -57,6 +60,7 @@ async def generate_image_tool(
     return await generate_image(prompt, user_id, chat_id)
 
 
+@timed_tool
 async def set_chat_title_tool(
     title: str,
     tool_context: ToolContext,
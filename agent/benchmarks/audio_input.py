@@ -0,0 +1,50 @@
+"""上り音声のリサンプリングにかかる CPU 時間のマイクロベンチマーク。
+
+セッション 1 秒分の音声を 20ms チャンクで変換したときの CPU 時間を計測する。
+
+    cd agent && uv run python -m benchmarks.audio_input
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from app.services.audio_input import PolyphaseResampler
+
+_CHUNK_MS = 20
+
+
+def bench_resampler(input_rate: int, seconds: float) -> float:
+    """
+    1 セッション秒あたりの CPU 時間 (ミリ秒) を返す。
+    """
+    rng = np.random.default_rng(0)
+    samples = (rng.standard_normal(int(input_rate * seconds)) * 3000).astype(np.int16)
+    chunk = input_rate * _CHUNK_MS // 1000
+    chunks = [samples[i : i + chunk] for i in range(0, len(samples), chunk)]
+
+    resampler = PolyphaseResampler(input_rate)
+    started = time.process_time()
+    for part in chunks:
+        resampler.process(part)
+    elapsed = time.process_time() - started
+    return elapsed * 1000 / seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument(
+        "--rates", type=int, nargs="+", default=[8000, 22050, 44100, 48000]
+    )
+    args = parser.parse_args()
+
+    print(f"{'input rate':>10}  {'cpu ms / session-sec':>20}  {'sessions / core':>15}")
+    for rate in args.rates:
+        cost = bench_resampler(rate, args.seconds)
+        print(f"{rate:>10}  {cost:>20.3f}  {1000 / cost:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
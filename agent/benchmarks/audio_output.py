@@ -0,0 +1,78 @@
+"""下り音声の Opus エンコードのマイクロベンチマーク。
+
+合成した音声 (24kHz PCM) をモデルの応答と同じ程度の大きさのチャンクで
+エンコードし、PCM に対するビットレートの削減率とフレームあたりの
+エンコード時間 (追加される遅延) を計測する。libopus が必要。
+
+    cd agent && uv run --extra opus python -m benchmarks.audio_output
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from app.services.audio_output import OpusStreamEncoder, opuslib
+from app.services.wire_format import DEFAULT_OUTPUT_SAMPLE_RATE
+
+# モデルの応答イベント 1 つあたりの音声の長さ (ミリ秒) の目安
+_EVENT_MS = 120
+
+
+def synthesize_speech(seconds: float, sample_rate: int) -> bytes:
+    """
+    基本周波数が揺らぐ倍音と音節ごとの振幅変化で、音声に近い信号を作る。
+    """
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 220 + 40 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12))
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    signal = voice * syllables + 0.02 * rng.standard_normal(len(t))
+    signal = signal / np.max(np.abs(signal)) * 12000
+    return signal.astype(np.int16).tobytes()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument(
+        "--bitrates", type=int, nargs="+", default=[16000, 24000, 32000]
+    )
+    args = parser.parse_args()
+
+    if opuslib is None:
+        print("opuslib / libopus is not available", file=sys.stderr)
+        sys.exit(1)
+
+    sample_rate = DEFAULT_OUTPUT_SAMPLE_RATE
+    pcm = synthesize_speech(args.seconds, sample_rate)
+    event_bytes = sample_rate * _EVENT_MS // 1000 * 2
+    pcm_kbps = sample_rate * 16 / 1000
+
+    print(
+        f"{'bitrate':>8}  {'kbps':>7}  {'saving':>7}  "
+        f"{'mean ms/frame':>13}  {'p99 ms/frame':>12}"
+    )
+    for bitrate in args.bitrates:
+        encoder = OpusStreamEncoder(sample_rate, bitrate=bitrate)
+        latencies = []
+        for offset in range(0, len(pcm), event_bytes):
+            started = time.perf_counter()
+            packets = encoder.encode(pcm[offset : offset + event_bytes])
+            if packets:
+                latencies.append((time.perf_counter() - started) * 1000 / len(packets))
+        encoder.flush()
+
+        stats = encoder.stats()
+        kbps = stats["bytes_out"] * 8 / args.seconds / 1000
+        print(
+            f"{bitrate:>8}  {kbps:>7.1f}  {1 - kbps / pcm_kbps:>7.1%}  "
+            f"{np.mean(latencies):>13.3f}  {np.percentile(latencies, 99):>12.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""マイクロベンチマークの計測・ベースライン保存・比較。
+
+pytest-benchmark と同様に、1 ラウンドが `min_round_sec` 以上になるよう
+内側のループ回数を調整してから複数ラウンド計測し、1 回あたりの時間の
+統計値を求める。結果は JSON のベースラインとして保存し、後から比較できる。
+"""
+
+import json
+import platform
+import statistics
+import sys
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+
+
+@dataclass
+class Result:
+    """1 つのベンチマークの計測結果 (時間はすべて 1 回あたりのマイクロ秒)。"""
+
+    name: str
+    rounds: int
+    iterations: int
+    min_us: float
+    median_us: float
+    mean_us: float
+    stddev_us: float
+
+    @property
+    def ops_per_sec(self) -> float:
+        return 1e6 / self.median_us if self.median_us else 0.0
+
+
+def measure(
+    name: str,
+    func: Callable[[], object],
+    rounds: int = 20,
+    min_round_sec: float = 0.02,
+    warmup_rounds: int = 2,
+) -> Result:
+    """
+    関数の 1 回あたりの実行時間を計測する。
+
+    Args:
+        name: ベンチマーク名。
+        func: 計測する関数 (引数なし)。
+        rounds: 計測するラウンド数。
+        min_round_sec: 1 ラウンドの最小時間 (秒)。内側のループ回数の調整に使う。
+        warmup_rounds: 計測前に捨てるラウンド数。
+
+    Returns:
+        計測結果。
+    """
+    iterations = 1
+    while True:
+        elapsed = _time_round(func, iterations)
+        if elapsed >= min_round_sec:
+            break
+        iterations *= max(2, min(10, int(min_round_sec / max(elapsed, 1e-9)) + 1))
+
+    for _ in range(warmup_rounds):
+        _time_round(func, iterations)
+
+    samples = [_time_round(func, iterations) * 1e6 / iterations for _ in range(rounds)]
+    return Result(
+        name=name,
+        rounds=rounds,
+        iterations=iterations,
+        min_us=min(samples),
+        median_us=statistics.median(samples),
+        mean_us=statistics.fmean(samples),
+        stddev_us=statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    )
+
+
+def _time_round(func: Callable[[], object], iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return time.perf_counter() - started
+
+
+def baseline_path(name: str) -> Path:
+    """ベースライン名から保存先のパスを返す。"""
+    return BASELINE_DIR / f"{name}.json"
+
+
+def save_baseline(name: str, results: list[Result]) -> Path:
+    """
+    計測結果をベースラインとして保存する。
+
+    Returns:
+        保存したファイルのパス。
+    """
+    path = baseline_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "created_at": datetime.now(UTC).isoformat(),
+        "machine": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+        },
+        "results": [asdict(result) for result in results],
+    }
+    path.write_text(json.dumps(payload, indent=2, ensure_ascii=False) + "\n")
+    return path
+
+
+def load_baseline(name: str) -> dict[str, Result]:
+    """
+    保存済みのベースラインを読み込む。
+
+    Raises:
+        FileNotFoundError: ベースラインが存在しない場合。
+    """
+    payload = json.loads(baseline_path(name).read_text())
+    return {item["name"]: Result(**item) for item in payload["results"]}
+
+
+def print_results(results: list[Result]) -> None:
+    """計測結果を表形式で出力する。"""
+    width = max(len(result.name) for result in results)
+    print(
+        f"{'name':<{width}}  {'median us':>10}  {'min us':>10}  "
+        f"{'stddev us':>10}  {'ops/sec':>12}"
+    )
+    for result in results:
+        print(
+            f"{result.name:<{width}}  {result.median_us:>10.2f}  "
+            f"{result.min_us:>10.2f}  {result.stddev_us:>10.2f}  "
+            f"{result.ops_per_sec:>12,.0f}"
+        )
+
+
+def print_comparison(
+    baseline: dict[str, Result], results: list[Result], threshold: float
+) -> list[str]:
+    """
+    ベースラインとの比較結果を出力する。
+
+    中央値の変化率が `threshold` を超えたものを改善・悪化と判定する。
+
+    Args:
+        baseline: ベースラインの計測結果。
+        results: 今回の計測結果。
+        threshold: 変化とみなす割合 (0.1 で ±10%)。
+
+    Returns:
+        悪化したベンチマーク名のリスト。
+    """
+    width = max(len(result.name) for result in results)
+    print(
+        f"{'name':<{width}}  {'base us':>10}  {'now us':>10}  "
+        f"{'change':>8}  {'status':<10}"
+    )
+    regressions = []
+    for result in results:
+        base = baseline.get(result.name)
+        if base is None:
+            print(
+                f"{result.name:<{width}}  {'-':>10}  {result.median_us:>10.2f}  "
+                f"{'-':>8}  new"
+            )
+            continue
+        change = result.median_us / base.median_us - 1.0
+        if change > threshold:
+            status = "SLOWER"
+            regressions.append(result.name)
+        elif change < -threshold:
+            status = "faster"
+        else:
+            status = "same"
+        print(
+            f"{result.name:<{width}}  {base.median_us:>10.2f}  "
+            f"{result.median_us:>10.2f}  {change:>+8.1%}  {status:<10}"
+        )
+    return regressions
@@ -0,0 +1,209 @@
+"""イベントごと・フレームごとのホットパスのマイクロベンチマーク。
+
+- 下り: `_send_event` (JSON / バイナリ、イベント射影の有無) と、
+  イベントごとに呼び出される `_save_transcription_if_finished` /
+  `_capture_resumption_handle`
+- 上り: `types.Blob` の作成と 16kHz PCM の入力パイプライン
+
+Live API の実際のイベントと同じ形のペイロード (120ms の 24kHz 音声、
+文字起こし、ツール呼び出し) を使用する。ネットワークや Firestore には接続しない。
+
+    cd agent && uv run python -m benchmarks.hot_paths --save main
+    cd agent && uv run python -m benchmarks.hot_paths --compare main
+"""
+
+import argparse
+import sys
+
+import numpy as np
+from google.adk.events import Event
+from google.genai import types
+
+from app.routers.websocket import (
+    _capture_resumption_handle,
+    _save_transcription_if_finished,
+    _send_event,
+)
+from app.services.audio_input import AudioInputPipeline, parse_input_format
+from app.services.event_projection import PROJECTION_LATEST, EventProjector
+from app.services.wire_format import DEFAULT_OUTPUT_SAMPLE_RATE, WIRE_BINARY
+from benchmarks.harness import (
+    load_baseline,
+    measure,
+    print_comparison,
+    print_results,
+    save_baseline,
+)
+
+# モデルの応答イベント 1 つあたりの音声の長さ (ミリ秒) の目安
+_EVENT_MS = 120
+# 上り音声のチャンク長 (ミリ秒)
+_UPSTREAM_CHUNK_MS = 40
+_INPUT_SAMPLE_RATE = 16000
+
+
+class _NullWebSocket:
+    """送信内容を捨てる WebSocket (シリアライズのコストだけを計測する)。"""
+
+    async def send_text(self, data: str) -> None:
+        pass
+
+    async def send_bytes(self, data: bytes) -> None:
+        pass
+
+
+class _NullMessageBuffer:
+    """書き込みキューの代わりに件数だけを数えるバッファ。"""
+
+    def __init__(self):
+        self.enqueued = 0
+
+    def enqueue(self, role: str, content: str, tool_calls=None) -> None:
+        self.enqueued += 1
+
+
+def _run(coro) -> None:
+    # _NullWebSocket は中断しないため、イベントループを介さずに完了させる
+    try:
+        coro.send(None)
+    except StopIteration:
+        return
+    raise RuntimeError("coroutine suspended unexpectedly")
+
+
+def _pcm(milliseconds: int, sample_rate: int) -> bytes:
+    rng = np.random.default_rng(0)
+    samples = rng.standard_normal(sample_rate * milliseconds // 1000) * 3000
+    return samples.astype(np.int16).tobytes()
+
+
+def build_events() -> dict[str, Event]:
+    """Live API の代表的なイベントを作成する。"""
+    audio = types.Blob(
+        data=_pcm(_EVENT_MS, DEFAULT_OUTPUT_SAMPLE_RATE),
+        mime_type=f"audio/pcm;rate={DEFAULT_OUTPUT_SAMPLE_RATE}",
+    )
+    return {
+        "audio": Event(
+            author="coco",
+            content=types.Content(role="model", parts=[types.Part(inline_data=audio)]),
+        ),
+        "output_transcription": Event(
+            author="coco",
+            partial=True,
+            output_transcription=types.Transcription(
+                text="今日はいい天気ですね。どこかへお出かけしますか？"
+            ),
+        ),
+        "input_transcription_finished": Event(
+            author="user",
+            input_transcription=types.Transcription(
+                text="海の絵を描いてほしいな", finished=True
+            ),
+        ),
+        "tool_call": Event(
+            author="coco",
+            content=types.Content(
+                role="model",
+                parts=[
+                    types.Part(
+                        function_call=types.FunctionCall(
+                            id="call-1",
+                            name="generate_image_tool",
+                            args={"prompt": "夕暮れの海辺を歩く白い猫、水彩画風"},
+                        )
+                    )
+                ],
+            ),
+        ),
+        "turn_complete": Event(author="coco", turn_complete=True),
+    }
+
+
+def build_cases() -> dict[str, object]:
+    """ベンチマーク名と計測する関数の対応を返す。"""
+    events = build_events()
+    websocket = _NullWebSocket()
+    message_buffer = _NullMessageBuffer()
+    cases = {}
+
+    for wire in ("json", WIRE_BINARY):
+        for kind, event in events.items():
+            cases[f"send_event[{wire}-{kind}]"] = lambda event=event, wire=wire: _run(
+                _send_event(websocket, event, wire)
+            )
+    projector = EventProjector(PROJECTION_LATEST)
+    for wire in ("json", WIRE_BINARY):
+        for kind, event in events.items():
+            cases[f"send_event[{wire}+v{PROJECTION_LATEST}-{kind}]"] = (
+                lambda event=event, wire=wire: _run(
+                    _send_event(websocket, event, wire, projector=projector)
+                )
+            )
+
+    for kind in ("audio", "input_transcription_finished"):
+        event = events[kind]
+        cases[f"save_transcription[{kind}]"] = lambda event=event: (
+            _save_transcription_if_finished(event, message_buffer)
+        )
+    cases["capture_resumption_handle[audio]"] = lambda: _capture_resumption_handle(
+        events["audio"], "chat", "session"
+    )
+
+    chunk = _pcm(_UPSTREAM_CHUNK_MS, _INPUT_SAMPLE_RATE)
+    mime_type = f"audio/pcm;rate={_INPUT_SAMPLE_RATE}"
+    cases[f"upstream_blob[{_UPSTREAM_CHUNK_MS}ms]"] = lambda: types.Blob(
+        data=chunk, mime_type=mime_type
+    )
+    pipeline = AudioInputPipeline(parse_input_format("pcm16"))
+    cases[f"upstream_pipeline[pcm16-{_UPSTREAM_CHUNK_MS}ms]"] = lambda: (
+        pipeline.process(chunk)
+    )
+    return cases
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument(
+        "-k", "--filter", default="", help="名前にこの文字列を含むものだけ実行する"
+    )
+    parser.add_argument("--save", metavar="NAME", help="結果をベースラインとして保存")
+    parser.add_argument("--compare", metavar="NAME", help="ベースラインと比較する")
+    parser.add_argument(
+        "--threshold", type=float, default=0.10, help="変化とみなす割合 (既定 10%%)"
+    )
+    parser.add_argument(
+        "--fail-on-regression",
+        action="store_true",
+        help="ベースラインより遅くなったものがあれば終了コード 1 で終了する",
+    )
+    args = parser.parse_args()
+
+    results = [
+        measure(name, func, rounds=args.rounds)
+        for name, func in build_cases().items()
+        if args.filter in name
+    ]
+    if not results:
+        print(f"No benchmark matches: {args.filter}", file=sys.stderr)
+        sys.exit(2)
+
+    regressions = []
+    if args.compare:
+        baseline = load_baseline(args.compare)
+        regressions = print_comparison(baseline, results, args.threshold)
+    else:
+        print_results(results)
+
+    if args.save:
+        path = save_baseline(args.save, results)
+        print(f"\nSaved baseline: {path}")
+
+    if regressions and args.fail_on_regression:
+        print(f"\n{len(regressions)} benchmarks regressed", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
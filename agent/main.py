@@ -1,4 +1,6 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 
 import firebase_admin
 from fastapi import FastAPI
@@ -6,13 +8,19 @@ from google.adk.runners import Runner
 
 from app.agent import agent
 from app.config import settings
-from app.routers import websocket
+from app.logging_config import configure_logging
+from app.routers import history, metrics, websocket
+from app.services.admission import admission_controller
+from app.services.cached_session_service import CachedSessionService
+from app.services.client_pool import client_pool
+from app.services.job_executor import image_job_executor
+from app.services.metrics import mark_process_dead
 from app.services.session_factory import get_session_service
+from app.services.shutdown import shutdown_coordinator
+from app.services.sqlite_session_service import SqliteSessionService
 
-# ログ設定
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+# ログ設定 (書き込みは別スレッドで行う)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Firebase Admin SDK の初期化
@@ -21,8 +29,53 @@ try:
 except ValueError:
     firebase_admin.initialize_app()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    アプリケーションのライフサイクル管理。
+    起動時に SIGTERM 受信時のドレイン処理を登録し、別のワーカーで
+    置き換えられたセッションの確認を開始する。
+    シャットダウン時は接続中のセッションをドレインした後、期限内で
+    画像生成ジョブとセッションの書き込みの完了を待ち、
+    共有クライアントのコネクションを解放して結果を記録する。
+    """
+    shutdown_coordinator.install_signal_handler()
+    admission_controller.start()
+    yield
+
+    report = {"sessions": await shutdown_coordinator.drain_sessions()}
+    await admission_controller.stop()
+    report["image_jobs"] = await image_job_executor.shutdown(
+        min(
+            settings.image_job_shutdown_timeout_sec,
+            shutdown_coordinator.remaining(),
+        )
+    )
+    if isinstance(session_service, CachedSessionService):
+        pending_writes = session_service.stats()["pending_writes"]
+        try:
+            # 期限を過ぎても書き込み自体はキャンセルしない
+            await asyncio.wait_for(
+                asyncio.shield(session_service.flush()),
+                timeout=shutdown_coordinator.remaining(),
+            )
+            report["session_writes"] = {"flushed": pending_writes}
+        except TimeoutError:
+            report["session_writes"] = {
+                "flushed": pending_writes - session_service.stats()["pending_writes"],
+                "remaining": session_service.stats()["pending_writes"],
+            }
+    if isinstance(session_service, SqliteSessionService):
+        await session_service.compact()
+        session_service.close()
+    await client_pool.close()
+    logger.info(f"Shutdown report: {report}")
+    mark_process_dead()
+
+
 # FastAPI アプリケーションの初期化
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # アプリケーション設定
 # VertexAiSessionService を使用する場合、app_name には Agent Engine ID を指定する
@@ -30,7 +83,7 @@ app = FastAPI()
 APP_NAME = (
     settings.vertex_ai_agent_engine_id
     if settings.vertex_ai_agent_engine_id
-    and settings.session_type.lower() == "vertexai"
+    and settings.session_type.lower() in ("vertexai", "cached-vertexai")
     else "coco-ai-bidi-streaming"
 )
 
@@ -47,12 +100,16 @@ app.state.app_name = APP_NAME
 
 # ルーターの登録
 app.include_router(websocket.router)
+app.include_router(metrics.router)
+app.include_router(history.router)
 
 
 @app.get("/")
 async def root():
     """
     ヘルスチェック用のルートエンドポイント。
+
+    認証なしで公開されるため、統計情報は返さない (`/stats` を参照)。
     """
     return {"message": "Hello from ADK Agent!", "app_name": APP_NAME}
 
@@ -61,10 +118,11 @@ def main():
     """
     アプリケーションのエントリーポイント。
     ローカル開発および本番環境(Cloud Run)でサーバーを起動するために使用されます。
+    ワーカー数などの設定は `app.server.run` を参照してください。
     """
-    import uvicorn
+    from app.server import run
 
-    uvicorn.run(app, host="0.0.0.0", port=8080)
+    run()
 
 
 if __name__ == "__main__":
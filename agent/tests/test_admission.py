@@ -0,0 +1,170 @@
+"""Live セッションの受け入れ制御のテスト。
+
+ワーカー間の共有は、同じ SQLite ファイルを開いた 2 つのコントローラーで確認する。
+"""
+
+import asyncio
+import os
+
+import pytest
+
+from app.services.admission import (
+    DUPLICATE_REJECT,
+    DUPLICATE_REPLACE,
+    REJECT_DUPLICATE_CHAT,
+    REJECT_INSTANCE_FULL,
+    REJECT_USER_LIMIT,
+    AdmissionController,
+    AdmissionRejected,
+)
+
+
+async def _evict() -> None:
+    pass
+
+
+def _controller(
+    max_sessions: int = 0,
+    per_user_limit: int = 0,
+    duplicate_policy: str = DUPLICATE_REPLACE,
+    state_path: str = "",
+) -> AdmissionController:
+    return AdmissionController(
+        max_sessions, per_user_limit, duplicate_policy, 1.0, state_path
+    )
+
+
+def _workers(tmp_path, **kwargs) -> tuple[AdmissionController, AdmissionController]:
+    state_path = str(tmp_path / "admission.db")
+    worker_a = _controller(state_path=state_path, **kwargs)
+    worker_b = _controller(state_path=state_path, **kwargs)
+    # 別のワーカーとして扱う (生存確認で削除されないよう実在するプロセスを使う)
+    worker_b._pid = os.getppid()
+    return worker_a, worker_b
+
+
+def test_same_user_replaces_session_for_chat():
+    async def scenario():
+        controller = _controller(per_user_limit=1)
+        first_token, _ = await controller.admit("alice", "chat-1", _evict)
+
+        token, evict_previous = await controller.admit("alice", "chat-1", _evict)
+
+        assert evict_previous is _evict
+        assert token != first_token
+        assert controller.active == 1
+        assert controller.replaced == 1
+        # 置き換えられたセッションの解除は新しいセッションに影響しない
+        await controller.release(first_token)
+        assert controller.active == 1
+
+    asyncio.run(scenario())
+
+
+def test_other_user_cannot_replace_session():
+    async def scenario():
+        controller = _controller()
+        token, _ = await controller.admit("alice", "chat-1", _evict)
+
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await controller.admit("mallory", "chat-1", _evict)
+
+        assert excinfo.value.reason == REJECT_DUPLICATE_CHAT
+        assert controller.replaced == 0
+        assert controller.stats()["users"] == 1
+        # 元のセッションは登録されたまま
+        await controller.release(token)
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_reject_policy_rejects_duplicate_chat():
+    async def scenario():
+        controller = _controller(duplicate_policy=DUPLICATE_REJECT)
+        await controller.admit("alice", "chat-1", _evict)
+
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await controller.admit("alice", "chat-1", _evict)
+
+        assert excinfo.value.reason == REJECT_DUPLICATE_CHAT
+
+    asyncio.run(scenario())
+
+
+def test_limits():
+    async def scenario():
+        controller = _controller(max_sessions=2, per_user_limit=1)
+        await controller.admit("alice", "chat-1", _evict)
+
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await controller.admit("alice", "chat-2", _evict)
+        assert excinfo.value.reason == REJECT_USER_LIMIT
+
+        await controller.admit("bob", "chat-3", _evict)
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await controller.admit("carol", "chat-4", _evict)
+        assert excinfo.value.reason == REJECT_INSTANCE_FULL
+        assert excinfo.value.retry_after >= 1
+
+    asyncio.run(scenario())
+
+
+def test_limits_are_shared_between_workers(tmp_path):
+    async def scenario():
+        worker_a, worker_b = _workers(tmp_path, max_sessions=2, per_user_limit=1)
+        await worker_a.admit("alice", "chat-1", _evict)
+
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await worker_b.admit("alice", "chat-2", _evict)
+        assert excinfo.value.reason == REJECT_USER_LIMIT
+
+        await worker_b.admit("bob", "chat-3", _evict)
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await worker_a.admit("carol", "chat-4", _evict)
+        assert excinfo.value.reason == REJECT_INSTANCE_FULL
+        assert worker_a.stats()["active"] == worker_b.stats()["active"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_duplicate_chat_on_another_worker(tmp_path):
+    async def scenario():
+        worker_a, worker_b = _workers(tmp_path, per_user_limit=1)
+        evicted = []
+
+        async def evict_first() -> None:
+            evicted.append("first")
+
+        await worker_a.admit("alice", "chat-1", evict_first)
+
+        # 他のユーザーは別のワーカーからでも置き換えられない
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await worker_b.admit("mallory", "chat-1", _evict)
+        assert excinfo.value.reason == REJECT_DUPLICATE_CHAT
+
+        # 同じユーザーの再接続は、古いセッションのワーカーが切断する
+        _, evict_previous = await worker_b.admit("alice", "chat-1", _evict)
+        assert evict_previous is None
+        assert worker_b.active == 1
+        assert await worker_a._evict_replaced() == 1
+        assert evicted == ["first"]
+        assert worker_a.stats()["local"] == 0
+        assert worker_a.active == 1
+
+    asyncio.run(scenario())
+
+
+def test_sessions_of_exited_worker_are_removed(tmp_path):
+    async def scenario():
+        worker_a, worker_b = _workers(tmp_path, per_user_limit=1)
+        await worker_b.admit("alice", "chat-1", _evict)
+
+        # worker_b が終了した
+        worker_b._pid = 2**22 + 1
+        worker_b._conn.execute("UPDATE live_sessions SET pid = ?", (worker_b._pid,))
+
+        await worker_a.admit("alice", "chat-2", _evict)
+        assert worker_a.active == 1
+
+    asyncio.run(scenario())
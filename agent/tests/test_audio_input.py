@@ -0,0 +1,61 @@
+"""上り音声の入力フォーマット変換のテスト。"""
+
+import numpy as np
+import pytest
+
+from app.services import audio_input
+from app.services.audio_input import (
+    INPUT_OPUS,
+    TARGET_SAMPLE_RATE,
+    AudioInputPipeline,
+    InputFormat,
+    parse_input_format,
+)
+
+requires_opus = pytest.mark.skipif(
+    audio_input.opuslib is None, reason="opuslib と libopus が必要"
+)
+
+# 20ms フレーム (16kHz)
+_FRAME_SAMPLES = TARGET_SAMPLE_RATE * 20 // 1000
+
+
+def _opus_packet() -> bytes:
+    encoder = audio_input.opuslib.Encoder(
+        TARGET_SAMPLE_RATE, 1, audio_input.opuslib.APPLICATION_VOIP
+    )
+    tone = (np.sin(np.arange(_FRAME_SAMPLES) / 8) * 8000).astype(np.int16)
+    return encoder.encode(tone.tobytes(), _FRAME_SAMPLES)
+
+
+def test_parse_input_format():
+    assert parse_input_format(None).codec == "pcm16"
+    assert parse_input_format("pcm16:48000").sample_rate == 48000
+    with pytest.raises(ValueError):
+        parse_input_format("pcm16:1")
+    with pytest.raises(ValueError):
+        parse_input_format("mp3")
+
+
+def test_resampled_pcm_has_target_length():
+    pipeline = AudioInputPipeline(InputFormat("pcm16", 48000))
+    chunk = np.zeros(4800, dtype=np.int16).tobytes()
+
+    total = sum(len(pipeline.process(chunk)) for _ in range(10))
+
+    # 48kHz 1 秒分 -> 16kHz 1 秒分 (フィルタの遅延分は後続のチャンクで出力される)
+    assert abs(total // 2 - TARGET_SAMPLE_RATE) <= 1
+
+
+@requires_opus
+def test_malformed_opus_packet_is_dropped_without_ending_stream():
+    pipeline = AudioInputPipeline(InputFormat(INPUT_OPUS))
+    packet = _opus_packet()
+
+    assert len(pipeline.process(packet)) == _FRAME_SAMPLES * 2
+    # TOC バイトが不正なパケット
+    assert pipeline.process(b"\xff\xff\xff\xff") == b""
+    assert pipeline.decode_errors == 1
+    # 後続のパケットは引き続きデコードできる
+    assert len(pipeline.process(packet)) == _FRAME_SAMPLES * 2
+    assert pipeline.stats() == {"codec": INPUT_OPUS, "decode_errors": 1}
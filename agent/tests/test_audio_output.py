@@ -0,0 +1,207 @@
+"""応答音声の Opus 出力 (エンコーダー、形式の選択、フレームヘッダー) のテスト。
+
+Opus のエンコードを伴うテストは libopus がない環境ではスキップする。
+"""
+
+import asyncio
+import json
+import struct
+
+import pytest
+from google.adk.events import Event
+from google.genai import types
+
+from app.routers.websocket import _send_event
+from app.services import audio_output
+from app.services.audio_output import (
+    OUTPUT_OPUS,
+    OUTPUT_PCM16,
+    OpusStreamEncoder,
+    normalize_output_format,
+)
+from app.services.wire_format import (
+    AUDIO_CODEC_OPUS,
+    AUDIO_CODEC_PCM16,
+    DEFAULT_OUTPUT_SAMPLE_RATE,
+    FRAME_TYPE_AUDIO,
+    WIRE_BINARY,
+    WIRE_JSON,
+    wire_handshake_message,
+)
+
+requires_opus = pytest.mark.skipif(
+    audio_output.opuslib is None, reason="opuslib と libopus が必要"
+)
+
+_HEADER = struct.Struct("!BBI")
+_RATE = DEFAULT_OUTPUT_SAMPLE_RATE
+# 20ms フレームのサンプル数・バイト数 (24kHz / 16bit)
+_FRAME_SAMPLES = _RATE * 20 // 1000
+_FRAME_BYTES = _FRAME_SAMPLES * 2
+
+
+class _RecordingWebSocket:
+    def __init__(self):
+        self.texts: list[str] = []
+        self.frames: list[bytes] = []
+
+    async def send_text(self, data: str) -> None:
+        self.texts.append(data)
+
+    async def send_bytes(self, data: bytes) -> None:
+        self.frames.append(data)
+
+
+def _audio_event(pcm: bytes, rate: int = _RATE, **fields) -> Event:
+    blob = types.Blob(data=pcm, mime_type=f"audio/pcm;rate={rate}")
+    return Event(
+        author="coco",
+        content=types.Content(role="model", parts=[types.Part(inline_data=blob)]),
+        **fields,
+    )
+
+
+def _tone(samples: int) -> bytes:
+    return b"".join(
+        struct.pack("<h", 8000 if (i // 20) % 2 else -8000) for i in range(samples)
+    )
+
+
+@requires_opus
+def test_encode_emits_whole_frames_and_keeps_remainder():
+    encoder = OpusStreamEncoder(_RATE, frame_ms=20)
+
+    packets = encoder.encode(_tone(_FRAME_SAMPLES * 2 + 100))
+
+    assert len(packets) == 2
+    assert encoder.frames == 2
+    assert encoder.bytes_in == (_FRAME_SAMPLES * 2 + 100) * 2
+    assert all(packet for packet in packets)
+
+
+@requires_opus
+def test_remainder_is_joined_with_next_chunk():
+    encoder = OpusStreamEncoder(_RATE, frame_ms=20)
+
+    assert encoder.encode(_tone(_FRAME_SAMPLES - 10)) == []
+    assert len(encoder.encode(_tone(10))) == 1
+
+
+@requires_opus
+def test_flush_pads_partial_frame_once():
+    encoder = OpusStreamEncoder(_RATE, frame_ms=20)
+    encoder.encode(_tone(_FRAME_SAMPLES + 50))
+
+    flushed = encoder.flush()
+
+    assert len(flushed) == 1
+    assert encoder.frames == 2
+    assert encoder.flush() == []
+
+    decoded = audio_output.opuslib.Decoder(_RATE, 1).decode(flushed[0], _FRAME_SAMPLES)
+    assert len(decoded) == _FRAME_BYTES
+
+
+@requires_opus
+def test_reset_discards_pending_audio():
+    encoder = OpusStreamEncoder(_RATE, frame_ms=20)
+    encoder.encode(_tone(100))
+
+    encoder.reset()
+
+    assert encoder.flush() == []
+
+
+@requires_opus
+def test_stats_report_compression():
+    encoder = OpusStreamEncoder(_RATE, frame_ms=20, bitrate=24000)
+    encoder.encode(_tone(_FRAME_SAMPLES * 10))
+
+    stats = encoder.stats()
+
+    assert stats["frames"] == 10
+    assert stats["compression_ratio"] > 1.0
+
+
+def test_unsupported_sample_rate_is_rejected():
+    with pytest.raises(ValueError):
+        OpusStreamEncoder(22050)
+
+
+def test_opus_is_negotiated_only_on_binary_wire(monkeypatch):
+    monkeypatch.setattr(audio_output, "opuslib", object())
+
+    assert normalize_output_format("opus", WIRE_BINARY) == OUTPUT_OPUS
+    assert normalize_output_format("OPUS", WIRE_BINARY) == OUTPUT_OPUS
+    assert normalize_output_format("opus", WIRE_JSON) == OUTPUT_PCM16
+    assert normalize_output_format(None, WIRE_BINARY) == OUTPUT_PCM16
+
+
+def test_falls_back_to_pcm_without_libopus(monkeypatch):
+    # opuslib 自体、または libopus が読み込めない場合は opuslib が None になる
+    monkeypatch.setattr(audio_output, "opuslib", None)
+
+    assert normalize_output_format("opus", WIRE_BINARY) == OUTPUT_PCM16
+
+
+def test_handshake_reports_negotiated_audio_format():
+    message = json.loads(wire_handshake_message(WIRE_BINARY, OUTPUT_OPUS))
+
+    assert message["type"] == "wire_format"
+    assert message["wire"] == WIRE_BINARY
+    assert message["audio"] == OUTPUT_OPUS
+
+
+def test_pcm_frames_carry_pcm_codec_header():
+    websocket = _RecordingWebSocket()
+    pcm = _tone(_FRAME_SAMPLES)
+
+    asyncio.run(_send_event(websocket, _audio_event(pcm), WIRE_BINARY))
+
+    assert len(websocket.frames) == 1
+    frame_type, codec, rate = _HEADER.unpack_from(websocket.frames[0])
+    assert (frame_type, codec, rate) == (FRAME_TYPE_AUDIO, AUDIO_CODEC_PCM16, _RATE)
+    assert websocket.frames[0][_HEADER.size :] == pcm
+
+
+@requires_opus
+def test_opus_frames_carry_opus_codec_header():
+    websocket = _RecordingWebSocket()
+    encoder = OpusStreamEncoder(_RATE, frame_ms=20)
+    event = _audio_event(_tone(_FRAME_SAMPLES * 3 + 40))
+
+    asyncio.run(_send_event(websocket, event, WIRE_BINARY, encoder))
+
+    assert len(websocket.frames) == 3
+    for frame in websocket.frames:
+        frame_type, codec, rate = _HEADER.unpack_from(frame)
+        assert (frame_type, codec, rate) == (FRAME_TYPE_AUDIO, AUDIO_CODEC_OPUS, _RATE)
+        assert len(frame) > _HEADER.size
+
+
+@requires_opus
+def test_turn_complete_flushes_partial_opus_frame():
+    websocket = _RecordingWebSocket()
+    encoder = OpusStreamEncoder(_RATE, frame_ms=20)
+    asyncio.run(_send_event(websocket, _audio_event(_tone(100)), WIRE_BINARY, encoder))
+    assert websocket.frames == []
+
+    turn_complete = Event(author="coco", turn_complete=True)
+    asyncio.run(_send_event(websocket, turn_complete, WIRE_BINARY, encoder))
+
+    assert len(websocket.frames) == 1
+    assert _HEADER.unpack_from(websocket.frames[0])[1] == AUDIO_CODEC_OPUS
+    assert json.loads(websocket.texts[-1])["turnComplete"] is True
+
+
+@requires_opus
+def test_other_sample_rates_fall_back_to_pcm_frames():
+    websocket = _RecordingWebSocket()
+    encoder = OpusStreamEncoder(_RATE, frame_ms=20)
+    event = _audio_event(_tone(320), rate=16000)
+
+    asyncio.run(_send_event(websocket, event, WIRE_BINARY, encoder))
+
+    assert len(websocket.frames) == 1
+    _, codec, rate = _HEADER.unpack_from(websocket.frames[0])
+    assert (codec, rate) == (AUDIO_CODEC_PCM16, 16000)
@@ -0,0 +1,91 @@
+"""ローカルキャッシュ付き SessionService のテスト。
+
+2 つのキャッシュで同じバックエンドを共有し、別のワーカーが追加した
+イベントを古いキャッシュが隠さないことを確認する。
+"""
+
+import asyncio
+
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from app.services.cached_session_service import CachedSessionService
+
+_APP = "app"
+_USER = "alice"
+
+
+def _event(text: str) -> Event:
+    return Event(
+        author="user",
+        content=types.Content(role="user", parts=[types.Part(text=text)]),
+    )
+
+
+async def _texts(service: CachedSessionService, session_id: str) -> list[str]:
+    session = await service.get_session(
+        app_name=_APP, user_id=_USER, session_id=session_id
+    )
+    return [event.content.parts[0].text for event in session.events]
+
+
+def test_cache_hit_when_no_one_else_wrote():
+    async def scenario():
+        service = CachedSessionService(InMemorySessionService(), 10, 600.0)
+        session = await service.create_session(app_name=_APP, user_id=_USER)
+        await service.append_event(session, _event("hello"))
+        await service.flush()
+
+        assert await _texts(service, session.id) == ["hello"]
+        assert service.hits == 1
+        assert service.stale == 0
+
+    asyncio.run(scenario())
+
+
+def test_events_from_another_worker_invalidate_cache():
+    async def scenario():
+        backend = InMemorySessionService()
+        worker_a = CachedSessionService(backend, 10, 600.0)
+        worker_b = CachedSessionService(backend, 10, 600.0)
+
+        session = await worker_a.create_session(app_name=_APP, user_id=_USER)
+        await worker_a.append_event(session, _event("first"))
+        await worker_a.flush()
+
+        # 再接続が別のワーカーに振り分けられ、そこでイベントが追加される
+        session_b = await worker_b.get_session(
+            app_name=_APP, user_id=_USER, session_id=session.id
+        )
+        await worker_b.append_event(session_b, _event("second"))
+        await worker_b.flush()
+
+        # 元のワーカーに戻ってきた場合もキャッシュの古い履歴は返さない
+        assert await _texts(worker_a, session.id) == ["first", "second"]
+        assert worker_a.stale == 1
+        # 取得し直した後はキャッシュから返す
+        assert await _texts(worker_a, session.id) == ["first", "second"]
+        assert worker_a.hits == 1
+
+    asyncio.run(scenario())
+
+
+def test_deleted_session_is_not_served_from_cache():
+    async def scenario():
+        backend = InMemorySessionService()
+        service = CachedSessionService(backend, 10, 600.0)
+        session = await service.create_session(app_name=_APP, user_id=_USER)
+
+        await backend.delete_session(
+            app_name=_APP, user_id=_USER, session_id=session.id
+        )
+
+        assert (
+            await service.get_session(
+                app_name=_APP, user_id=_USER, session_id=session.id
+            )
+            is None
+        )
+
+    asyncio.run(scenario())
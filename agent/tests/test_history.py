@@ -0,0 +1,171 @@
+"""チャットの所有者の確認のテスト。
+
+別のユーザーが他人の chat_id で接続しても (同時に接続した場合も含む)、
+チャットの所有者が書き換わらず、履歴 API から他人のメッセージを
+読めないことを確認する。
+"""
+
+import asyncio
+from collections import OrderedDict
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from google.api_core.exceptions import AlreadyExists
+from starlette.websockets import WebSocketDisconnect
+
+from app.routers import history, websocket
+from app.services import firestore_service
+from app.services.firestore_service import (
+    ChatAccessDenied,
+    bootstrap_connection,
+    get_chat_owner,
+)
+from app.services.history_cache import HistoryCache
+
+
+class _FakeSnapshot:
+    def __init__(self, reference, data: dict | None):
+        self.reference = reference
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> dict | None:
+        return dict(self._data) if self._data is not None else None
+
+
+class _FakeDocument:
+    def __init__(self, store: dict, path: str):
+        self._store = store
+        self.path = path
+
+    async def get(self, field_paths=None) -> _FakeSnapshot:
+        return _FakeSnapshot(self, self._store.get(self.path))
+
+
+class _FakeCollection:
+    def __init__(self, store: dict, name: str):
+        self._store = store
+        self._name = name
+
+    def document(self, document_id: str) -> _FakeDocument:
+        return _FakeDocument(self._store, f"{self._name}/{document_id}")
+
+
+class _FakeBatch:
+    def __init__(self, db: "_FakeFirestore"):
+        self._db = db
+        self._creates: list[tuple[str, dict]] = []
+
+    def create(self, reference: _FakeDocument, data: dict) -> None:
+        self._creates.append((reference.path, data))
+
+    async def commit(self) -> None:
+        if self._db.before_commit is not None:
+            before_commit, self._db.before_commit = self._db.before_commit, None
+            before_commit()
+        # バッチは不可分に適用する
+        for path, _ in self._creates:
+            if path in self._db.documents:
+                raise AlreadyExists(f"Document already exists: {path}")
+        for path, data in self._creates:
+            self._db.documents[path] = dict(data)
+
+
+class _FakeFirestore:
+    """bootstrap_connection と get_chat_owner が使う操作だけを持つ Firestore。"""
+
+    def __init__(self):
+        self.documents: dict[str, dict] = {}
+        # 次のコミットの直前に 1 度だけ実行する (同時接続の再現に使用)
+        self.before_commit = None
+
+    def collection(self, name: str) -> _FakeCollection:
+        return _FakeCollection(self.documents, name)
+
+    async def get_all(self, references):
+        for reference in references:
+            yield await reference.get()
+
+    def batch(self) -> _FakeBatch:
+        return _FakeBatch(self)
+
+
+async def _verify_id_token(token: str) -> dict:
+    # テストではトークンをそのままユーザー ID として扱う
+    return {"uid": token}
+
+
+@pytest.fixture
+def fake_db(monkeypatch) -> _FakeFirestore:
+    fake = _FakeFirestore()
+    monkeypatch.setattr(firestore_service, "db", fake)
+    monkeypatch.setattr(firestore_service, "_known_users", OrderedDict())
+    monkeypatch.setattr(firestore_service, "_known_chats", OrderedDict())
+    return fake
+
+
+@pytest.fixture
+def client(fake_db, monkeypatch) -> TestClient:
+    monkeypatch.setattr(websocket, "verify_id_token", _verify_id_token)
+    monkeypatch.setattr(history, "verify_id_token", _verify_id_token)
+    monkeypatch.setattr(history, "history_cache", HistoryCache(10, 10, 30.0))
+
+    async def list_messages(chat_id, limit, start_after, fields):
+        return []
+
+    monkeypatch.setattr(history, "list_messages", list_messages)
+
+    app = FastAPI()
+    app.include_router(websocket.router)
+    app.include_router(history.router)
+    return TestClient(app)
+
+
+def test_bootstrap_rejects_other_users_chat(fake_db):
+    assert asyncio.run(bootstrap_connection("alice", "chat-1")) == (True, None)
+
+    with pytest.raises(ChatAccessDenied):
+        asyncio.run(bootstrap_connection("bob", "chat-1"))
+
+    assert firestore_service._known_chats["chat-1"]["userId"] == "alice"
+    assert asyncio.run(get_chat_owner("chat-1")) == "alice"
+    # 所有者の再接続はキャッシュから返す
+    assert asyncio.run(bootstrap_connection("alice", "chat-1")) == (False, None)
+
+
+def test_concurrent_creation_keeps_first_owner(fake_db):
+    def alice_creates_first():
+        fake_db.documents["chats/chat-1"] = {"userId": "alice", "sessionId": None}
+
+    # bob が未作成と読み取った後、コミットまでの間に alice が作成する
+    fake_db.before_commit = alice_creates_first
+
+    with pytest.raises(ChatAccessDenied):
+        asyncio.run(bootstrap_connection("bob", "chat-1"))
+
+    assert fake_db.documents["chats/chat-1"]["userId"] == "alice"
+    # 不可分に失敗するため、bob のユーザーも作成されていない
+    assert "users/bob" not in fake_db.documents
+    assert "chat-1" not in firestore_service._known_chats
+
+
+def test_connecting_with_other_users_chat_id_does_not_expose_history(client):
+    asyncio.run(bootstrap_connection("alice", "chat-1"))
+
+    with client.websocket_connect("/ws?token=bob&chat_id=chat-1") as connection:
+        with pytest.raises(WebSocketDisconnect) as excinfo:
+            connection.receive_text()
+    assert excinfo.value.code == 1008
+
+    assert asyncio.run(get_chat_owner("chat-1")) == "alice"
+    response = client.get(
+        "/chats/chat-1/messages", headers={"Authorization": "Bearer bob"}
+    )
+    assert response.status_code == 404
+
+    response = client.get(
+        "/chats/chat-1/messages", headers={"Authorization": "Bearer alice"}
+    )
+    assert response.status_code == 200
+    assert response.json() == {"items": [], "nextCursor": None}
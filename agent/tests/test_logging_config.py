@@ -0,0 +1,42 @@
+"""ログのサンプリング・レート制限のテスト。"""
+
+import logging
+
+from app.logging_config import SamplingFilter
+
+
+def _record(level: int, lineno: int = 10) -> logging.LogRecord:
+    return logging.LogRecord("test", level, "app/example.py", lineno, "msg", (), None)
+
+
+def test_info_and_above_are_never_rate_limited():
+    sampling_filter = SamplingFilter(rate_per_sec=1.0, debug_sample_rate=1.0)
+
+    for level in (logging.INFO, logging.WARNING, logging.ERROR):
+        assert all(sampling_filter.filter(_record(level)) for _ in range(100))
+    assert sampling_filter.rate_limited == 0
+
+
+def test_debug_is_rate_limited_per_call_site():
+    sampling_filter = SamplingFilter(rate_per_sec=5.0, debug_sample_rate=1.0)
+
+    passed = sum(sampling_filter.filter(_record(logging.DEBUG)) for _ in range(50))
+
+    assert passed == 5
+    assert sampling_filter.rate_limited == 45
+    # 別の呼び出し箇所は独立して数える
+    assert sampling_filter.filter(_record(logging.DEBUG, lineno=20))
+
+
+def test_zero_rate_disables_limit():
+    sampling_filter = SamplingFilter(rate_per_sec=0, debug_sample_rate=1.0)
+
+    assert all(sampling_filter.filter(_record(logging.DEBUG)) for _ in range(100))
+
+
+def test_debug_sampling():
+    sampling_filter = SamplingFilter(rate_per_sec=0, debug_sample_rate=0.0)
+
+    assert not sampling_filter.filter(_record(logging.DEBUG))
+    assert sampling_filter.filter(_record(logging.INFO))
+    assert sampling_filter.sampled_out == 1
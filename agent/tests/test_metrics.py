@@ -0,0 +1,56 @@
+"""`/metrics` と `/stats` エンドポイントの公開設定のテスト。"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import Settings, settings
+from app.routers import metrics
+
+
+@pytest.fixture
+def client() -> TestClient:
+    app = FastAPI()
+    app.include_router(metrics.router)
+    return TestClient(app)
+
+
+def test_disabled_by_default(client, monkeypatch):
+    assert Settings.model_fields["metrics_enabled"].default is False
+    monkeypatch.setattr(settings, "metrics_enabled", False)
+
+    assert client.get("/metrics").status_code == 404
+
+
+def test_enabled_without_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_enabled", True)
+    monkeypatch.setattr(settings, "metrics_token", None)
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+
+def test_token_is_required_when_configured(client, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_enabled", True)
+    monkeypatch.setattr(settings, "metrics_token", "secret")
+
+    assert client.get("/metrics").status_code == 401
+    wrong = {"Authorization": "Bearer wrong"}
+    assert client.get("/metrics", headers=wrong).status_code == 401
+    valid = {"Authorization": "Bearer secret"}
+    assert client.get("/metrics", headers=valid).status_code == 200
+
+
+def test_stats_share_metrics_access_settings(client, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_enabled", False)
+    assert client.get("/stats").status_code == 404
+
+    monkeypatch.setattr(settings, "metrics_enabled", True)
+    monkeypatch.setattr(settings, "metrics_token", "secret")
+    assert client.get("/stats").status_code == 401
+
+    response = client.get("/stats", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert "admission" in response.json()